@@ -0,0 +1,246 @@
+"""Copy saved scenes to shared storage in a background thread.
+
+The scene is written to fast local scratch disk first, which gives control
+back to the artist right away, and a single worker thread then copies it to
+its folder on the network. Jobs are copied one at a time in the order they
+were submitted, so successive increments of a file always land in order.
+A failed copy is retried with a growing delay before it is reported, and
+the scratch file is kept until the copy succeeds. A copy to a reserved
+version holds the reservation until it lands, gives the version back when
+it fails and claims it again when retried.
+"""
+import atexit
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+import reservation
+
+log = logging.getLogger(__name__)
+
+
+QUEUED = "queued"
+IN_PROGRESS = "in progress"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+
+
+class CopyJob(object):
+    """One scratch file on its way to its destination.
+
+    Args:
+        reservation (reservation.Reservation): the claim on destination
+            of an increment save, None for an overwrite.
+    """
+
+    def __init__(self, source, destination, reservation=None):
+        self.source = source
+        self.destination = destination
+        self.reservation = reservation
+        self.status = QUEUED
+        self.attempts = 0
+        self.error = None
+        self._finished = threading.Event()
+
+    @property
+    def finished(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job is done or failed, return True if finished."""
+        self._finished.wait(timeout)
+        return self.finished
+
+    def __repr__(self):
+        return "CopyJob({!r}, {})".format(self.destination, self.status)
+
+
+class BackgroundCopier(object):
+    """Worker thread copying scratch files to their destination in order.
+
+    Args:
+        scratch_folder (str): local folder for scratch saves, defaults to
+            a smartsave folder in the system temp folder.
+        retries (int): extra attempts before a copy is reported failed.
+        retry_delay (float): seconds before the first retry, doubled for
+            every following one.
+    """
+
+    def __init__(self, scratch_folder=None, retries=3, retry_delay=2.0):
+        self.scratch_folder = scratch_folder or os.path.join(
+            tempfile.gettempdir(), "smartsave")
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.jobs = []
+        self._queue = queue.Queue()
+        self._counter = itertools.count()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def scratch_path_for(self, destination):
+        """Return a new scratch file path for a save to destination."""
+        if not os.path.isdir(self.scratch_folder):
+            os.makedirs(self.scratch_folder)
+        return os.path.join(self.scratch_folder, "{}-{:04d}-{}".format(
+            os.getpid(), next(self._counter), os.path.basename(destination)))
+
+    def submit(self, source, destination, claim=None):
+        """Queue a copy of source to destination.
+
+        Args:
+            claim (reservation.Reservation): the reserved version
+                destination is, committed by the copy.
+
+        Returns:
+            CopyJob: the queued job, to follow its status.
+        """
+        job = CopyJob(source, destination, claim)
+        with self._lock:
+            self.jobs.append(job)
+            self._start()
+        self._queue.put(job)
+        return job
+
+    def retry(self, job):
+        """Queue a failed job again.
+
+        A job that was followed by a newer save of the same file is not
+        copied again, it would overwrite the newer one, and neither is a
+        reserved version someone else took after the job gave it back.
+
+        Returns:
+            bool: True if the job was queued.
+        """
+        if job.status != FAILED:
+            return False
+        newer = self.jobs[self.jobs.index(job) + 1:]
+        if any(other.destination == job.destination for other in newer):
+            log.warning("Not retrying %s, it was saved again since",
+                        job.destination)
+            return False
+        if job.reservation is not None and not job.reservation.renew():
+            log.warning("Not retrying %s, the version was taken since",
+                        job.destination)
+            return False
+        job.status = QUEUED
+        job.error = None
+        job._finished.clear()
+        with self._lock:
+            self._start()
+        self._queue.put(job)
+        return True
+
+    def pending(self):
+        """Return the jobs that are not finished yet."""
+        return [job for job in self.jobs if not job.finished]
+
+    def wait(self, timeout=None):
+        """Block until every job finished, return True if they all did."""
+        deadline = None if timeout is None else time.time() + timeout
+        for job in self.pending():
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.time(), 0.0)
+            if not job.wait(remaining):
+                return False
+        return True
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run,
+                                            name="BackgroundCopier")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._process(job)
+            finally:
+                job._finished.set()
+                self._queue.task_done()
+
+    def _process(self, job):
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            job.status = IN_PROGRESS
+            job.attempts += 1
+            try:
+                self._copy(job)
+            except reservation.ReservationLost as err:
+                job.error = err
+                break
+            except (IOError, OSError) as err:
+                job.error = err
+                log.warning("Copy of %s to %s failed (attempt %d): %s",
+                            job.source, job.destination, job.attempts, err)
+                if attempt < self.retries:
+                    job.status = RETRYING
+                    time.sleep(delay)
+                    delay *= 2
+                continue
+            except Exception as err:
+                job.error = err
+                log.exception("Copy of %s to %s failed", job.source,
+                              job.destination)
+                break
+            job.status = DONE
+            job.error = None
+            # the copy landed, a scratch file left behind is only litter
+            try:
+                os.remove(job.source)
+            except OSError as err:
+                log.warning("Could not remove the scratch save %s: %s",
+                            job.source, err)
+            return
+        job.status = FAILED
+        if job.reservation is not None:
+            # the empty placeholder would pass for the latest version
+            job.reservation.release()
+        log.error("Giving up copying %s to %s, the save is kept in %s",
+                  os.path.basename(job.destination),
+                  os.path.dirname(job.destination),
+                  job.source)
+
+    @staticmethod
+    def _copy(job):
+        # the destination only ever holds a complete file
+        claim = job.reservation
+        temp_path = reservation.temp_path_for(job.destination)
+        try:
+            shutil.copyfile(job.source, temp_path)
+            if claim is None:
+                reservation.replace(temp_path, job.destination)
+            elif claim.held():
+                claim.commit(temp_path)
+            else:
+                raise reservation.ReservationLost(
+                    "{} was replaced by another save".format(
+                        job.destination))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+_copier = None
+
+
+def default_copier():
+    """Return the copier shared by the tools of the session."""
+    global _copier
+    if _copier is None:
+        _copier = BackgroundCopier()
+        # copies still queued when the session ends are finished first
+        atexit.register(_copier.wait)
+    return _copier
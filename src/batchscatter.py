@@ -0,0 +1,475 @@
+"""Apply one scatter preset to many scene files in headless Maya.
+
+A preset is a JSON file holding every field of the scatter UI plus the
+sources and the destination selection, saved from the UI with Save Preset
+or written by hand. The runner starts a bounded pool of worker processes,
+one scene at a time each::
+
+    python batchscatter.py run forest.json "/show/*/scenes/*_layout_v*.ma"
+    python batchscatter.py run forest.json shots.txt --workers 4 \\
+        --report report.json
+
+A worker is ``mayapy batchscatter.py worker PRESET SCENE``: it opens the
+scene, scatters with the preset, saves the result as the next version
+through SceneFile.save_increment and prints one result line. A worker that
+fails or times out is retried. Any command taking the same arguments and
+printing the same line can stand in for mayapy, see --command, so the
+scheduling can be run and checked without Maya.
+"""
+import argparse
+import collections
+import glob
+import json
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import timeit
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+import backgroundsave
+import instrument
+import versionindex
+
+log = logging.getLogger(__name__)
+
+
+RESULT_PREFIX = "batchscatter-result "
+
+# (preset key, scatter UI widget, default), vectors take a widget per axis
+PRESET_FIELDS = (
+    ("group_name", "group_name_le", "ScatterGroup"),
+    ("percentage", "percentage_slider", 100),
+    ("seed", "seed_le", 453),
+    ("mode", "sampling_cbx", "Uniform"),
+    ("radius", "radius_le", 1.0),
+    ("surface_points", "surface_count_le", 10000),
+    ("workers", "workers_sbx", 1),
+    ("density", "density_cbx", "None"),
+    ("density_name", "density_name_le", ""),
+    ("falloff_radius", "falloff_radius_le", 10.0),
+    ("density_invert", "density_invert_checkbox", False),
+    ("source_weights", "source_weights_le", ""),
+    ("align_to_normals", "normals_checkbox", False),
+    ("spacing", "spacing_le", 0.0),
+    ("avoid_overlap", "overlap_checkbox", False),
+    ("output", "output_mode_cbx", "Transforms"),
+    ("suspend_viewport", "suspend_checkbox", True),
+    ("disk_cache", "disk_cache_checkbox", False),
+    ("tile_size", "tile_size_le", 0.0),
+    ("lod_distances", "lod_distances_le", ""),
+    ("scale_min", ("xscale_min_le", "yscale_min_le", "zscale_min_le"),
+     [1.0, 1.0, 1.0]),
+    ("scale_max", ("xscale_max_le", "yscale_max_le", "zscale_max_le"),
+     [1.0, 1.0, 1.0]),
+    ("rotate_min", ("xrotate_min_le", "yrotate_min_le", "zrotate_min_le"),
+     [0.0, 0.0, 0.0]),
+    ("rotate_max", ("xrotate_max_le", "yrotate_max_le", "zrotate_max_le"),
+     [0.0, 0.0, 0.0]),
+    ("twist_min", "twist_min_le", 0.0),
+    ("twist_max", "twist_max_le", 0.0),
+)
+# not UI fields: what to scatter where
+SELECTION_FIELDS = ("sources", "destination")
+
+SceneResult = collections.namedtuple(
+    "SceneResult", ["scene", "status", "attempts", "seconds", "saved",
+                    "instances", "phases", "error"])
+
+
+def default_preset():
+    """Return a preset holding the defaults of the scatter UI."""
+    preset = collections.OrderedDict(
+        (key, default) for key, _, default in PRESET_FIELDS)
+    for key in SELECTION_FIELDS:
+        preset[key] = []
+    return preset
+
+
+def load_preset(path):
+    """Read a preset, filling the fields it leaves out with defaults.
+
+    Raises:
+        ValueError: for unknown fields or a preset without sources or
+            destination.
+    """
+    with open(path) as handle:
+        data = json.load(handle)
+    preset = default_preset()
+    unknown = set(data) - set(preset)
+    if unknown:
+        raise ValueError("Unknown preset fields: {}".format(
+            ", ".join(sorted(unknown))))
+    preset.update(data)
+    for key in SELECTION_FIELDS:
+        if not preset[key]:
+            raise ValueError("The preset needs {}".format(key))
+    return preset
+
+
+def save_preset(preset, path):
+    with open(path, "w") as handle:
+        json.dump(preset, handle, indent=2)
+
+
+def _widget_value(widget):
+    for getter in ("isChecked", "value", "currentText", "displayText"):
+        if hasattr(widget, getter):
+            return getattr(widget, getter)()
+    raise TypeError("Cannot read {!r}".format(widget))
+
+
+def preset_from_ui(ui, sources, destination):
+    """Return the preset of the fields of a scatter.ScatterUI."""
+    preset = default_preset()
+    for key, widgets, default in PRESET_FIELDS:
+        if isinstance(widgets, tuple):
+            preset[key] = [float(_widget_value(getattr(ui, widget)))
+                           for widget in widgets]
+        else:
+            value = _widget_value(getattr(ui, widgets))
+            preset[key] = (type(default)(value)
+                           if isinstance(default, (int, float)) and
+                           not isinstance(default, bool) else value)
+    preset["sources"] = list(sources)
+    preset["destination"] = list(destination)
+    return preset
+
+
+class PresetField(object):
+    """Read only stand in for a scatter UI widget holding a preset value."""
+
+    def __init__(self, value):
+        self._value = value
+
+    def displayText(self):
+        return str(self._value)
+
+    def currentText(self):
+        return str(self._value)
+
+    def isChecked(self):
+        return bool(self._value)
+
+    def value(self):
+        return self._value
+
+
+class PresetUI(object):
+    """The widgets of a scatter.ScatterUI filled from a preset, to drive
+    scatter.RandomScatter without a window."""
+
+    def __init__(self, preset):
+        for key, widgets, _ in PRESET_FIELDS:
+            if isinstance(widgets, tuple):
+                for widget, value in zip(widgets, preset[key]):
+                    setattr(self, widget, PresetField(value))
+            else:
+                setattr(self, widgets, PresetField(preset[key]))
+
+
+def expand_scenes(patterns, latest_only=True):
+    """Resolve scene paths, globs and text files listing them.
+
+    Args:
+        patterns (list): paths, glob patterns, or .txt files with one
+            path or pattern per line.
+        latest_only (bool): keep only the latest version of every scene
+            among the matches.
+
+    Returns:
+        list: absolute scene paths, sorted.
+    """
+    paths = set()
+    for pattern in patterns:
+        if pattern.endswith(".txt") and os.path.isfile(pattern):
+            with open(pattern) as handle:
+                lines = [line.strip() for line in handle if line.strip()]
+            paths.update(expand_scenes(lines, latest_only=False))
+            continue
+        matches = glob.glob(pattern) or (
+            [pattern] if os.path.isfile(pattern) else [])
+        if not matches:
+            log.warning("No scene file matches %s", pattern)
+        paths.update(os.path.abspath(path) for path in matches)
+    if not latest_only:
+        return sorted(paths)
+    latest = {}
+    for path in paths:
+        folder, name = os.path.split(path)
+        parts = versionindex.parse_name(name)
+        if parts is None:
+            latest[path] = (0, path)
+            continue
+        descriptor, task, ver, ext = parts
+        key = (folder, descriptor, task, ext)
+        if key not in latest or ver > latest[key][0]:
+            latest[key] = (ver, path)
+    return sorted(path for _, path in latest.values())
+
+
+def mayapy():
+    """Return the mayapy of MAYAPY, MAYA_LOCATION or the PATH."""
+    if os.environ.get("MAYAPY"):
+        return os.environ["MAYAPY"]
+    name = "mayapy.exe" if sys.platform == "win32" else "mayapy"
+    if os.environ.get("MAYA_LOCATION"):
+        return os.path.join(os.environ["MAYA_LOCATION"], "bin", name)
+    return name
+
+
+def default_command():
+    return [mayapy(), os.path.abspath(__file__.replace(".pyc", ".py"))]
+
+
+class BatchRunner(object):
+    """Run scenes through worker processes, a bounded number at a time.
+
+    Args:
+        command (list): the worker program, "worker PRESET SCENE" is
+            appended to it, defaults to this file run by mayapy.
+        workers (int): scenes processed at the same time.
+        retries (int): extra attempts for a scene whose worker failed.
+        retry_delay (float): seconds before the first retry, doubled for
+            every following one.
+        timeout (float): seconds a worker may run, None for no limit.
+    """
+
+    def __init__(self, command=None, workers=2, retries=1, retry_delay=2.0,
+                 timeout=None):
+        self.command = list(command or default_command())
+        self.workers = max(int(workers), 1)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+
+    def run(self, preset_path, scenes, progress=None):
+        """Process every scene, return their SceneResult in scene order.
+
+        progress is called as progress(result) when a scene finishes.
+        """
+        jobs = queue.Queue()
+        for index, scene in enumerate(scenes):
+            jobs.put((index, scene))
+        results = [None] * len(scenes)
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                try:
+                    index, scene = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                result = self._process(preset_path, scene)
+                with lock:
+                    results[index] = result
+                    if progress:
+                        progress(result)
+
+        threads = [threading.Thread(target=work, name="BatchScatter")
+                   for _ in range(min(self.workers, len(scenes)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _process(self, preset_path, scene):
+        delay = self.retry_delay
+        start = timeit.default_timer()
+        error = None
+        for attempt in range(1, self.retries + 2):
+            try:
+                data = self._run_worker(preset_path, scene)
+            except (OSError, RuntimeError) as err:
+                error = str(err)
+                log.warning("Scatter of %s failed (attempt %d): %s",
+                            scene, attempt, error)
+                if attempt <= self.retries:
+                    time.sleep(delay)
+                    delay *= 2
+                continue
+            return SceneResult(
+                scene, backgroundsave.DONE, attempt,
+                timeit.default_timer() - start, data.get("saved"),
+                data.get("instances"), data.get("phases_s", {}), None)
+        return SceneResult(scene, backgroundsave.FAILED, self.retries + 1,
+                           timeit.default_timer() - start, None, None, {},
+                           error)
+
+    def _run_worker(self, preset_path, scene):
+        """Run one worker to the end and return its result line.
+
+        Raises:
+            RuntimeError: when the worker failed, timed out or printed no
+                result with a saved scene.
+        """
+        process = subprocess.Popen(
+            self.command + ["worker", preset_path, scene],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        timed_out = []
+        timer = None
+        if self.timeout:
+            def kill():
+                timed_out.append(True)
+                process.kill()
+            timer = threading.Timer(self.timeout, kill)
+            timer.start()
+        try:
+            out, err = process.communicate()
+        finally:
+            if timer:
+                timer.cancel()
+        if timed_out:
+            raise RuntimeError("timed out after {}s".format(self.timeout))
+        lines = out.decode("utf-8", "replace").splitlines()
+        results = [line[len(RESULT_PREFIX):] for line in lines
+                   if line.startswith(RESULT_PREFIX)]
+        if process.returncode or not results:
+            tail = err.decode("utf-8", "replace").strip().splitlines()[-3:]
+            raise RuntimeError("worker exited with {}: {}".format(
+                process.returncode, " | ".join(tail) or "no result"))
+        data = json.loads(results[-1])
+        if not data.get("saved"):
+            raise RuntimeError("worker saved no scene")
+        return data
+
+
+def format_report(results):
+    """Return a text table of SceneResults and a summary line."""
+    lines = ["{:<8} {:>8} {:>9} {:>9}  {}".format(
+        "status", "attempts", "time (s)", "instances", "scene")]
+    for result in results:
+        lines.append("{:<8} {:>8} {:>9.1f} {:>9}  {}".format(
+            result.status, result.attempts, result.seconds,
+            "-" if result.instances is None else result.instances,
+            result.scene))
+        lines.append("{:>39}{}".format(
+            "", result.saved or "error: {}".format(result.error)))
+    failed = sum(result.status != backgroundsave.DONE for result in results)
+    lines.append("{} scenes, {} done, {} failed".format(
+        len(results), len(results) - failed, failed))
+    return "\n".join(lines)
+
+
+def write_report(results, path, wall_time=None):
+    """Write the SceneResults as JSON, with totals."""
+    failed = sum(result.status != backgroundsave.DONE for result in results)
+    report = collections.OrderedDict([
+        ("scenes", len(results)),
+        ("done", len(results) - failed),
+        ("failed", failed),
+        ("wall_s", wall_time),
+        ("results", [result._asdict() for result in results]),
+    ])
+    with open(path, "w") as handle:
+        json.dump(report, handle, indent=2)
+
+
+def scatter_scene(preset, scene_path):
+    """Open a scene, scatter it with a preset and save the next version.
+
+    Runs inside Maya.
+
+    Returns:
+        dict: the instrument recording of the scene with the saved path
+            and the instance count.
+    """
+    import scatter
+    import scenefile
+    preset = dict(preset, suspend_viewport=False)
+    with instrument.recording("batchscatter.scene",
+                              scene=scene_path) as record:
+        scene = scenefile.SceneFile(scene_path)
+        with record.phase("open"):
+            scene.open()
+        # the scatter and the save are recorded as phases of the scene
+        random_scatter = scatter.RandomScatter(PresetUI(preset))
+        try:
+            random_scatter.scatter_objects(preset["sources"],
+                                           preset["destination"])
+        finally:
+            random_scatter.remove_callbacks()
+        saved = scene.save_increment()
+    data = instrument.history[-1]
+    data["saved"] = saved
+    return data
+
+
+def _worker(preset_path, scene_path, stdout):
+    import maya.standalone
+    maya.standalone.initialize(name="python")
+    try:
+        data = scatter_scene(load_preset(preset_path), scene_path)
+    finally:
+        maya.standalone.uninitialize()
+    stdout.write(RESULT_PREFIX + json.dumps(data) + "\n")
+
+
+def main(argv=None, stdout=None):
+    stdout = stdout or sys.stdout
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="action")
+    run = commands.add_parser("run", help="scatter many scenes")
+    run.add_argument("preset", help="scatter preset JSON file")
+    run.add_argument("scenes", nargs="+",
+                     help="scene files, globs or .txt lists of them")
+    run.add_argument("--workers", type=int, default=2,
+                     help="scenes processed at the same time")
+    run.add_argument("--retries", type=int, default=1,
+                     help="extra attempts for a failed scene")
+    run.add_argument("--retry-delay", type=float, default=2.0,
+                     help="seconds before the first retry, doubled for "
+                          "every following one")
+    run.add_argument("--timeout", type=float,
+                     help="seconds a scene may take")
+    run.add_argument("--all-versions", action="store_true",
+                     help="scatter every matching version, not only the "
+                          "latest of each scene")
+    run.add_argument("--command",
+                     help="worker program instead of mayapy batchscatter.py")
+    run.add_argument("--report", help="write a JSON report to this file")
+    worker = commands.add_parser("worker",
+                                 help="scatter one scene, run by mayapy")
+    worker.add_argument("preset")
+    worker.add_argument("scene")
+    args = parser.parse_args(argv)
+
+    if args.action == "worker":
+        _worker(args.preset, args.scene, stdout)
+        return 0
+    if args.action != "run":
+        parser.error("choose run or worker")
+    load_preset(args.preset)
+    scenes = expand_scenes(args.scenes, latest_only=not args.all_versions)
+    if not scenes:
+        parser.error("no scene files to scatter")
+    runner = BatchRunner(
+        shlex.split(args.command) if args.command else None,
+        workers=args.workers, retries=args.retries,
+        retry_delay=args.retry_delay, timeout=args.timeout)
+    start = timeit.default_timer()
+    results = runner.run(os.path.abspath(args.preset), scenes,
+                         progress=lambda result: log.info(
+                             "%s %s", result.status, result.scene))
+    wall_time = timeit.default_timer() - start
+    stdout.write(format_report(results) + "\n")
+    stdout.write("{:.1f}s for {} scenes with {} workers\n".format(
+        wall_time, len(results), runner.workers))
+    if args.report:
+        write_report(results, args.report, wall_time)
+    return 1 if any(result.status != backgroundsave.DONE
+                    for result in results) else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(main())
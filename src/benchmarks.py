@@ -0,0 +1,1037 @@
+"""Headless benchmarks for the scatter and smart save tools.
+
+None of these need Maya. Run them from the src folder::
+
+    python benchmarks.py                  # everything
+    python benchmarks.py scatter_engine   # a single benchmark
+    python benchmarks.py --metrics runs.jsonl --memory instrumented_save
+
+--metrics appends the instrument recordings of the run as JSON lines, to
+compare the phases of the hot paths between two revisions.
+"""
+import argparse
+import fnmatch
+import hashlib
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+import batchscatter
+import compression
+import density
+import instancer
+import instrument
+import mayascene
+import meshsample
+import naming
+import parallelscatter
+import preview
+import reservation
+import sampling
+import scattercache
+import scatterengine
+import scenefile
+import spatialindex
+import surfacesample
+import tiling
+import versioncli
+import versionindex
+import versionstore
+
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Register a benchmark so it can be run from the command line."""
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def best_time(func, repeat=3):
+    """Return the best wall time in seconds of ``repeat`` calls."""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def print_row(*columns):
+    print("".join("{:>16}".format(str(column)) for column in columns))
+
+
+def synthetic_points(count, seed=0):
+    """Return (count, 3) random points standing in for a mesh."""
+    return np.random.RandomState(seed).random_sample((count, 3)) * 100.0
+
+
+def _legacy_scatter_loop(points, settings):
+    """The per-vertex math of the old scatter_objects loop, minus Maya.
+
+    Only the Python side is reproduced, the cmds calls it used to make per
+    vertex are not counted, so this is a lower bound of the old cost.
+    """
+    results = []
+    for pos in points.tolist():
+        rotation = [random.uniform(settings.rotate_min[axis],
+                                   settings.rotate_max[axis])
+                    for axis in range(3)]
+        scale = [random.uniform(settings.scale_min[axis],
+                                settings.scale_max[axis])
+                 for axis in range(3)]
+        results.append((pos, rotation, scale))
+    return results
+
+
+@benchmark
+def scatter_engine(sizes=(1000, 10000, 100000, 200000)):
+    """Batch scatter engine against the old per-vertex loop."""
+    settings = scatterengine.ScatterSettings(
+        scale_min=(0.5, 0.5, 0.5), scale_max=(2, 2, 2),
+        rotate_min=(0, 0, 0), rotate_max=(360, 360, 360), seed=453)
+    print_row("points", "loop (s)", "engine (s)", "speedup")
+    for size in sizes:
+        points = synthetic_points(size)
+        loop = best_time(lambda: _legacy_scatter_loop(points, settings))
+        engine = best_time(
+            lambda: scatterengine.compute_transforms(points, settings))
+        print_row(size, "{:.4f}".format(loop), "{:.4f}".format(engine),
+                  "{:.1f}x".format(loop / engine))
+
+
+@benchmark
+def instancer_payload(sizes=(1000, 10000, 100000, 1000000)):
+    """Build the instancer arrays and the setAttr values for a scatter."""
+    settings = scatterengine.ScatterSettings(seed=453)
+    prototypes = ["rock", "bush", "tree"]
+    print_row("points", "payload (s)", "attr values (s)")
+    for size in sizes:
+        transforms = scatterengine.compute_transforms(
+            synthetic_points(size), settings)
+        payload = instancer.build_payload(transforms, prototypes, seed=453)
+        build = best_time(lambda: instancer.build_payload(
+            transforms, prototypes, seed=453))
+        values = best_time(lambda: [instancer.vector_values(payload.positions),
+                                    instancer.vector_values(payload.rotations),
+                                    instancer.vector_values(payload.scales),
+                                    payload.prototype_indices.tolist()])
+        print_row(size, "{:.4f}".format(build), "{:.4f}".format(values))
+
+
+@benchmark
+def normal_alignment(sizes=(10 ** 4, 10 ** 5, 10 ** 6)):
+    """Batch normal to rotation math with a random twist."""
+    print_row("points", "aligned (s)")
+    for size in sizes:
+        sample = synthetic_sample(1, size)
+        settings = scatterengine.ScatterSettings(
+            seed=453, align_to_normals=True, twist_max=360)
+        elapsed = best_time(lambda: scatterengine.compute_transforms(
+            sample.points, settings, sample.indices, normals=sample.normals))
+        print_row(size, "{:.4f}".format(elapsed))
+
+
+def _legacy_select_percentage(num_vtx, percentage, seed):
+    """The old reseed-per-vertex select_percentage loop."""
+    selection = []
+    for idx in range(0, num_vtx - 1):
+        random.seed(idx + seed)
+        if random.random() <= float(percentage) / 100:
+            selection.append(idx)
+    return selection
+
+
+@benchmark
+def selection(sizes=(10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7), percentage=25,
+              legacy_max=10 ** 5, spatial_max=10 ** 5):
+    """Counter based point selection against the reseeding loop."""
+    print_row("points", "legacy (s)", "uniform (s)", "exact (s)",
+              "poisson (s)", "blue noise (s)")
+    for size in sizes:
+        indices = np.arange(size)
+        legacy = "-"
+        if size <= legacy_max:
+            legacy = "{:.4f}".format(best_time(
+                lambda: _legacy_select_percentage(size, percentage, 453), 1))
+        uniform = best_time(
+            lambda: sampling.select_uniform(indices, percentage, 453))
+        exact = best_time(
+            lambda: sampling.select_exact(indices, percentage, 453))
+        poisson = blue_noise = "-"
+        if size <= spatial_max:
+            points = synthetic_points(size)
+            poisson = "{:.4f}".format(best_time(
+                lambda: sampling.select_poisson_disk(points, 2.0, indices,
+                                                     453), 1))
+            blue_noise = "{:.4f}".format(best_time(
+                lambda: sampling.select_blue_noise(points, percentage,
+                                                   indices, 453), 1))
+        print_row(size, legacy, "{:.4f}".format(uniform),
+                  "{:.4f}".format(exact), poisson, blue_noise)
+
+
+def _pairwise_without_overlap(centers, radius):
+    """Greedy spacing with a full distance check against every kept point."""
+    kept = []
+    for idx in range(len(centers)):
+        if kept:
+            delta = centers[kept] - centers[idx]
+            if (np.einsum("ij,ij->i", delta, delta) < (2 * radius) ** 2).any():
+                continue
+        kept.append(idx)
+    return kept
+
+
+@benchmark
+def spacing(sizes=(10 ** 4, 10 ** 5, 3 * 10 ** 5), pairwise_max=10 ** 4):
+    """Grid backed non-overlap placement against pairwise checks."""
+    print_row("candidates", "pairwise (s)", "grid (s)", "kept")
+    for size in sizes:
+        # keep the density constant so the kept count grows with the size
+        centers = synthetic_points(size) * (size / 10.0 ** 4) ** (1 / 3.0)
+        pairwise = "-"
+        if size <= pairwise_max:
+            pairwise = "{:.4f}".format(best_time(
+                lambda: _pairwise_without_overlap(centers, 1.0), 1))
+        grid = best_time(
+            lambda: spatialindex.place_without_overlap(centers, 1.0), 1)
+        kept = len(spatialindex.place_without_overlap(centers, 1.0))
+        print_row(size, pairwise, "{:.4f}".format(grid), kept)
+
+
+def synthetic_sample(meshes, points_per_mesh, seed=0):
+    """Return a meshsample.MeshSample of several synthetic meshes."""
+    rng = np.random.RandomState(seed)
+    mesh_data = {}
+    for mesh_id in range(meshes):
+        points = rng.random_sample((points_per_mesh, 3)) * 100.0
+        normals = rng.normal(size=(points_per_mesh, 3))
+        normals /= np.linalg.norm(normals, axis=1)[:, None]
+        mesh_data["mesh{}".format(mesh_id)] = (points, normals)
+    return meshsample.read_selection(sorted(mesh_data),
+                                     meshsample.FakeMeshAdapter(mesh_data))
+
+
+@benchmark
+def workers(counts=(1, 2, 4, 8), meshes=8, points_per_mesh=50000):
+    """Scaling of the transform generation with the number of workers."""
+    sample = synthetic_sample(meshes, points_per_mesh)
+    settings = scatterengine.ScatterSettings(
+        scale_min=(0.5, 0.5, 0.5), scale_max=(2, 2, 2),
+        rotate_max=(360, 360, 360), seed=453)
+    print_row("mode", "workers", "time (s)", "identical")
+    for mode in (sampling.UNIFORM, sampling.POISSON_DISK):
+        reference = None
+        for count in counts:
+            result = []
+            elapsed = best_time(lambda: result.append(parallelscatter.generate(
+                sample, settings, 50, mode=mode, radius=2.0,
+                workers=count)), 1)
+            keep, transforms = result[-1]
+            if reference is None:
+                reference = (keep, transforms)
+            identical = bool(np.array_equal(keep, reference[0]) and all(
+                np.array_equal(a, b) for a, b in zip(transforms,
+                                                     reference[1])))
+            print_row(mode, count, "{:.4f}".format(elapsed), identical)
+
+@benchmark
+def scatter_cache(meshes=4, points_per_mesh=250000):
+    """Full computation against memory and .npz disk cache hits."""
+    sample = synthetic_sample(meshes, points_per_mesh)
+    settings = scatterengine.ScatterSettings(
+        scale_min=(0.5, 0.5, 0.5), scale_max=(2, 2, 2),
+        rotate_max=(360, 360, 360), seed=453)
+    params = {"settings": vars(settings), "percentage": 50}
+    folder = tempfile.mkdtemp()
+    try:
+        cache = scattercache.ScatterCache(folder=folder)
+
+        def compute():
+            keep, transforms = parallelscatter.generate(sample, settings, 50)
+            return scattercache.ScatterResult(
+                keep, transforms, instancer.assign_prototypes(len(keep), 3))
+
+        def disk_hit():
+            cache.results.clear()
+            return cache.get_result(key)
+
+        key = []
+        key_time = best_time(lambda: key.append(
+            cache.result_key(sample, ["rock"], params)))
+        key = key[-1]
+        compute_time = best_time(compute)
+        cache.put_result(key, compute())
+        print_row("key (s)", "compute (s)", "memory hit (s)", "disk hit (s)")
+        print_row("{:.4f}".format(key_time), "{:.4f}".format(compute_time),
+                  "{:.6f}".format(best_time(lambda: cache.get_result(key))),
+                  "{:.4f}".format(best_time(disk_hit)))
+    finally:
+        shutil.rmtree(folder)
+
+
+@benchmark
+def preview_updates(sizes=(10 ** 5, 10 ** 6)):
+    """Incremental preview updates against recomputing the scatter."""
+    print_row("points", "full (s)", "percentage (s)", "scale (s)",
+              "seed (s)")
+    for size in sizes:
+        sample = synthetic_sample(1, size)
+        settings = scatterengine.ScatterSettings(seed=453)
+        wider = scatterengine.ScatterSettings(seed=453, scale_max=(2, 2, 2))
+        reseeded = scatterengine.ScatterSettings(seed=454,
+                                                 scale_max=(2, 2, 2))
+        state = preview.ScatterPreview(sample, settings, 50)
+        full = best_time(lambda: parallelscatter.generate(sample, settings,
+                                                          50))
+        percentages = iter(range(51, 100))
+        percentage = best_time(
+            lambda: state.set_percentage(next(percentages)))
+        scale_ranges = itertools.cycle([wider, settings])
+        scale = best_time(lambda: state.set_settings(next(scale_ranges)))
+        seeds = itertools.cycle([reseeded, wider])
+        state.set_settings(wider)
+        seed = best_time(lambda: state.set_settings(next(seeds)))
+        print_row(size, "{:.4f}".format(full), "{:.5f}".format(percentage),
+                  "{:.4f}".format(scale), "{:.4f}".format(seed))
+
+
+def synthetic_shot_folder(folder, files, descriptors=10, ext=".ma"):
+    """Fill folder with empty descriptor_task_vNNN files."""
+    versions = files // descriptors
+    for descriptor in range(descriptors):
+        for ver in range(1, versions + 1):
+            name = "shot{}_anim_v{:03d}{}".format(descriptor, ver, ext)
+            open(os.path.join(folder, name), "w").close()
+    return versions
+
+
+def _legacy_next_avail_ver(folder, descriptor, task, ext):
+    """The old fnmatch and lexicographic sort lookup."""
+    pattern = "{}_{}_v*{}".format(descriptor, task, ext)
+    matching = sorted((name for name in os.listdir(folder)
+                       if fnmatch.fnmatch(name, pattern)), reverse=True)
+    if not matching:
+        return 1
+    return int(os.path.splitext(matching[0])[0].split("_v")[-1]) + 1
+
+
+@benchmark
+def version_lookup(sizes=(1000, 10000)):
+    """Indexed next version lookup against listing and sorting every save."""
+    print_row("files", "legacy (s)", "index cold (s)", "index warm (s)",
+              "legacy correct", "index correct")
+    for size in sizes:
+        folder = tempfile.mkdtemp()
+        try:
+            versions = synthetic_shot_folder(folder, size)
+            legacy = best_time(lambda: _legacy_next_avail_ver(
+                folder, "shot0", "anim", ".ma"))
+
+            def cold():
+                return versionindex.VersionIndex(folder).next_version(
+                    "shot0", "anim", ".ma")
+
+            index = versionindex.VersionIndex(folder)
+            index.refresh()
+            warm = best_time(lambda: index.next_version("shot0", "anim",
+                                                        ".ma"))
+            legacy_correct = (_legacy_next_avail_ver(
+                folder, "shot0", "anim", ".ma") == versions + 1)
+            correct = (index.next_version("shot0", "anim", ".ma") ==
+                       versions + 1)
+            print_row(size, "{:.5f}".format(legacy),
+                      "{:.5f}".format(best_time(cold)),
+                      "{:.7f}".format(warm), legacy_correct, correct)
+        finally:
+            shutil.rmtree(folder)
+
+
+def _increment_saves(args):
+    """Save count increments of one scene the way SceneFile does."""
+    folder, count = args
+    saved = []
+    for _ in range(count):
+        index = versionindex.VersionIndex(folder)
+        claim = reservation.reserve_version(
+            folder, "shot0", "anim", ".ma",
+            index.next_version("shot0", "anim", ".ma"))
+        with open(claim.temp_path, "w") as handle:
+            handle.write("{} {}\n".format(os.getpid(), claim.ver))
+        claim.commit()
+        saved.append(claim.ver)
+    return saved
+
+
+@benchmark
+def concurrent_saves(processes=(1, 4, 16), saves=50):
+    """Many processes increment saving the same scene at once."""
+    print_row("processes", "saves", "time (s)", "versions", "collisions",
+              "leftovers")
+    for count in processes:
+        folder = tempfile.mkdtemp()
+        try:
+            pool = multiprocessing.Pool(count)
+            start = timeit.default_timer()
+            try:
+                claimed = pool.map(_increment_saves,
+                                   [(folder, saves)] * count)
+            finally:
+                pool.close()
+                pool.join()
+            elapsed = timeit.default_timer() - start
+            claimed = list(itertools.chain.from_iterable(claimed))
+            names = os.listdir(folder)
+            versions = [versionindex.parse_name(name) for name in names]
+            versions = [parts for parts in versions if parts]
+            leftovers = len(names) - len(versions)
+            # every file must hold the content of the save that claimed it
+            collisions = len(claimed) - len(set(claimed))
+            for _, _, ver, ext in versions:
+                path = os.path.join(folder, versionindex.format_name(
+                    "shot0", "anim", ver, ext))
+                with open(path) as handle:
+                    if int(handle.read().split()[1]) != ver:
+                        collisions += 1
+            print_row(count, len(claimed), "{:.3f}".format(elapsed),
+                      len(versions), collisions, leftovers)
+        finally:
+            shutil.rmtree(folder)
+
+    folder = tempfile.mkdtemp()
+    try:
+        claim = reservation.reserve_version(folder, "shot0", "anim", ".ma")
+        stale = os.path.getmtime(claim.path) - reservation.STALE_SECONDS - 1
+        os.utime(claim.path, (stale, stale))
+        reclaimed = reservation.reserve_version(folder, "shot0", "anim",
+                                                ".ma")
+        print("stale placeholder reclaimed: {}".format(
+            reclaimed.ver == claim.ver))
+    finally:
+        shutil.rmtree(folder)
+
+
+def synthetic_scene_lines(count, seed=0):
+    """Return count lines looking like the body of a Maya ASCII scene."""
+    rng = np.random.RandomState(seed)
+    values = rng.random_sample((count, 3)) * 100.0
+    return ['\tsetAttr ".t" -type "double3" {:.6f} {:.6f} {:.6f} ;\n'.format(
+        *row) for row in values.tolist()]
+
+
+def _edit_scene_lines(lines, edits, rng):
+    """Change, insert and delete a few lines like an artist's session."""
+    lines = list(lines)
+    for _ in range(edits):
+        at = rng.randint(len(lines))
+        action = rng.randint(3)
+        line = '\tsetAttr ".r" -type "double3" {:.6f} 0 0 ;\n'.format(
+            rng.random_sample() * 360)
+        if action == 0:
+            lines[at] = line
+        elif action == 1:
+            lines.insert(at, line)
+        else:
+            del lines[at]
+    return lines
+
+
+def _fixed_size_stored(versions, size):
+    seen = set()
+    stored = 0
+    for data in versions:
+        for start in range(0, len(data), size):
+            digest = hashlib.sha1(data[start:start + size]).digest()
+            if digest not in seen:
+                seen.add(digest)
+                stored += len(data[start:start + size])
+    return stored
+
+
+@benchmark
+def version_store(lines=400000, versions=10, edits=20):
+    """Content defined chunking throughput and deduplication of versions."""
+    rng = np.random.RandomState(0)
+    scene = synthetic_scene_lines(lines)
+    datas = []
+    for _ in range(versions):
+        datas.append("".join(scene).encode("utf-8"))
+        scene = _edit_scene_lines(scene, edits, rng)
+    size_mb = len(datas[0]) / 1e6
+
+    chunking = best_time(lambda: sum(1 for _ in versionstore.iter_chunks(
+        io.BytesIO(datas[0]))))
+    folder = tempfile.mkdtemp()
+    try:
+        store = versionstore.ChunkStore(folder)
+        total = stored = 0
+        start = timeit.default_timer()
+        for data in datas:
+            manifest, written = store.store_stream(io.BytesIO(data))
+            total += manifest.size
+            stored += written
+        ingest = timeit.default_timer() - start
+        out = io.BytesIO()
+        restore = best_time(lambda: store.restore_stream(manifest, out))
+        restored = out.getvalue()[-len(datas[-1]):] == datas[-1]
+    finally:
+        shutil.rmtree(folder)
+
+    print("{} versions of {:.1f} MB, {} edits between versions".format(
+        versions, size_mb, edits))
+    print_row("chunk MB/s", "store MB/s", "restore MB/s", "dedup ratio",
+              "fixed 64K ratio", "restored")
+    print_row("{:.1f}".format(size_mb / chunking),
+              "{:.1f}".format(total / 1e6 / ingest),
+              "{:.1f}".format(size_mb / restore),
+              "{:.2f}".format(float(total) / stored),
+              "{:.2f}".format(float(total) / _fixed_size_stored(
+                  datas, 1 << 16)),
+              restored)
+
+
+@benchmark
+def compressed_save(lines=400000, network_mb_per_s=100.0):
+    """Bytes written and wall time of compressed saves against plain ones.
+
+    The local copy is mostly page cache, so the time a save would take over
+    a network link of network_mb_per_s is also estimated.
+    """
+    folder = tempfile.mkdtemp()
+    try:
+        scene_path = os.path.join(folder, "scratch.ma")
+        with open(scene_path, "w") as handle:
+            handle.writelines(synthetic_scene_lines(lines))
+        plain_size = os.path.getsize(scene_path)
+        target = os.path.join(folder, "shot0_anim_v001.ma")
+        print("scene of {:.1f} MB".format(plain_size / 1e6))
+        print_row("codec", "level", "written (MB)", "ratio", "save (s)",
+                  "network (s)", "open (s)")
+        save = best_time(lambda: shutil.copyfile(scene_path, target))
+        print_row("plain", "-", "{:.1f}".format(plain_size / 1e6), "1.00",
+                  "{:.3f}".format(save), "{:.3f}".format(
+                      save + plain_size / 1e6 / network_mb_per_s), "-")
+        codecs = [(compression.GZIP_EXT, "GZIP_LEVEL", level)
+                  for level in (1, 6)]
+        if compression.zstandard is not None:
+            codecs += [(compression.ZSTD_EXT, "ZSTD_LEVEL", level)
+                       for level in (1, 3)]
+        restored = os.path.join(folder, "restored.ma")
+        for suffix, setting, level in codecs:
+            default = getattr(compression, setting)
+            setattr(compression, setting, level)
+            try:
+                save = best_time(lambda: compression.compress_file(
+                    scene_path, target + suffix))
+            finally:
+                setattr(compression, setting, default)
+            size = os.path.getsize(target + suffix)
+            load = best_time(lambda: compression.decompress_file(
+                target + suffix, restored))
+            print_row(suffix, level, "{:.1f}".format(size / 1e6),
+                      "{:.2f}".format(float(plain_size) / size),
+                      "{:.3f}".format(save), "{:.3f}".format(
+                          save + size / 1e6 / network_mb_per_s),
+                      "{:.3f}".format(load))
+    finally:
+        shutil.rmtree(folder)
+
+
+@benchmark
+def cli_paths(paths=10000, files=1000):
+    """Bulk latest version lookups of the command line tool."""
+    folder = tempfile.mkdtemp()
+    try:
+        versions = synthetic_shot_folder(folder, files)
+        names = ["shot{}_anim_v001.ma".format(index % 10)
+                 for index in range(paths)]
+        text = "".join(os.path.join(folder, name) + "\n" for name in names)
+
+        def in_process():
+            versionindex._indexes.clear()
+            out = io.StringIO()
+            versioncli.main(["latest", "-"], stdin=io.StringIO(text),
+                            stdout=out)
+            return out.getvalue()
+
+        elapsed = best_time(in_process)
+        expected = "shot0_anim_v{:03d}.ma".format(versions)
+        correct = in_process().splitlines()[0].endswith(expected)
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "versioncli.py")
+        start = timeit.default_timer()
+        process = subprocess.Popen(
+            [sys.executable, script, "latest", "-"], stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE)
+        out, _ = process.communicate(text.encode("utf-8"))
+        process_time = timeit.default_timer() - start
+        print_row("paths", "in process (s)", "per path (us)", "process (s)",
+                  "correct")
+        print_row(paths, "{:.3f}".format(elapsed),
+                  "{:.1f}".format(elapsed / paths * 1e6),
+                  "{:.3f}".format(process_time),
+                  correct and len(out.splitlines()) == paths)
+    finally:
+        shutil.rmtree(folder)
+
+
+_IMPORT_PROBE = """
+import sys, timeit
+start = timeit.default_timer()
+try:
+    __import__({module!r})
+    error = ""
+except ImportError as err:
+    error = "needs " + str(getattr(err, "name", "") or err).split()[-1]
+elapsed = timeit.default_timer() - start
+heavy = [name for name in ("pymel", "maya", "PySide2", "numpy")
+         if name in sys.modules]
+sys.stdout.write("{{}}\\t{{}}\\t{{}}".format(elapsed, error, ",".join(heavy)))
+"""
+
+
+@benchmark
+def import_times(modules=("versionindex", "reservation", "versioncli",
+                          "mayascene", "scenefile", "smartsave",
+                          "scatterengine", "scatter"), folder=None):
+    """Cold import time of each module in a fresh interpreter.
+
+    Point folder at a checkout of an older revision to compare the cost
+    before and after a change.
+    """
+    folder = folder or os.path.dirname(os.path.abspath(__file__))
+    print_row("module", "import (ms)", "error", "loads")
+    for module in modules:
+        output = subprocess.check_output(
+            [sys.executable, "-c", _IMPORT_PROBE.format(module=module)],
+            cwd=folder).decode("utf-8")
+        elapsed, error, heavy = output.split("\t")
+        print_row(module, "{:.1f}".format(float(elapsed) * 1e3),
+                  error or "-", heavy or "-")
+
+
+@benchmark
+def folder_polling(sizes=(10000, 50000)):
+    """Cost of the Smart Save poll of a folder, unchanged and after a save."""
+    print_row("files", "unchanged (us)", "new save (ms)", "sees it")
+    for size in sizes:
+        folder = tempfile.mkdtemp()
+        try:
+            versions = synthetic_shot_folder(folder, size)
+            index = versionindex.VersionIndex(folder)
+            index.refresh()
+            unchanged = best_time(index.refresh, repeat=100)
+            # another artist saves the next version
+            open(os.path.join(folder, versionindex.format_name(
+                "shot0", "anim", versions + 1, ".ma")), "w").close()
+            start = timeit.default_timer()
+            index.refresh()
+            changed = timeit.default_timer() - start
+            seen = index.latest("shot0", "anim", ".ma") == versions + 1
+            print_row(size, "{:.1f}".format(unchanged * 1e6),
+                      "{:.1f}".format(changed * 1e3), seen)
+        finally:
+            shutil.rmtree(folder)
+
+
+def _legacy_parse(name):
+    descriptor, task, ver = os.path.splitext(name)[0].split("_")
+    return descriptor, task, int(ver.split("v")[-1]), os.path.splitext(name)[1]
+
+
+@benchmark
+def naming_schema(count=200000):
+    """Names per second of the naming schema against the old split parse."""
+    schema = naming.DEFAULT_SCHEMA
+    rng = np.random.RandomState(0)
+    parts = [("forest_floor{}".format(index % 50) if index % 2
+              else "rock{}".format(index % 50), "model",
+              int(ver), ".ma") for index, ver in
+             enumerate(rng.randint(1, 2000, count))]
+    names = [schema.format(*fields) for fields in parts]
+
+    def legacy():
+        failed = 0
+        for name in names:
+            try:
+                _legacy_parse(name)
+            except ValueError:
+                failed += 1
+        return failed
+
+    parsed = schema.parse_many(names)
+    rows = [
+        ("legacy split", best_time(legacy), legacy()),
+        ("format", best_time(lambda: [schema.format(*fields)
+                                      for fields in parts]), 0),
+        ("parse", best_time(lambda: [schema.parse(name) for name in names]),
+         sum(schema.parse(name) != fields
+             for name, fields in zip(names, parts))),
+        ("parse_many", best_time(lambda: schema.parse_many(names)),
+         sum(parsed.get(name) != fields
+             for name, fields in zip(names, parts))),
+    ]
+    print_row("operation", "names/s", "wrong or failed")
+    for operation, elapsed, failed in rows:
+        print_row(operation, "{:.0f}".format(count / elapsed), failed)
+
+
+@benchmark
+def weighted_density(sizes=(10 ** 6, 5 * 10 ** 6), percentage=25):
+    """Density map selection and weighted source choice of many points."""
+    print_row("points", "color map (s)", "uniform (s)", "exact (s)",
+              "sources (s)", "kept/expected", "source error")
+    source_weights = np.array([1.0, 1.0, 0.2])
+    for size in sizes:
+        rng = np.random.RandomState(0)
+        colors = np.column_stack([rng.random_sample((size, 3)),
+                                  np.ones(size)])
+        adapter = meshsample.FakeMeshAdapter(
+            {"ground": (np.zeros((size, 3)), None)},
+            {"ground": {"colorSet1": colors}})
+        sample = meshsample.MeshSample(
+            ["ground"], np.zeros(size, dtype=np.int64),
+            np.arange(size), np.zeros((size, 3)), None)
+        density_map = density.DensityMap(density.VERTEX_COLOR)
+        weights = density.read_weights(density_map, sample, adapter)
+        read = best_time(
+            lambda: density.read_weights(density_map, sample, adapter))
+        uniform = best_time(lambda: sampling.select_uniform(
+            sample.indices, percentage, 453, weights=weights))
+        exact = best_time(lambda: sampling.select_exact(
+            sample.indices, percentage, 453, weights=weights))
+        keep = sampling.select_uniform(sample.indices, percentage, 453,
+                                       weights=weights)
+        choose = best_time(lambda: instancer.pick_prototypes(
+            sample.indices[keep], sample.mesh_ids[keep], source_weights,
+            453))
+        picked = instancer.pick_prototypes(
+            sample.indices[keep], sample.mesh_ids[keep], source_weights, 453)
+        error = np.abs(np.bincount(picked, minlength=3) / float(len(keep)) -
+                       source_weights / source_weights.sum()).max()
+        print_row(size, "{:.3f}".format(read), "{:.3f}".format(uniform),
+                  "{:.3f}".format(exact), "{:.3f}".format(choose),
+                  "{:.4f}".format(len(keep) / (weights.sum() * percentage /
+                                               100.0)),
+                  "{:.4f}".format(error))
+
+
+def synthetic_grid(side):
+    """Return (points, normals, triangles) of a flat side x side quad grid
+    whose cells shrink towards one corner, like an unevenly modeled mesh."""
+    coords = np.linspace(0.0, 1.0, side + 1) ** 2 * 100.0
+    x, z = np.meshgrid(coords, coords)
+    points = np.column_stack([x.ravel(), np.zeros(x.size), z.ravel()])
+    normals = np.tile([0.0, 1.0, 0.0], (len(points), 1))
+    corner = (np.arange(side)[:, None] * (side + 1) +
+              np.arange(side)[None, :]).ravel()
+    triangles = np.concatenate([
+        np.column_stack([corner, corner + side + 1, corner + 1]),
+        np.column_stack([corner + 1, corner + side + 1, corner + side + 2])])
+    return points, normals, triangles
+
+
+@benchmark
+def surface_sampling(sides=(100, 708), count=10 ** 6):
+    """Area table and area sampling of a mesh whose vertices bunch up.
+
+    The 708 side grid has one million triangles. The share of the points
+    in the half of the area nearest the dense corner shows vertex sampling
+    follows the tessellation and area sampling does not.
+    """
+    print_row("triangles", "table (s)", "sample (s)", "area share",
+              "vertex share")
+    for side in sides:
+        points, normals, triangles = synthetic_grid(side)
+        adapter = meshsample.FakeMeshAdapter(
+            {"ground": (points, normals)}, triangles={"ground": triangles})
+        build = best_time(
+            lambda: surfacesample.build_table(["ground"], adapter))
+        table = surfacesample.build_table(["ground"], adapter)
+        draw = best_time(
+            lambda: surfacesample.sample_surface(table, count, 453))
+        sample = surfacesample.sample_surface(table, count, 453)
+        # half of the area lies below x = 100 / sqrt(2)
+        half = 100.0 / np.sqrt(2.0)
+        print_row(len(triangles), "{:.3f}".format(build),
+                  "{:.3f}".format(draw),
+                  "{:.3f}".format(np.mean(sample.points[:, 0] < half)),
+                  "{:.3f}".format(np.mean(points[:, 0] < half)))
+
+
+class FakeCommands(object):
+    """maya.cmds stand in for the save and scatter hot paths.
+
+    Saving writes scene_data to the scene path, instancing and transform
+    commands only hand out names, so what is measured is the tools' own
+    cost around the Maya commands, and the number of commands they call.
+    """
+
+    def __init__(self, scene_data=b"", root=""):
+        self.scene_data = scene_data
+        self.root = root
+        self.scene = ""
+        self.nodes = 0
+
+    def file(self, path=None, query=False, sceneName=False, rename=None,
+             save=False, open=False, type=None):
+        if query:
+            return self.scene
+        if rename is not None:
+            self.scene = rename
+        elif save:
+            with io.open(self.scene, "wb") as handle:
+                handle.write(self.scene_data)
+            return self.scene
+        elif open:
+            self.scene = path
+            return path
+
+    def workspace(self, query=False, rootDirectory=False):
+        return self.root
+
+    def instance(self, node):
+        self.nodes += 1
+        return ["{}_instance{}".format(node, self.nodes)]
+
+    def xform(self, node, translation=None, rotation=None, scale=None):
+        pass
+
+    def group(self, nodes, name=None):
+        return name
+
+
+def _dict_partition(translations, tile_size):
+    tiles = {}
+    for index, position in enumerate(translations.tolist()):
+        cell = tuple(int(value // tile_size) for value in position)
+        tiles.setdefault(cell, []).append(index)
+    return tiles
+
+
+@benchmark
+def tile_partition(sizes=(10 ** 5, 10 ** 6, 5 * 10 ** 6), per_tile=1000,
+                   dict_max=10 ** 6):
+    """Tiles of a ground scatter and their LOD states, against a dict of
+    cells filled point by point."""
+    print_row("instances", "tiles", "partition (s)", "dict (s)",
+              "states (ms)")
+    for size in sizes:
+        translations = synthetic_points(size)
+        translations[:, 1] *= 0.01
+        tile_size = tiling.auto_tile_size(translations, per_tile)
+        radii = np.full(size, 0.5)
+        elapsed = best_time(
+            lambda: tiling.partition(translations, tile_size, radii))
+        tiles = tiling.partition(translations, tile_size, radii)
+        legacy = "-"
+        if size <= dict_max:
+            legacy = "{:.3f}".format(best_time(
+                lambda: _dict_partition(translations, tile_size), repeat=1))
+            assert len(_dict_partition(translations, tile_size)) == \
+                len(tiles.counts)
+        camera = translations.min(axis=0)
+        states = best_time(lambda: tiling.tile_states(
+            tiling.box_distances(tiles.bounds_min, tiles.bounds_max,
+                                 camera), 20.0, 40.0, 80.0))
+        print_row(size, len(tiles.counts), "{:.3f}".format(elapsed), legacy,
+                  "{:.3f}".format(states * 1e3))
+
+
+# stands in for mayapy: takes seconds per scene and fails the first
+# attempt at scenes named "flaky", printing the result line of a worker
+_BATCH_STUB = """
+import json, os, sys, time
+preset, scene = sys.argv[-2:]
+marker = scene + ".tried"
+if "flaky" in scene and not os.path.exists(marker):
+    open(marker, "w").close()
+    sys.exit("Maya crashed")
+time.sleep({seconds})
+sys.stdout.write("{prefix}" + json.dumps(
+    {{"saved": scene.replace("v001", "v002"), "instances": 1000,
+      "phases_s": {{"open": {seconds}}}}}) + "\\n")
+"""
+
+
+@benchmark
+def batch_runner(scenes=16, worker_counts=(1, 2, 4, 8), seconds=0.25):
+    """Batch scatter scheduling with a stub worker instead of mayapy.
+
+    A quarter of the scenes fail once and are retried, so every run does
+    scenes * 1.25 worker starts, the ideal time only counts the sleep of
+    the successful ones.
+    """
+    folder = tempfile.mkdtemp()
+    level = batchscatter.log.level
+    # the retried failures are expected here
+    batchscatter.log.setLevel(logging.ERROR)
+    try:
+        preset_path = os.path.join(folder, "preset.json")
+        preset = batchscatter.default_preset()
+        preset.update(sources=["rock"], destination=["ground"])
+        batchscatter.save_preset(preset, preset_path)
+        command = [sys.executable, "-c", _BATCH_STUB.format(
+            seconds=seconds, prefix=batchscatter.RESULT_PREFIX)]
+        print_row("workers", "wall (s)", "ideal (s)", "done", "retried")
+        for workers in worker_counts:
+            paths = []
+            for index in range(scenes):
+                descriptor = "flaky{}".format(index) if index % 4 == 0 \
+                    else "shot{}".format(index)
+                path = os.path.join(folder, versionindex.format_name(
+                    descriptor, "layout", 1, ".ma"))
+                open(path, "w").close()
+                if os.path.exists(path + ".tried"):
+                    os.remove(path + ".tried")
+                paths.append(path)
+            runner = batchscatter.BatchRunner(command, workers=workers,
+                                              retry_delay=0.0)
+            start = timeit.default_timer()
+            results = runner.run(preset_path,
+                                 batchscatter.expand_scenes(
+                                     [os.path.join(folder, "*.ma")]))
+            elapsed = timeit.default_timer() - start
+            ideal = -(-scenes // workers) * seconds
+            print_row(workers, "{:.2f}".format(elapsed),
+                      "{:.2f}".format(ideal),
+                      sum(result.status == "done" for result in results),
+                      sum(result.attempts > 1 for result in results))
+        report_path = os.path.join(folder, "report.json")
+        batchscatter.write_report(results, report_path, elapsed)
+        print(batchscatter.format_report(results[:2]))
+    finally:
+        batchscatter.log.setLevel(level)
+        shutil.rmtree(folder)
+
+
+def print_recording(data):
+    """Print the phases of an instrument recording, slowest first."""
+    print("{:>40}{:>16}".format("phase", "wall (ms)"))
+    for name, elapsed in sorted(data["phases_s"].items(),
+                                key=lambda item: -item[1]):
+        print("{:>40}{:>16.3f}".format(name, elapsed * 1e3))
+    print("{:>40}{:>16.3f}".format("total", data["wall_s"] * 1e3))
+
+
+@benchmark
+def instrumented_save(files=10000, scene_lines=100000):
+    """Recorded next_avail_ver and save_increment with a fake Maya.
+
+    The folder holds files versions of ten scenes and every storage mode
+    saves the same synthetic scene.
+    """
+    folder = tempfile.mkdtemp()
+    scene_data = "".join(synthetic_scene_lines(scene_lines)).encode("utf-8")
+    mayascene.use_commands(FakeCommands(scene_data, folder))
+    try:
+        versions = synthetic_shot_folder(folder, files)
+        rows = []
+        for storage in ("plain", "compress", "deduplicate"):
+            scene = scenefile.SceneFile(os.path.join(
+                folder, versionindex.format_name("shot0", "anim", versions,
+                                                 ".ma")))
+            scene.compress = storage == "compress"
+            scene.deduplicate = storage == "deduplicate"
+            scene.next_avail_ver()
+            rows.append((storage, instrument.history[-1]))
+            scene.save_increment()
+            rows.append((storage, instrument.history[-1]))
+        print_row("operation", "storage", "wall (ms)", "maya calls",
+                  "peak (KiB)", "slowest phase")
+        for storage, data in rows:
+            phases = data["phases_s"]
+            slowest = max(phases, key=phases.get) if phases else "-"
+            peak = data["memory_peak_bytes"]
+            print_row(data["operation"].split(".")[-1], storage,
+                      "{:.2f}".format(data["wall_s"] * 1e3),
+                      data["maya_calls"],
+                      "-" if peak is None else peak // 1024, slowest)
+    finally:
+        mayascene.use_commands(None)
+        shutil.rmtree(folder)
+
+
+@benchmark
+def instrumented_scatter(points=200000, instances=5000):
+    """A recorded scatter of a synthetic mesh with a fake Maya.
+
+    The sampling and compute phases run the real code, the transforms
+    mode creation runs the command pattern of RandomScatter.create_chunked
+    against FakeCommands for the first instances.
+    """
+    cmds = instrument.counted(FakeCommands())
+    rng = np.random.RandomState(0)
+    normals = rng.normal(size=(points, 3))
+    adapter = meshsample.FakeMeshAdapter(
+        {"ground": (rng.random_sample((points, 3)) * 100.0, normals)})
+    settings = scatterengine.ScatterSettings(
+        scale_min=(0.5, 0.5, 0.5), scale_max=(2, 2, 2), seed=453,
+        align_to_normals=True, twist_max=360)
+    sources = ["rock", "bush", "tree"]
+    with instrument.recording("scatter.scatter_objects",
+                              sources=len(sources)) as record:
+        with record.phase("sample"):
+            sample = meshsample.read_selection(["ground"], adapter)
+        with record.phase("compute"):
+            keep, transforms = parallelscatter.generate(sample, settings, 25)
+            prototype_indices = instancer.assign_prototypes(
+                len(keep), len(sources), settings.seed)
+        with record.phase("create"):
+            names = []
+            for start in range(0, instances, 500):
+                chunk = np.arange(start, min(start + 500, instances))
+                with record.phase("get_scattered"):
+                    chunk_names = [cmds.instance(sources[index])[0]
+                                   for index in
+                                   prototype_indices[chunk].tolist()]
+                with record.phase("apply_transforms"):
+                    for position, name in zip(chunk.tolist(), chunk_names):
+                        cmds.xform(
+                            name,
+                            translation=transforms.translations[
+                                position].tolist(),
+                            rotation=transforms.rotations[position].tolist(),
+                            scale=transforms.scales[position].tolist())
+                names.extend(chunk_names)
+        with record.phase("group"):
+            cmds.group(names, name="scatter")
+    data = instrument.history[-1]
+    print_recording(data)
+    print("{} points, {} kept, {} instanced with {} Maya calls".format(
+        points, len(keep), instances, data["maya_calls"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*",
+                        help="benchmarks to run, defaults to all of them: "
+                             "{}".format(", ".join(sorted(BENCHMARKS))))
+    parser.add_argument("--metrics",
+                        help="append the instrument recordings to this "
+                             "JSON lines file")
+    parser.add_argument("--memory", action="store_true",
+                        help="trace allocations to record memory peaks, "
+                             "slows the benchmarks down")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmark: {}".format(", ".join(sorted(unknown))))
+    if args.memory:
+        instrument.enable_memory_tracing()
+    if args.metrics:
+        instrument.log_to_file(args.metrics)
+    for name in args.names or sorted(BENCHMARKS):
+        print("== {} ==".format(name))
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Streaming compression of saved scene files.
+
+A compressed scene keeps its scene file name with the codec suffix added,
+e.g. ``forest_floor_model_v012.ma.zst``. zstd is used when the zstandard
+module can be imported and gzip from the standard library otherwise. Files
+are compressed and decompressed a buffer at a time, so memory stays
+constant whatever the scene size.
+"""
+import gzip
+import io
+import os
+import shutil
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import reservation
+
+
+GZIP_EXT = ".gz"
+ZSTD_EXT = ".zst"
+SUFFIXES = (ZSTD_EXT, GZIP_EXT)
+
+# scenes are compressed for the network, so speed matters more than size
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+BUFFER_SIZE = 1024 * 1024
+
+
+def default_suffix():
+    """Return the suffix of the best codec available."""
+    return ZSTD_EXT if zstandard is not None else GZIP_EXT
+
+
+def suffix_of(path):
+    """Return the codec suffix of path, None if it is not compressed."""
+    for suffix in SUFFIXES:
+        if path.endswith(suffix):
+            return suffix
+    return None
+
+
+def _check_codec(suffix):
+    if suffix == ZSTD_EXT and zstandard is None:
+        raise ImportError("zstandard is needed for {} files".format(suffix))
+    if suffix not in SUFFIXES:
+        raise ValueError("Unknown compression suffix {}".format(suffix))
+
+
+def compress_stream(source, target, suffix):
+    """Compress the binary stream source into target."""
+    _check_codec(suffix)
+    if suffix == ZSTD_EXT:
+        zstandard.ZstdCompressor(level=ZSTD_LEVEL).copy_stream(
+            source, target, read_size=BUFFER_SIZE, write_size=BUFFER_SIZE)
+        return
+    # no name or time in the header, identical scenes compress identically
+    with gzip.GzipFile(filename="", mode="wb", compresslevel=GZIP_LEVEL,
+                       fileobj=target, mtime=0) as compressed:
+        shutil.copyfileobj(source, compressed, BUFFER_SIZE)
+
+
+def decompress_stream(source, target, suffix):
+    """Decompress the binary stream source into target."""
+    _check_codec(suffix)
+    if suffix == ZSTD_EXT:
+        zstandard.ZstdDecompressor().copy_stream(
+            source, target, read_size=BUFFER_SIZE, write_size=BUFFER_SIZE)
+        return
+    with gzip.GzipFile(mode="rb", fileobj=source) as compressed:
+        shutil.copyfileobj(compressed, target, BUFFER_SIZE)
+
+
+def compress_file(source_path, path):
+    """Compress a file to path in one rename, with the codec of its suffix.
+
+    Returns:
+        int: the compressed size in bytes.
+    """
+    suffix = suffix_of(path)
+    temp_path = reservation.temp_path_for(path)
+    try:
+        with io.open(source_path, "rb") as source:
+            with io.open(temp_path, "wb") as target:
+                compress_stream(source, target, suffix)
+        reservation.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return os.path.getsize(path)
+
+
+def decompress_file(path, target_path):
+    """Decompress the file at path to target_path."""
+    with io.open(path, "rb") as source:
+        with io.open(target_path, "wb") as target:
+            decompress_stream(source, target, suffix_of(path))
@@ -0,0 +1,124 @@
+"""Per point scatter density from painted or procedural maps.
+
+A DensityMap turns the points of a meshsample.MeshSample into weights in
+[0, 1] that scale the scatter percentage point by point, see
+sampling.select_points:
+
+* VERTEX_COLOR reads a channel, or the luminance, of a color set,
+* WEIGHT_MAP reads a painted per vertex attribute of the mesh shapes,
+* FALLOFF fades the density from a center point out to a radius.
+
+Maps are read with one bulk call per mesh through a meshsample.MeshAdapter
+and gathered for the whole sample in one indexing pass, so nothing here
+needs Maya. The points of a surfacesample.SurfaceSample get the values of
+the corners of their triangle, interpolated.
+"""
+import numpy as np
+
+
+NONE = "None"
+VERTEX_COLOR = "Vertex Color"
+WEIGHT_MAP = "Weight Map"
+FALLOFF = "Falloff"
+KINDS = (NONE, VERTEX_COLOR, WEIGHT_MAP, FALLOFF)
+
+LUMINANCE = "luminance"
+CHANNELS = {"red": 0, "green": 1, "blue": 2, "alpha": 3}
+_LUMINANCE_WEIGHTS = np.array([0.2126, 0.7152, 0.0722])
+
+
+class DensityMap(object):
+    """Where the density of a scatter comes from.
+
+    Args:
+        kind (str): one of KINDS.
+        name (str): color set or weight map attribute, an empty color set
+            is the current one.
+        channel (str): LUMINANCE or a key of CHANNELS for color sets.
+        center (tuple): world position of a falloff's full density.
+        radius (float): distance at which a falloff reaches 0.
+        exponent (float): shape of a falloff, 1 fades linearly.
+        invert (bool): use 1 - weight.
+    """
+
+    def __init__(self, kind=NONE, name="", channel=LUMINANCE,
+                 center=(0.0, 0.0, 0.0), radius=10.0, exponent=1.0,
+                 invert=False):
+        if kind not in KINDS:
+            raise ValueError("Unknown density map {}".format(kind))
+        self.kind = kind
+        self.name = name
+        self.channel = channel
+        self.center = tuple(float(value) for value in center)
+        self.radius = float(radius)
+        self.exponent = float(exponent)
+        self.invert = invert
+
+
+def color_weights(colors, channel=LUMINANCE):
+    """Return (n,) weights of (n, 4) RGBA colors, unset colors weigh 0."""
+    colors = np.clip(np.asarray(colors, dtype=np.float64), 0.0, 1.0)
+    if channel == LUMINANCE:
+        return colors[:, :3].dot(_LUMINANCE_WEIGHTS)
+    try:
+        return colors[:, CHANNELS[channel]]
+    except KeyError:
+        raise ValueError("Unknown color channel {}".format(channel))
+
+
+def falloff_weights(points, center, radius, exponent=1.0):
+    """Return 1 at center fading to 0 at radius, as (1 - d / r) ** exponent."""
+    if radius <= 0:
+        raise ValueError("The falloff radius must be positive")
+    offsets = np.asarray(points, dtype=np.float64) - np.asarray(center)
+    distances = np.sqrt(np.einsum("ij,ij->i", offsets, offsets))
+    return np.clip(1.0 - distances / radius, 0.0, 1.0) ** exponent
+
+
+def gather(sample, mesh_values):
+    """Pick the value of every sample point out of per mesh vertex arrays.
+
+    Args:
+        sample (meshsample.MeshSample): the points, or a
+            surfacesample.SurfaceSample.
+        mesh_values (list): one (vertices,) array per mesh of the sample.
+
+    Returns:
+        numpy.ndarray: (n,) float64 values in sample order.
+    """
+    if not mesh_values:
+        return np.empty(0)
+    sizes = [len(values) for values in mesh_values]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    values = np.concatenate(mesh_values).astype(np.float64)
+    if hasattr(sample, "barycentric"):
+        corners = offsets[sample.mesh_ids][:, None] + sample.corners
+        return np.einsum("ij,ij->i", values[corners], sample.barycentric)
+    return values[offsets[sample.mesh_ids] + sample.indices]
+
+
+def read_weights(density_map, sample, adapter):
+    """Return the (n,) weights of the points of sample, None for NONE.
+
+    Args:
+        density_map (DensityMap): the map to read.
+        sample (meshsample.MeshSample): the candidate points.
+        adapter (meshsample.MeshAdapter): the scene the maps are read from.
+    """
+    if density_map is None or density_map.kind == NONE:
+        return None
+    if density_map.kind == FALLOFF:
+        weights = falloff_weights(sample.points, density_map.center,
+                                  density_map.radius, density_map.exponent)
+    elif density_map.kind == VERTEX_COLOR:
+        weights = gather(sample, [
+            color_weights(adapter.vertex_colors(mesh, density_map.name),
+                          density_map.channel)
+            for mesh in sample.meshes])
+    else:
+        weights = np.clip(gather(sample, [
+            adapter.vertex_weights(mesh, density_map.name)
+            for mesh in sample.meshes]), 0.0, 1.0)
+    if density_map.invert:
+        weights = 1.0 - weights
+    return weights
@@ -0,0 +1,104 @@
+"""Point cloud payload for the instancer output mode of the scatter tool.
+
+Instead of one transform node per scattered instance, the whole scatter is
+written to a single particle shape driving an instancer. The per point
+arrays are built here without Maya so they can be checked and benchmarked
+headless; scatter.py only turns them into attribute values.
+"""
+import collections
+
+import numpy as np
+
+import sampling
+
+
+InstancerPayload = collections.namedtuple(
+    "InstancerPayload",
+    ["prototypes", "positions", "rotations", "scales", "prototype_indices"])
+
+
+def assign_prototypes(count, prototype_count, seed=0):
+    """Pick a prototype per point, unweighted, when build_payload is given
+    no prototype indices.
+
+    Prototypes are dealt round robin so every source is used evenly, then
+    shuffled with the seed. Unlike pick_prototypes, which scatter.py uses,
+    the picks depend on the point count, so a point can change prototype
+    when other points are added or removed.
+
+    Returns:
+        numpy.ndarray: (count,) int64 prototype indices.
+    """
+    if prototype_count < 1:
+        raise ValueError("At least one prototype is needed")
+    indices = np.arange(count, dtype=np.int64) % prototype_count
+    np.random.RandomState(seed).shuffle(indices)
+    return indices
+
+
+def pick_prototypes(indices, streams, prototype_weights, seed=0):
+    """Pick a prototype per point, weighted, from the point's own random
+    value so a vertex keeps its prototype whatever else is scattered.
+
+    Args:
+        indices (array): vertex index of every point.
+        streams (array): mesh id of every point.
+        prototype_weights (array): (k,) weight of every prototype, or
+            (n, k) weights per point.
+
+    Returns:
+        numpy.ndarray: (n,) int64 prototype indices.
+    """
+    if np.shape(prototype_weights)[-1] < 1:
+        raise ValueError("At least one prototype is needed")
+    return sampling.choose_weighted(indices, prototype_weights, seed,
+                                    streams, sampling.PROTOTYPE_CHANNEL)
+
+
+def build_payload(transforms, prototypes, seed=0, prototype_indices=None):
+    """Pack scatter transforms into an instancer payload.
+
+    Args:
+        transforms (scatterengine.ScatterTransforms): per point transforms.
+        prototypes (list): names of the instanced objects.
+        seed (int): seed of the assign_prototypes fallback.
+        prototype_indices (array): prototype of every point, usually from
+            pick_prototypes, defaults to assign_prototypes.
+
+    Returns:
+        InstancerPayload: contiguous float64 (n, 3) arrays, rotations in
+            degrees, and an (n,) int64 prototype index array.
+    """
+    count = len(transforms.translations)
+    if prototype_indices is None:
+        prototype_indices = assign_prototypes(count, len(prototypes), seed)
+    prototype_indices = np.asarray(prototype_indices, dtype=np.int64)
+    if prototype_indices.shape != (count,):
+        raise ValueError("Expected {} prototype indices, got {}".format(
+            count, prototype_indices.shape))
+    if count and (prototype_indices.min() < 0 or
+                  prototype_indices.max() >= len(prototypes)):
+        raise ValueError("Prototype index out of range")
+    return InstancerPayload(
+        list(prototypes),
+        np.ascontiguousarray(transforms.translations, dtype=np.float64),
+        np.ascontiguousarray(transforms.rotations, dtype=np.float64),
+        np.ascontiguousarray(transforms.scales, dtype=np.float64),
+        prototype_indices)
+
+
+def vector_values(array):
+    """Return an (n, 3) array as the list of tuples vectorArray expects."""
+    return [tuple(row) for row in array.tolist()]
+
+
+def iter_instances(payload):
+    """Yield (prototype, translation, rotation, scale) for every point.
+
+    Used to bake a payload back into real transform nodes.
+    """
+    for idx, prototype_idx in enumerate(payload.prototype_indices.tolist()):
+        yield (payload.prototypes[prototype_idx],
+               payload.positions[idx].tolist(),
+               payload.rotations[idx].tolist(),
+               payload.scales[idx].tolist())
@@ -0,0 +1,238 @@
+"""Instrumentation of the save and scatter tools.
+
+An operation is recorded with::
+
+    with instrument.recording("scatter", sources=3) as record:
+        with instrument.phase("sample"):
+            ...
+
+and logged when it ends as one JSON line on the ``sfa.metrics`` logger,
+with the wall time of its phases, the number of calls made to every Maya
+command and its memory peak. A recording opened inside another one is
+timed as a phase of it, so an operation is logged once however it is
+reached. Maya commands are counted when they are called through
+``counted(maya.cmds)``.
+
+Outside of a recording, phase() and the counted commands only cost a
+thread local lookup. Memory is traced with tracemalloc once
+enable_memory_tracing() is called or SFA_TRACE_MEMORY is set, the maximum
+resident size of the process is logged otherwise.
+"""
+import collections
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import timeit
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+import timing
+
+METRICS_LOGGER = "sfa.metrics"
+
+log = logging.getLogger(METRICS_LOGGER)
+
+# the last recordings as dictionaries, newest last
+history = collections.deque(maxlen=100)
+
+_local = threading.local()
+
+
+def current():
+    """Return the Recorder of the operation running in this thread."""
+    return getattr(_local, "recorder", None)
+
+
+def enable_memory_tracing():
+    """Trace Python and numpy allocations to log exact memory peaks."""
+    if tracemalloc is not None and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def _max_rss():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+class Recorder(timing.PhaseTimer):
+    """Phases, Maya command calls and memory of one operation.
+
+    Phases opened inside other phases are named "outer/inner". total is
+    the wall time of the whole operation.
+
+    Args:
+        name (str): the operation, e.g. "scenefile.save".
+        fields: values logged with the recording, such as a path.
+    """
+
+    def __init__(self, name, **fields):
+        super(Recorder, self).__init__()
+        self.name = name
+        self.fields = fields
+        self.commands = collections.Counter()
+        self.memory_peak = None
+        self.error = None
+        self._open_phases = []
+        self._start = timeit.default_timer()
+        self._elapsed = None
+        self._traced = tracemalloc is not None and tracemalloc.is_tracing()
+        if self._traced:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            self._start_memory = tracemalloc.get_traced_memory()[0]
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self._open_phases.append(name)
+        try:
+            with super(Recorder, self).phase("/".join(self._open_phases)):
+                yield
+        finally:
+            self._open_phases.pop()
+
+    @property
+    def total(self):
+        if self._elapsed is not None:
+            return self._elapsed
+        return timeit.default_timer() - self._start
+
+    def count(self, command, calls=1):
+        self.commands[command] += calls
+
+    def finish(self):
+        """Stop the clock and take the memory peak."""
+        self._elapsed = timeit.default_timer() - self._start
+        if self._traced:
+            # an older tracemalloc has no reset_peak, its peak may be older
+            self.memory_peak = max(
+                tracemalloc.get_traced_memory()[1] - self._start_memory, 0)
+
+    def to_dict(self):
+        data = collections.OrderedDict([
+            ("operation", self.name),
+            ("wall_s", round(self.total, 6)),
+            ("phases_s", collections.OrderedDict(
+                (name, round(elapsed, 6))
+                for name, elapsed in self.phases.items())),
+            ("maya_calls", sum(self.commands.values())),
+            ("maya_commands", dict(self.commands)),
+            ("memory_peak_bytes", self.memory_peak),
+            ("max_rss_bytes", _max_rss()),
+        ])
+        if self.error:
+            data["error"] = self.error
+        data.update(sorted(self.fields.items()))
+        return data
+
+
+@contextlib.contextmanager
+def recording(name, **fields):
+    """Record the body of a with block as the operation name.
+
+    Yields:
+        Recorder: the recorder, or the one of the enclosing operation
+            when name runs inside another recording.
+    """
+    recorder = current()
+    if recorder is not None:
+        with recorder.phase(name):
+            yield recorder
+        return
+    recorder = _local.recorder = Recorder(name, **fields)
+    try:
+        yield recorder
+    except BaseException as err:
+        recorder.error = type(err).__name__
+        raise
+    finally:
+        _local.recorder = None
+        recorder.finish()
+        data = recorder.to_dict()
+        history.append(data)
+        log.info(json.dumps(data))
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time the body of a with block as a phase of the current operation."""
+    recorder = current()
+    if recorder is None:
+        yield
+        return
+    with recorder.phase(name):
+        yield
+
+
+def count(command, calls=1):
+    """Count calls to a Maya command or API function not made through
+    counted(), such as MFnMesh.getPoints."""
+    recorder = current()
+    if recorder is not None:
+        recorder.count(command, calls)
+
+
+class CountedCommands(object):
+    """maya.cmds like object counting the calls made to every command.
+
+    Args:
+        commands (module): maya.cmds, or anything with the same functions.
+    """
+
+    def __init__(self, commands):
+        self._commands = commands
+
+    def __getattr__(self, name):
+        command = getattr(self._commands, name)
+        if not callable(command):
+            return command
+
+        def call(*args, **kwargs):
+            recorder = current()
+            if recorder is not None:
+                recorder.commands[name] += 1
+            return command(*args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = command.__doc__
+        # later lookups find the wrapper without going through __getattr__
+        setattr(self, name, call)
+        return call
+
+
+def counted(commands):
+    """Return commands wrapped in a CountedCommands."""
+    if isinstance(commands, CountedCommands):
+        return commands
+    return CountedCommands(commands)
+
+
+def log_to_file(path):
+    """Also write every recording as a line of the JSON lines file path.
+
+    Returns:
+        logging.Handler: the handler, to remove it again.
+    """
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    if log.getEffectiveLevel() > logging.INFO:
+        log.setLevel(logging.INFO)
+    return handler
+
+
+if os.environ.get("SFA_TRACE_MEMORY"):
+    enable_memory_tracing()
@@ -0,0 +1,56 @@
+"""Scene file commands of Maya used by the save tools.
+
+Maya is imported when one of these is first called rather than when the
+module loads, so the naming and versioning logic of the tools can be
+imported, and used, outside of Maya. Only maya.cmds is used, importing
+pymel.core costs seconds. The commands are counted by the instrument
+module, and use_commands() runs them against a stand in such as the fake
+scene of the benchmarks.
+"""
+import instrument
+
+FILE_TYPES = {".ma": "mayaAscii", ".mb": "mayaBinary"}
+
+_commands = None
+
+
+def use_commands(commands):
+    """Send the scene commands to a maya.cmds like object, None for Maya."""
+    global _commands
+    _commands = commands and instrument.counted(commands)
+
+
+def _cmds():
+    global _commands
+    if _commands is None:
+        import maya.cmds
+        _commands = instrument.counted(maya.cmds)
+    return _commands
+
+
+def scene_name():
+    """Return the path of the open scene, "" for an untitled scene."""
+    return _cmds().file(query=True, sceneName=True)
+
+
+def workspace_root():
+    """Return the root folder of the current project."""
+    return _cmds().workspace(query=True, rootDirectory=True)
+
+
+def rename(path):
+    """Give the open scene a new path without saving it."""
+    _cmds().file(rename=path)
+
+
+def save_as(path):
+    """Save the open scene to path, in the format of its extension."""
+    cmds = _cmds()
+    cmds.file(rename=path)
+    file_type = FILE_TYPES.get(path[path.rfind("."):].lower(), "mayaAscii")
+    return cmds.file(save=True, type=file_type)
+
+
+def open_file(path):
+    """Open the scene at path."""
+    return _cmds().file(path, open=True)
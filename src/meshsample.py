@@ -0,0 +1,268 @@
+"""Bulk readback of destination points for the scatter tool.
+
+A selection such as ``["pPlane1", "pSphere1.vtx[0:999]", "pCube1.f[2]"]``
+is parsed straight into per mesh vertex index arrays, then every mesh is
+read with one bulk call through a ``MeshAdapter``. No per component names
+are ever expanded, so the cost no longer grows with string allocations.
+
+``MayaMeshAdapter`` talks to OpenMaya 2.0, ``FakeMeshAdapter`` serves
+plain arrays so the sampling can be driven without Maya.
+"""
+import collections
+import re
+
+import numpy as np
+
+import instrument
+
+
+MeshSample = collections.namedtuple(
+    "MeshSample", ["meshes", "mesh_ids", "indices", "points", "normals"])
+
+_COMPONENT_RE = re.compile(
+    r"^(?P<node>[^.\[\]]+)"
+    r"(?:\.(?P<kind>\w+)\[(?:(?P<all>\*)|(?P<start>\d+)(?::(?P<stop>\d+))?)\])?$")
+
+
+def parse_component(item):
+    """Split a selection item into its node, component kind and range.
+
+    Args:
+        item (str): e.g. ``pSphere1``, ``pSphere1.vtx[5]``,
+            ``pSphere1.vtx[0:999]`` or ``pSphere1.vtx[*]``.
+
+    Returns:
+        tuple: (node, kind, start, stop) with an inclusive stop. kind is
+            None for a whole object, start and stop are None for ``[*]``.
+    """
+    match = _COMPONENT_RE.match(item)
+    if not match:
+        raise ValueError("Unable to parse selection item {}".format(item))
+    node, kind = match.group("node"), match.group("kind")
+    if kind is None or match.group("all"):
+        return node, kind, None, None
+    start = int(match.group("start"))
+    stop = match.group("stop")
+    stop = start if stop is None else int(stop)
+    return node, kind, start, stop
+
+
+class MeshAdapter(object):
+    """Interface used by read_selection to talk to a scene."""
+
+    def vertex_count(self, mesh):
+        raise NotImplementedError
+
+    def points(self, mesh):
+        """Return the (n, 3) vertex positions of a mesh."""
+        raise NotImplementedError
+
+    def normals(self, mesh):
+        """Return the (n, 3) vertex normals of a mesh."""
+        raise NotImplementedError
+
+    def to_vertices(self, items):
+        """Convert non vertex components to compact vertex range items."""
+        raise NotImplementedError
+
+    def triangles(self, mesh):
+        """Return the (t, 3) vertex indices of the triangles of a mesh and
+        the (t,) face each triangle belongs to."""
+        raise NotImplementedError
+
+    def vertex_colors(self, mesh, color_set=""):
+        """Return the (n, 4) RGBA vertex colors of a color set, the current
+        one when color_set is empty. Unset colors are -1."""
+        raise NotImplementedError
+
+    def vertex_weights(self, mesh, attribute):
+        """Return the (n,) values of a painted per vertex attribute."""
+        raise NotImplementedError
+
+
+class FakeMeshAdapter(MeshAdapter):
+    """Serve meshes held in memory as {name: (points, normals)}.
+
+    maps holds the color sets and weight maps of the meshes as
+    {mesh: {name: array}}, the current color set is named "colorSet1".
+    triangles holds the (t, 3) triangles of the meshes as {mesh: array},
+    each triangle its own face.
+    """
+
+    def __init__(self, meshes, maps=None, triangles=None):
+        self.meshes = meshes
+        self.maps = maps or {}
+        self.triangle_map = triangles or {}
+        self.reads = 0
+
+    def vertex_count(self, mesh):
+        return len(self.meshes[mesh][0])
+
+    def points(self, mesh):
+        self.reads += 1
+        return np.asarray(self.meshes[mesh][0], dtype=np.float64)
+
+    def normals(self, mesh):
+        self.reads += 1
+        return np.asarray(self.meshes[mesh][1], dtype=np.float64)
+
+    def to_vertices(self, items):
+        raise ValueError("FakeMeshAdapter only supports vertex components, "
+                         "got {}".format(items))
+
+    def triangles(self, mesh):
+        self.reads += 1
+        triangles = np.asarray(self.triangle_map[mesh], dtype=np.int64)
+        return triangles, np.arange(len(triangles))
+
+    def _map(self, mesh, name):
+        try:
+            return self.maps[mesh][name]
+        except KeyError:
+            raise ValueError("{} has no map {}".format(mesh, name))
+
+    def vertex_colors(self, mesh, color_set=""):
+        self.reads += 1
+        return np.asarray(self._map(mesh, color_set or "colorSet1"),
+                          dtype=np.float64)
+
+    def vertex_weights(self, mesh, attribute):
+        self.reads += 1
+        return np.asarray(self._map(mesh, attribute), dtype=np.float64)
+
+
+class MayaMeshAdapter(MeshAdapter):
+    """Read meshes with a single MFnMesh call each, in world space."""
+
+    def __init__(self):
+        import maya.api.OpenMaya as om
+        import maya.cmds as cmds
+        self._om = om
+        self._cmds = instrument.counted(cmds)
+
+    def _fn_mesh(self, mesh):
+        selection = self._om.MSelectionList()
+        selection.add(mesh)
+        dag_path = selection.getDagPath(0)
+        if not dag_path.hasFn(self._om.MFn.kMesh):
+            dag_path.extendToShape()
+        return self._om.MFnMesh(dag_path)
+
+    def vertex_count(self, mesh):
+        return self._fn_mesh(mesh).numVertices
+
+    def points(self, mesh):
+        instrument.count("MFnMesh.getPoints")
+        points = self._fn_mesh(mesh).getPoints(self._om.MSpace.kWorld)
+        return np.array(points, dtype=np.float64)[:, :3]
+
+    def normals(self, mesh):
+        instrument.count("MFnMesh.getVertexNormals")
+        normals = self._fn_mesh(mesh).getVertexNormals(
+            False, self._om.MSpace.kWorld)
+        return np.array(normals, dtype=np.float64)
+
+    def to_vertices(self, items):
+        # without flatten Maya answers with compact vtx[a:b] ranges
+        return self._cmds.polyListComponentConversion(items, toVertex=True)
+
+    def triangles(self, mesh):
+        instrument.count("MFnMesh.getTriangles")
+        counts, vertices = self._fn_mesh(mesh).getTriangles()
+        counts = np.array(counts, dtype=np.int64)
+        return (np.array(vertices, dtype=np.int64).reshape(-1, 3),
+                np.repeat(np.arange(len(counts)), counts))
+
+    def vertex_colors(self, mesh, color_set=""):
+        fn_mesh = self._fn_mesh(mesh)
+        if color_set and color_set not in fn_mesh.getColorSetNames():
+            raise ValueError("{} has no color set {}".format(mesh,
+                                                            color_set))
+        instrument.count("MFnMesh.getVertexColors")
+        colors = fn_mesh.getVertexColors(color_set)
+        return np.array(colors, dtype=np.float64).reshape(-1, 4)
+
+    def vertex_weights(self, mesh, attribute):
+        fn_mesh = self._fn_mesh(mesh)
+        plug = "{}.{}".format(fn_mesh.fullPathName(), attribute)
+        if not self._cmds.objExists(plug):
+            raise ValueError("{} has no weight map {}".format(mesh,
+                                                             attribute))
+        values = self._cmds.getAttr(plug) or []
+        if len(values) != fn_mesh.numVertices:
+            raise ValueError("{} is not painted on every vertex".format(
+                plug))
+        return np.array(values, dtype=np.float64)
+
+
+def selection_indices(selection, adapter):
+    """Resolve a selection to sorted unique vertex indices per mesh.
+
+    Returns:
+        collections.OrderedDict: {mesh: int64 index array}, in selection
+            order.
+    """
+    ranges = collections.OrderedDict()
+    to_convert = []
+    for item in selection:
+        try:
+            node, kind, start, stop = parse_component(item)
+        except ValueError:
+            # e.g. vtxFace[0][1] or a uv, left for the scene to convert
+            to_convert.append(item)
+            continue
+        if kind not in (None, "vtx"):
+            to_convert.append(item)
+            continue
+        if start is None:
+            start, stop = 0, adapter.vertex_count(node) - 1
+        ranges.setdefault(node, []).append((start, stop))
+    if to_convert:
+        for item in adapter.to_vertices(to_convert) or []:
+            node, kind, start, stop = parse_component(item)
+            if start is None:
+                start, stop = 0, adapter.vertex_count(node) - 1
+            ranges.setdefault(node, []).append((start, stop))
+
+    indices = collections.OrderedDict()
+    for node, node_ranges in ranges.items():
+        arrays = [np.arange(start, stop + 1, dtype=np.int64)
+                  for start, stop in node_ranges]
+        indices[node] = np.unique(np.concatenate(arrays))
+    return indices
+
+
+def read_selection(selection, adapter, with_normals=True):
+    """Read every selected vertex position and normal in bulk.
+
+    Args:
+        selection (list): selection items as returned by ``cmds.ls(sl=True)``.
+        adapter (MeshAdapter): the scene to read from.
+        with_normals (bool): also read the vertex normals.
+
+    Returns:
+        MeshSample: ``meshes`` lists the mesh names, ``mesh_ids`` gives the
+            position of each point's mesh in that list and ``indices`` its
+            vertex index. ``points`` and ``normals`` are contiguous (n, 3)
+            float64 arrays, ``normals`` is None without with_normals.
+    """
+    meshes, mesh_ids, indices, points, normals = [], [], [], [], []
+    for mesh_id, (mesh, mesh_indices) in enumerate(
+            selection_indices(selection, adapter).items()):
+        meshes.append(mesh)
+        mesh_ids.append(np.full(len(mesh_indices), mesh_id, dtype=np.int64))
+        indices.append(mesh_indices)
+        points.append(adapter.points(mesh)[mesh_indices])
+        if with_normals:
+            normals.append(adapter.normals(mesh)[mesh_indices])
+    if not meshes:
+        empty = np.empty((0, 3))
+        return MeshSample([], np.empty(0, dtype=np.int64),
+                          np.empty(0, dtype=np.int64), empty,
+                          empty.copy() if with_normals else None)
+    return MeshSample(
+        meshes,
+        np.concatenate(mesh_ids),
+        np.concatenate(indices),
+        np.ascontiguousarray(np.concatenate(points)),
+        np.ascontiguousarray(np.concatenate(normals)) if with_normals else None)
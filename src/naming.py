@@ -0,0 +1,171 @@
+"""Naming schema of versioned scene files.
+
+A schema is compiled once from a template such as
+``"{descriptor}_{task}_v{ver}{ext}"`` into a format string and a single
+regular expression, so formatting and parsing share one definition and
+cost one C level call per name. The default schema skips the expression:
+names are split at their last "_v", and the descriptor and task before it
+and the version and extension after it are looked up in small caches, since
+the files of a folder share a few of each.
+
+Descriptors may contain underscores: with the default tokens the task is
+the last underscore separated part before the version.
+"""
+import re
+
+
+FIELDS = ("descriptor", "task", "ver", "ext")
+
+DEFAULT_TEMPLATE = "{descriptor}_{task}_v{ver}{ext}"
+DEFAULT_TOKENS = {
+    "descriptor": r".+",
+    "task": r"[^_]+",
+    "ver": r"\d+",
+    "ext": r"\.[^.]+",
+}
+
+_TOKEN_RE = re.compile(r"{(\w+)}")
+# entries kept per split cache of the default schema before it is emptied
+_CACHE_SIZE = 10000
+
+# the two halves of a default name around its last "_v"
+_HEAD_MATCH = re.compile(r"({descriptor})_({task})\Z"
+                         .format(**DEFAULT_TOKENS)).match
+_TAIL_MATCH = re.compile(r"({ver})({ext})\Z".format(**DEFAULT_TOKENS)).match
+
+
+class NamingSchema(object):
+    """Format and parse (descriptor, task, ver, ext) scene file names.
+
+    Args:
+        template (str): literal text with one {descriptor}, {task}, {ver}
+            and {ext} token each.
+        padding (int): digits versions are zero padded to when formatted,
+            longer versions are formatted and parsed as they are.
+        tokens (dict): regular expressions overriding DEFAULT_TOKENS.
+    """
+
+    def __init__(self, template=DEFAULT_TEMPLATE, padding=3, tokens=None):
+        self.template = template
+        self.padding = padding
+        self.tokens = dict(DEFAULT_TOKENS, **(tokens or {}))
+        parts = _TOKEN_RE.split(template)
+        literals, names = parts[0::2], parts[1::2]
+        if sorted(names) != sorted(FIELDS):
+            raise ValueError("Naming template {!r} needs each of {} once"
+                             .format(template, ", ".join(FIELDS)))
+        pattern = []
+        format_string = []
+        for index, literal in enumerate(literals):
+            pattern.append(re.escape(literal))
+            format_string.append(literal.replace("{", "{{")
+                                 .replace("}", "}}"))
+            if index < len(names):
+                name = names[index]
+                pattern.append("({})".format(self.tokens[name]))
+                field = FIELDS.index(name)
+                format_string.append(
+                    "{{{}:0{}d}}".format(field, padding) if name == "ver"
+                    else "{{{}}}".format(field))
+        self.pattern = "".join(pattern)
+        self._format = "".join(format_string).format
+        self._match = re.compile(self.pattern + r"\Z").match
+        # position of each field among the groups of the expression
+        self._order = tuple(names.index(field) for field in FIELDS)
+        self._ver_group = names.index("ver")
+        self._default = (template == DEFAULT_TEMPLATE
+                         and self.tokens == DEFAULT_TOKENS)
+        self._heads = {}
+        self._tails = {}
+
+    def __repr__(self):
+        return "NamingSchema({!r}, padding={})".format(self.template,
+                                                       self.padding)
+
+    def format(self, descriptor, task, ver, ext):
+        """Return the file name of a version."""
+        return self._format(descriptor, task, ver, ext)
+
+    def _fields(self, groups):
+        groups = list(groups)
+        groups[self._ver_group] = int(groups[self._ver_group])
+        return tuple(groups[index] for index in self._order)
+
+    def _split(self, name):
+        """Split a name of the default schema without the expression.
+
+        Returns None when the name does not split cleanly, the expression
+        then has the last word, e.g. for an extension holding "_v".
+        """
+        heads, tails = self._heads, self._tails
+        head, sep, tail = name.rpartition("_v")
+        if not sep:
+            return None
+        fields = heads.get(head)
+        if fields is None:
+            if len(heads) > _CACHE_SIZE:
+                heads.clear()
+            match = _HEAD_MATCH(head)
+            if match is None:
+                return None
+            fields = heads[head] = match.groups()
+        end = tails.get(tail)
+        if end is None:
+            if len(tails) > _CACHE_SIZE:
+                tails.clear()
+            match = _TAIL_MATCH(tail)
+            if match is None:
+                return None
+            ver, ext = match.groups()
+            end = tails[tail] = (int(ver), ext)
+        return fields + end
+
+    def parse(self, name):
+        """Split a file name into its fields.
+
+        Returns:
+            tuple: (descriptor, task, ver, ext) with an int ver, or None
+                when the name does not follow the schema.
+        """
+        if self._default:
+            parts = self._split(name)
+            if parts is not None:
+                return parts
+        match = self._match(name)
+        if match is None:
+            return None
+        if self._order == (0, 1, 2, 3):
+            descriptor, task, ver, ext = match.groups()
+            return descriptor, task, int(ver), ext
+        return self._fields(match.groups())
+
+    def parse_many(self, names):
+        """Parse many file names, skipping those not following the schema.
+
+        Returns:
+            dict: {name: (descriptor, task, ver, ext)}.
+        """
+        parse = self.parse
+        parsed = {}
+        if self._default:
+            # _split inlined, the method call costs as much as the split
+            heads, tails = self._heads, self._tails
+            for name in names:
+                head, sep, tail = name.rpartition("_v")
+                fields = heads.get(head)
+                end = tails.get(tail)
+                if fields is None or end is None:
+                    parts = parse(name)
+                    if parts is not None:
+                        parsed[name] = parts
+                else:
+                    parsed[name] = fields + end
+            return parsed
+        for name in names:
+            parts = parse(name)
+            if parts is not None:
+                parsed[name] = parts
+        return parsed
+
+
+DEFAULT_SCHEMA = NamingSchema()
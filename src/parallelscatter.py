@@ -0,0 +1,147 @@
+"""Process pool generation of scatter transforms.
+
+The points of a scatter are split into jobs, one per destination mesh, and
+meshes whose selection only needs per point decisions are further cut in
+vertex blocks. Each job runs the selection, transform and normal alignment
+math, possibly in a worker process. Every random value is keyed by (seed,
+mesh, vertex), and the jobs only depend on the sample, so the result is bit
+identical for any number of workers. Only applying the result to the
+scene is left to the Maya main thread.
+"""
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+import instrument
+import sampling
+import scatterengine
+
+
+class GenerateJob(object):
+    """The points of one mesh, or one vertex block of it, to generate."""
+
+    def __init__(self, positions, points, indices, mesh_id, normals=None,
+                 weights=None):
+        self.positions = positions
+        self.points = points
+        self.indices = indices
+        self.mesh_id = mesh_id
+        self.normals = normals
+        self.weights = weights
+
+
+def split_jobs(sample, mode, block_size=65536, weights=None):
+    """Cut a meshsample.MeshSample, and its point weights, into generation
+    jobs.
+
+    Returns:
+        list: GenerateJob in sample order.
+    """
+    jobs = []
+    if not len(sample.mesh_ids):
+        return jobs
+    # the sample holds every mesh as one contiguous run of points
+    starts = np.flatnonzero(np.diff(sample.mesh_ids)) + 1
+    bounds = zip(np.concatenate([[0], starts]),
+                 np.concatenate([starts, [len(sample.mesh_ids)]]))
+    for start, stop in bounds:
+        step = block_size if mode in sampling.UNIFORM_MODES else stop - start
+        for block_start in range(start, stop, max(step, 1)):
+            block = np.arange(block_start, min(block_start + step, stop))
+            normals = None
+            if sample.normals is not None:
+                normals = sample.normals[block]
+            jobs.append(GenerateJob(
+                block, sample.points[block], sample.indices[block],
+                int(sample.mesh_ids[block_start]), normals,
+                weights[block] if weights is not None else None))
+    return jobs
+
+
+def generate_job(job, settings, percentage, mode, radius):
+    """Select the points of a job and compute their transforms.
+
+    Returns:
+        tuple: (kept sample positions, scatterengine.ScatterTransforms).
+    """
+    with instrument.phase("select_points"):
+        keep = sampling.select_points(mode, job.points, job.indices,
+                                      percentage, settings.seed, job.mesh_id,
+                                      radius, job.weights)
+    normals = job.normals[keep] if job.normals is not None else None
+    with instrument.phase("compute_transforms"):
+        transforms = scatterengine.compute_transforms(
+            job.points[keep], settings, job.indices[keep], job.mesh_id,
+            normals)
+    return job.positions[keep], transforms
+
+
+def _generate_job(args):
+    return generate_job(*args)
+
+
+def _spawn_context():
+    """Return a multiprocessing context starting fresh worker processes.
+
+    Forking the multi threaded Maya GUI process (Qt, TBB, OpenGL) can
+    deadlock, so workers are always spawned, and spawned with mayapy as the
+    Maya GUI binary cannot run them.
+    """
+    if not hasattr(multiprocessing, "get_context"):  # Python 2
+        context = multiprocessing
+    else:
+        context = multiprocessing.get_context("spawn")
+    executable = os.path.basename(sys.executable).lower()
+    if executable.startswith("maya") and not executable.startswith("mayapy"):
+        extension = os.path.splitext(executable)[1]
+        mayapy = os.path.join(os.path.dirname(sys.executable),
+                              "mayapy" + extension)
+        if os.path.exists(mayapy):
+            context.set_executable(mayapy)
+    return context
+
+
+def generate(sample, settings, percentage, mode=sampling.UNIFORM, radius=0.0,
+             workers=1, block_size=65536, weights=None):
+    """Select the scatter points of a sample and compute their transforms.
+
+    Args:
+        sample (meshsample.MeshSample): the destination points.
+        settings (scatterengine.ScatterSettings): ranges and seed.
+        percentage (float): share of the points to keep.
+        mode (str): one of sampling.MODES.
+        radius (float): Poisson Disk radius.
+        workers (int): processes to use, 1 runs in this process. The
+            select_points and compute_transforms phases of the current
+            instrument recording only include the jobs run in this process.
+        block_size (int): points per job for point local modes.
+        weights (array): (n,) density of every sample point in [0, 1],
+            e.g. from density.read_weights, None for a uniform density.
+
+    Returns:
+        tuple: (kept sample positions, scatterengine.ScatterTransforms).
+    """
+    jobs = split_jobs(sample, mode, block_size, weights)
+    args = [(job, settings, percentage, mode, radius) for job in jobs]
+    if workers > 1 and len(jobs) > 1:
+        pool = _spawn_context().Pool(min(workers, len(jobs)))
+        try:
+            results = pool.map(_generate_job, args)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_generate_job(arg) for arg in args]
+
+    if not results:
+        empty = np.empty((0, 3))
+        return (np.arange(0),
+                scatterengine.ScatterTransforms(empty, empty.copy(),
+                                                empty.copy()))
+    keep = np.concatenate([result[0] for result in results])
+    transforms = scatterengine.ScatterTransforms(
+        *[np.concatenate([result[1][field] for result in results])
+          for field in range(len(scatterengine.ScatterTransforms._fields))])
+    return keep, transforms
@@ -0,0 +1,180 @@
+"""Incremental state of the live scatter preview.
+
+The preview shows every candidate point of a sample and toggles their
+visibility, so a change in the UI becomes a small update instead of a new
+scatter:
+
+* moving the percentage in Uniform mode only adds or removes the points
+  whose random value, divided by their density weight, lies between the
+  old and the new threshold, found with a binary search in the points
+  sorted by that value,
+* changing a scale range only recomputes the scale column, a rotate range,
+  the twist or the alignment only the rotation column,
+* anything else, such as the seed or another sampling mode, recomputes the
+  selection and reports the difference with the previous one.
+
+Spacing and overlap avoidance are not previewed.
+"""
+import collections
+
+import numpy as np
+
+import parallelscatter
+import sampling
+import scatterengine
+
+
+PreviewUpdate = collections.namedtuple(
+    "PreviewUpdate", ["added", "removed", "columns"])
+
+ROTATIONS = "rotations"
+SCALES = "scales"
+
+_ROTATION_FIELDS = ("rotate_min", "rotate_max", "align_to_normals",
+                    "twist_min", "twist_max", "up_vector")
+_SCALE_FIELDS = ("scale_min", "scale_max")
+
+
+def _changed(old, new, fields):
+    return any(not np.array_equal(getattr(old, field), getattr(new, field))
+               for field in fields)
+
+
+class ScatterPreview(object):
+    """Visibility, rotations and scales of every candidate point.
+
+    Args:
+        sample (meshsample.MeshSample): the candidate points.
+        settings (scatterengine.ScatterSettings): ranges and seed.
+        percentage (float): share of the points to show.
+        mode (str): one of sampling.MODES.
+        radius (float): Poisson Disk radius.
+        weights (array): density of every point, None for a uniform one.
+    """
+
+    def __init__(self, sample, settings, percentage, mode=sampling.UNIFORM,
+                 radius=0.0, weights=None):
+        self.sample = sample
+        self.settings = settings
+        self.percentage = percentage
+        self.mode = mode
+        self.radius = radius
+        self.weights = weights
+        self.visible = np.zeros(len(sample.points), dtype=bool)
+        self._reorder()
+        self.visible = self._select()
+        self.rotations = self._rotations()
+        self.scales = self._scales()
+
+    @property
+    def visible_indices(self):
+        return np.flatnonzero(self.visible)
+
+    def _reorder(self):
+        values = sampling.random_values(self.sample.indices,
+                                        self.settings.seed,
+                                        self.sample.mesh_ids,
+                                        sampling.SELECT_CHANNEL)
+        if self.weights is not None:
+            # kept while value < percentage * weight
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = np.where(self.weights > 0, values / self.weights,
+                                  np.inf)
+        self._order = np.argsort(values, kind="stable")
+        self._sorted_values = values[self._order]
+
+    def _uniform_count(self, percentage):
+        if percentage >= 100 and self.weights is None:
+            return len(self._order)
+        return int(np.searchsorted(self._sorted_values, percentage / 100.0))
+
+    def _select(self):
+        visible = np.zeros(len(self.sample.points), dtype=bool)
+        if self.mode in sampling.UNIFORM_MODES:
+            visible[self._order[:self._uniform_count(self.percentage)]] = True
+        else:
+            keep, _ = parallelscatter.generate(
+                self.sample, self.settings, self.percentage, self.mode,
+                self.radius, weights=self.weights)
+            visible[keep] = True
+        return visible
+
+    def _rotations(self):
+        return scatterengine.compute_rotations(
+            self.settings, self.sample.indices, self.sample.mesh_ids,
+            self.sample.normals)
+
+    def _scales(self):
+        return scatterengine.compute_scales(
+            self.settings, self.sample.indices, self.sample.mesh_ids)
+
+    def _diff(self, visible):
+        added = np.flatnonzero(visible & ~self.visible)
+        removed = np.flatnonzero(self.visible & ~visible)
+        self.visible = visible
+        return added, removed
+
+    def set_percentage(self, percentage):
+        """Show percentage of the points.
+
+        Returns:
+            PreviewUpdate: the points that appeared and disappeared.
+        """
+        old_percentage, self.percentage = self.percentage, percentage
+        if self.mode not in sampling.UNIFORM_MODES:
+            added, removed = self._diff(self._select())
+            return PreviewUpdate(added, removed, ())
+        old_count = self._uniform_count(old_percentage)
+        new_count = self._uniform_count(percentage)
+        delta = np.sort(self._order[min(old_count, new_count):
+                                    max(old_count, new_count)])
+        empty = np.arange(0)
+        if new_count > old_count:
+            self.visible[delta] = True
+            return PreviewUpdate(delta, empty, ())
+        self.visible[delta] = False
+        return PreviewUpdate(empty, delta, ())
+
+    def set_weights(self, weights):
+        """Use another density map.
+
+        Returns:
+            PreviewUpdate: the points that appeared and disappeared.
+        """
+        self.weights = weights
+        self._reorder()
+        added, removed = self._diff(self._select())
+        return PreviewUpdate(added, removed, ())
+
+    def set_settings(self, settings, mode=None, radius=None):
+        """Apply new ranges, seed or sampling options.
+
+        Returns:
+            PreviewUpdate: the visibility changes and the names of the
+                recomputed columns, ROTATIONS and/or SCALES.
+        """
+        old = self.settings
+        self.settings = settings
+        reselect = (settings.seed != old.seed or
+                    (mode is not None and mode != self.mode) or
+                    (radius is not None and radius != self.radius))
+        if mode is not None:
+            self.mode = mode
+        if radius is not None:
+            self.radius = radius
+
+        added = removed = np.arange(0)
+        columns = []
+        if reselect:
+            if settings.seed != old.seed:
+                self._reorder()
+            added, removed = self._diff(self._select())
+        if settings.seed != old.seed or _changed(old, settings,
+                                                 _ROTATION_FIELDS):
+            self.rotations = self._rotations()
+            columns.append(ROTATIONS)
+        if settings.seed != old.seed or _changed(old, settings,
+                                                 _SCALE_FIELDS):
+            self.scales = self._scales()
+            columns.append(SCALES)
+        return PreviewUpdate(added, removed, tuple(columns))
@@ -0,0 +1,214 @@
+"""Race free version reservation for increment saves on shared storage.
+
+A version is claimed by creating its final file name with ``O_EXCL``: the
+file system guarantees a single winner, even between machines on NFS v3+
+and SMB, and in the uncontended case the claim is a single round trip. The
+empty placeholder is then replaced by the real scene in one atomic rename
+from a temporary file in the same folder, so nobody ever sees a partially
+written version.
+
+A placeholder left behind by a crashed save stays empty. Once it is older
+than the stale timeout it is reclaimed by the next artist who needs it. A
+Reservation remembers the placeholder it created, so it never commits over
+or removes a file that replaced it in the meantime.
+"""
+import errno
+import logging
+import os
+import socket
+import time
+
+import versionindex
+
+log = logging.getLogger(__name__)
+
+
+# an empty placeholder older than this belongs to a save that died
+STALE_SECONDS = 30 * 60
+MAX_ATTEMPTS = 10000
+
+
+class ReservationLost(Exception):
+    """The placeholder of a version was replaced by someone else."""
+
+
+def temp_path_for(path):
+    """Return a hidden temporary path next to path with the same extension.
+
+    The name never parses as a scene file, so version scans ignore it.
+    """
+    folder, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(folder, ".{}.tmp{}-{}{}".format(
+        stem, socket.gethostname().split(".")[0], os.getpid(), ext))
+
+
+def replace(src, dst):
+    """Move src over dst in one rename."""
+    if hasattr(os, "replace"):
+        os.replace(src, dst)
+    else:  # Python 2, rename only overwrites atomically on posix
+        if os.name == "nt" and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def _create_exclusive(path):
+    """Create an empty file at path, return False if it already exists."""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+    except OSError as err:
+        if err.errno == errno.EEXIST:
+            return False
+        raise
+    os.close(fd)
+    return True
+
+
+def _reclaim_stale(path, stale_after):
+    """Remove the placeholder at path if it was left by a dead save.
+
+    Returns:
+        bool: True if the name is free to be claimed again.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return True
+    if stat.st_size or time.time() - stat.st_mtime < stale_after:
+        return False
+    # renaming first makes sure only one of several reclaimers wins
+    graveyard = "{}.stale-{}".format(temp_path_for(path), int(time.time()))
+    try:
+        os.rename(path, graveyard)
+    except OSError:
+        return False
+    try:
+        moved = os.stat(graveyard)
+    except OSError:
+        return False
+    if (moved.st_ino, moved.st_mtime) != (stat.st_ino, stat.st_mtime):
+        # someone reclaimed it in between and this is their fresh claim,
+        # linking puts it back without overwriting a third saver's claim
+        try:
+            os.link(graveyard, path)
+        except OSError as err:
+            log.warning("Could not put back the version placeholder %s, "
+                        "it is kept as %s: %s", path, graveyard, err)
+            return False
+        os.remove(graveyard)
+        return False
+    os.remove(graveyard)
+    log.warning("Reclaimed stale version placeholder %s", path)
+    return True
+
+
+class Reservation(object):
+    """An exclusive claim on one version file name."""
+
+    def __init__(self, folder, descriptor, task, ver, ext, suffix="",
+                 schema=None):
+        self.folder = folder
+        self.descriptor = descriptor
+        self.task = task
+        self.ver = ver
+        self.ext = ext
+        self.path = os.path.join(
+            folder, versionindex.format_name(descriptor, task, ver, ext,
+                                             schema) + suffix)
+        self.temp_path = temp_path_for(self.path)
+        self.committed = False
+        self._placeholder = None
+
+    @staticmethod
+    def _identity(stat):
+        return stat.st_dev, stat.st_ino, stat.st_mtime
+
+    def claim(self, stale_after=STALE_SECONDS):
+        """Create the placeholder, reclaiming a stale one.
+
+        Returns:
+            bool: False if the version belongs to someone else.
+        """
+        if not (_create_exclusive(self.path) or (
+                _reclaim_stale(self.path, stale_after) and
+                _create_exclusive(self.path))):
+            return False
+        self._placeholder = self._identity(os.stat(self.path))
+        return True
+
+    def held(self):
+        """Return True while the version is still this claim's empty
+        placeholder."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (not stat.st_size and
+                self._identity(stat) == self._placeholder)
+
+    def renew(self):
+        """Claim the version again, after a release.
+
+        Returns:
+            bool: False if someone else took the version meanwhile.
+        """
+        if self.committed:
+            return False
+        return self.held() or self.claim(stale_after=float("inf"))
+
+    def commit(self, written_path=None):
+        """Move the written scene over the placeholder."""
+        replace(written_path or self.temp_path, self.path)
+        self.committed = True
+
+    def release(self):
+        """Give the version back if it was never committed."""
+        if self.committed:
+            return
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+        if self.held():
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def reserve_version(folder, descriptor, task, ext, start_ver=1,
+                    stale_after=STALE_SECONDS, suffix="", schema=None):
+    """Claim the first free version from start_ver upwards.
+
+    Args:
+        folder (str): the scene folder, created if missing.
+        start_ver (int): first version to try, usually the next version
+            the folder index knows of.
+        stale_after (float): seconds after which an empty placeholder is
+            considered abandoned.
+        suffix (str): one of versionindex.STORAGE_SUFFIXES to claim a
+            version that is stored another way.
+        schema (naming.NamingSchema): naming of the versions, defaults to
+            naming.DEFAULT_SCHEMA.
+
+    Returns:
+        Reservation: the claimed version.
+    """
+    if not os.path.isdir(folder):
+        try:
+            os.makedirs(folder)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+    ver = max(int(start_ver), 1)
+    for _ in range(MAX_ATTEMPTS):
+        reservation = Reservation(folder, descriptor, task, ver, ext,
+                                  suffix, schema)
+        if reservation.claim(stale_after):
+            versionindex.index_for(folder, schema).note_saved(
+                descriptor, task, ver, ext)
+            return reservation
+        ver += 1
+    raise RuntimeError("Unable to reserve a version of {}_{} in {}".format(
+        descriptor, task, folder))
@@ -0,0 +1,268 @@
+"""Deterministic point selection for the scatter tool.
+
+Random values come from a counter based generator: every point gets a
+value hashed from (seed, stream, vertex index) with SplitMix64, so picks
+are reproducible from the UI seed, computed in one vectorized pass, and a
+vertex keeps its value when other vertices are added to the mesh.
+
+Every mode takes optional per point weights, such as a density.py map:
+Uniform keeps a point with a probability of percentage times its weight,
+Exact and Blue Noise pick heavier points first through exponential race
+keys, and choose_weighted draws one of several options per point with a
+cumulative sum search.
+"""
+import numpy as np
+
+import spatialindex
+
+
+UNIFORM = "Uniform"
+EXACT = "Exact"
+POISSON_DISK = "Poisson Disk"
+BLUE_NOISE = "Blue Noise"
+# candidates drawn over the surface by area, see surfacesample.py
+SURFACE_AREA = "Surface Area"
+MODES = (UNIFORM, EXACT, POISSON_DISK, BLUE_NOISE, SURFACE_AREA)
+# modes keeping or dropping every point on its own, like Uniform
+UNIFORM_MODES = (UNIFORM, SURFACE_AREA)
+
+# channels keep the random values drawn for different uses independent
+SELECT_CHANNEL = 0
+ROTATE_CHANNEL = 1  # to 3, one per axis
+SCALE_CHANNEL = 4  # to 6, one per axis
+SPACING_CHANNEL = 7
+TWIST_CHANNEL = 8
+PROTOTYPE_CHANNEL = 9
+TRIANGLE_CHANNEL = 10
+BARYCENTRIC_CHANNEL = 11  # and 12
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _splitmix(z):
+    z = (z ^ (z >> np.uint64(30))) * _MIX1
+    z = (z ^ (z >> np.uint64(27))) * _MIX2
+    return z ^ (z >> np.uint64(31))
+
+
+def hash_keys(indices, seed=0, stream=0, channel=0):
+    """Return a uint64 hash per index, decorrelated between neighbours.
+
+    All arguments broadcast against each other.
+
+    Args:
+        indices (array): integer counters, usually vertex indices.
+        seed (int): the scatter seed.
+        stream (int or array): separates independent sequences, e.g. one
+            per destination mesh.
+        channel (int or array): separates the values drawn for different
+            uses of the same point, see the ``*_CHANNEL`` constants.
+    """
+    with np.errstate(over="ignore"):
+        indices = np.asarray(indices).astype(np.uint64)
+        stream = np.asarray(stream).astype(np.uint64)
+        channel = np.asarray(channel).astype(np.uint64)
+        seed_key = (np.uint64(seed & 0xFFFFFFFFFFFFFFFF) * _GOLDEN ^
+                    channel * _MIX1)
+        base = _splitmix(seed_key + stream)
+        return _splitmix(base + (indices + np.uint64(1)) * _GOLDEN)
+
+
+def random_values(indices, seed=0, stream=0, channel=0):
+    """Return a float64 in [0, 1) per index, see hash_keys."""
+    keys = hash_keys(indices, seed, stream, channel)
+    return (keys >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def weighted_keys(indices, weights, seed=0, stream=0):
+    """Return exponential race keys, -log(1 - u) / weight, per index.
+
+    The points with the n smallest keys are a weighted random sample of n
+    points without replacement. Points of weight 0 get an infinite key.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    keys = np.full(len(weights), np.inf)
+    positive = weights > 0
+    values = random_values(np.asarray(indices)[positive], seed,
+                           np.broadcast_to(stream, weights.shape)[positive])
+    keys[positive] = -np.log1p(-values) / weights[positive]
+    return keys
+
+
+def weighted_count(count, percentage, weights=None):
+    """Return how many points percentage of count points, or of their
+    weights, amounts to."""
+    if weights is not None:
+        return int(round(np.sum(weights) * percentage / 100.0))
+    return int(round(count * percentage / 100.0))
+
+
+def select_uniform(indices, percentage, seed=0, stream=0, weights=None):
+    """Keep each index with a probability of percentage / 100, times its
+    weight when weights are given.
+
+    Returns:
+        numpy.ndarray: positions into ``indices`` of the kept points.
+    """
+    if percentage >= 100 and weights is None:
+        return np.arange(len(indices))
+    values = random_values(indices, seed, stream)
+    threshold = percentage / 100.0
+    if weights is not None:
+        threshold = threshold * np.asarray(weights, dtype=np.float64)
+    return np.flatnonzero(values < threshold)
+
+
+def select_exact(indices, percentage, seed=0, stream=0, weights=None):
+    """Keep exactly round(n * percentage / 100) indices, in index order.
+
+    With weights, round(sum(weights) * percentage / 100) indices are
+    picked, heavier ones first, and never one of weight 0.
+    """
+    count = weighted_count(len(indices), percentage, weights)
+    if weights is not None:
+        count = min(count, int(np.count_nonzero(np.asarray(weights) > 0)))
+        keys = weighted_keys(indices, weights, seed, stream)
+    elif count >= len(indices):
+        return np.arange(len(indices))
+    else:
+        keys = hash_keys(indices, seed, stream)
+    if count <= 0:
+        return np.arange(0)
+    if count >= len(indices):
+        return np.arange(len(indices))
+    return np.sort(np.argpartition(keys, count - 1)[:count])
+
+
+def select_poisson_disk(points, radius, indices, seed=0, stream=0):
+    """Keep points so that no two kept points are closer than radius.
+
+    Candidates are visited in seeded random order and accepted when no
+    kept point lies within the radius.
+
+    Returns:
+        numpy.ndarray: positions into ``points`` of the kept points, sorted.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if radius <= 0 or len(points) < 2:
+        return np.arange(len(points))
+    order = np.argsort(hash_keys(indices, seed, stream), kind="stable")
+    return spatialindex.place_without_overlap(points, radius / 2.0,
+                                              order=order)
+
+
+def select_points(mode, points, indices, percentage, seed=0, stream=0,
+                  radius=0.0, weights=None):
+    """Select points with one of the MODES.
+
+    Poisson Disk first keeps percentage of the points like Uniform, then
+    thins them to the radius. Surface Area points are already spread by
+    area and are kept like Uniform ones.
+
+    Args:
+        weights (array): per point density in [0, 1] scaling percentage,
+            None for a uniform density.
+
+    Returns:
+        numpy.ndarray: positions into ``points`` of the kept points, sorted.
+    """
+    if mode == EXACT:
+        return select_exact(indices, percentage, seed, stream, weights)
+    if mode == BLUE_NOISE:
+        return select_blue_noise(points, percentage, indices, seed, stream,
+                                 weights=weights)
+    keep = select_uniform(indices, percentage, seed, stream, weights)
+    if mode == POISSON_DISK:
+        stream = np.broadcast_to(stream, np.shape(indices))
+        thinned = select_poisson_disk(points[keep], radius, indices[keep],
+                                      seed, stream[keep])
+        keep = keep[thinned]
+    return keep
+
+
+def _stratify(points, cell_size, keys):
+    cells = np.floor(points / cell_size).astype(np.int64)
+    # lowest key first inside each cell, then keep the first of every cell
+    order = np.lexsort((keys, cells[:, 2], cells[:, 1], cells[:, 0]))
+    ordered = cells[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = np.any(ordered[1:] != ordered[:-1], axis=1)
+    return order[first]
+
+
+def select_blue_noise(points, percentage, indices, seed=0, stream=0,
+                      iterations=16, weights=None):
+    """Keep about percentage of the points, spread evenly in space.
+
+    Space is split in cubic cells and one seeded random point is kept per
+    occupied cell, the one with the smallest weighted key with weights.
+    The cell size is bisected so the number of kept points lands close to
+    the target count.
+
+    Returns:
+        numpy.ndarray: positions into ``points`` of the kept points, sorted.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    target = weighted_count(len(points), percentage, weights)
+    if weights is None:
+        if target >= len(points):
+            return np.arange(len(points))
+        keys = hash_keys(indices, seed, stream)
+        return _blue_noise(points, target, keys, iterations)
+    candidates = np.flatnonzero(np.asarray(weights) > 0)
+    if target >= len(candidates):
+        return candidates
+    keys = weighted_keys(indices, weights, seed, stream)[candidates]
+    return candidates[_blue_noise(points[candidates], target, keys,
+                                  iterations)]
+
+
+def _blue_noise(points, target, keys, iterations):
+    if target <= 0:
+        return np.arange(0)
+    extent = float(np.max(points.max(axis=0) - points.min(axis=0))) or 1.0
+    low, high = extent * 1e-6, extent * 2.0
+    best = None
+    for _ in range(iterations):
+        cell_size = np.sqrt(low * high)
+        kept = _stratify(points, cell_size, keys)
+        if best is None or (abs(len(kept) - target) <
+                            abs(len(best) - target)):
+            best = kept
+        if len(kept) == target:
+            break
+        if len(kept) > target:
+            low = cell_size
+        else:
+            high = cell_size
+    return np.sort(best)
+
+
+def choose_weighted(indices, weights, seed=0, stream=0,
+                    channel=PROTOTYPE_CHANNEL):
+    """Pick one of k options per index with a probability proportional to
+    its weight, searching a uniform value in the cumulative weights.
+
+    Args:
+        weights (array): (k,) weights shared by every index, or (n, k)
+            weights of each index.
+
+    Returns:
+        numpy.ndarray: (n,) int64 picked options.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if np.any(weights < 0):
+        raise ValueError("Weights cannot be negative")
+    cumulative = np.cumsum(weights, axis=-1)
+    totals = cumulative[..., -1]
+    if np.any(totals <= 0):
+        raise ValueError("Every point needs a positive weight")
+    targets = random_values(indices, seed, stream, channel) * totals
+    if weights.ndim == 1:
+        picked = np.searchsorted(cumulative, targets, side="right")
+    else:
+        picked = np.count_nonzero(cumulative <= targets[:, None], axis=1)
+    # rounding can put a target on the last cumulative weight
+    return np.minimum(picked, weights.shape[-1] - 1).astype(np.int64)
@@ -1,15 +1,138 @@
-import random
+import contextlib
+import logging
+import multiprocessing
+import os
 from PySide2 import QtWidgets, QtCore
 from PySide2.QtCore import Qt, QItemSelectionModel
 from PySide2.QtWidgets import QAbstractItemView
 from shiboken2 import wrapInstance
-import maya.OpenMayaUI as omui
-import maya.cmds as cmds
-import pymel.core as pmc
+import numpy as np
+
+import batchscatter
+import density
+import instancer
+import instrument
+import meshsample
+import parallelscatter
+import preview
+import sampling
+import scattercache
+import scatterengine
+import spatialindex
+import surfacesample
+import tiling
+
+log = logging.getLogger(__name__)
+
+
+class _MayaCommands(object):
+    """maya.cmds, imported when a command is first used."""
+
+    def __getattr__(self, name):
+        import maya.cmds
+        return getattr(maya.cmds, name)
+
+
+# every command of the tool is counted in the instrument recordings
+cmds = instrument.counted(_MayaCommands())
+
+TRANSFORMS_MODE = "Transforms"
+INSTANCER_MODE = "Instancer"
+
+# name suffix of the low detail version of a source, see update_tile_lod
+LOW_DETAIL_SUFFIX = "_lod"
+# instances created between two progress updates
+APPLY_CHUNK_SIZE = 500
+# quiet time after the last UI change before the preview updates
+PREVIEW_DELAY_MS = 150
+
+
+def set_per_particle(particle_shape, arrays):
+    """Set per particle attributes, adding them and their initial state.
+
+    Args:
+        arrays (dict): {attribute: array}, (n, 3) arrays are written as
+            vectorArray, (n,) arrays as doubleArray.
+    """
+    for attr, array in arrays.items():
+        array = np.asarray(array, dtype=np.float64)
+        if array.ndim == 2:
+            data_type, values = "vectorArray", instancer.vector_values(array)
+        else:
+            data_type, values = "doubleArray", array.tolist()
+        for attr_name in (attr, attr + "0"):
+            if not cmds.attributeQuery(attr_name, node=particle_shape,
+                                       exists=True):
+                cmds.addAttr(particle_shape, longName=attr_name,
+                             dataType=data_type)
+        cmds.setAttr(particle_shape + "." + attr, values, type=data_type)
+    cmds.saveInitialState(particle_shape)
+
+
+@contextlib.contextmanager
+def suspended_viewport(suspend=True):
+    """Pause viewport refresh and viewport driven evaluation in a block."""
+    if not suspend:
+        yield
+        return
+    paused = cmds.ogs(query=True, pause=True)
+    cmds.refresh(suspend=True)
+    if not paused:
+        cmds.ogs(pause=True)
+    try:
+        yield
+    finally:
+        if not paused:
+            cmds.ogs(pause=True)
+        cmds.refresh(suspend=False)
+
+
+class PreviewDisplay(object):
+    """Bounding box instancer showing a preview.ScatterPreview.
+
+    Every candidate point is a particle, hidden or shown through a per
+    particle visibility, so updates only rewrite the arrays that changed.
+    """
+
+    def __init__(self, scatter_preview, prototypes):
+        self.preview = scatter_preview
+        points = scatter_preview.sample.points
+        self.particle, self.particle_shape = cmds.particle(
+            position=instancer.vector_values(points), name="scatterPreview")
+        set_per_particle(self.particle_shape, {
+            "visibilityPP": scatter_preview.visible,
+            "rotationPP": scatter_preview.rotations,
+            "scalePP": scatter_preview.scales,
+            # the real prototype depends on the final selection
+            "indexPP": np.arange(len(points)) % len(prototypes)})
+        self.instancer = cmds.particleInstancer(
+            self.particle_shape, addObject=True, object=prototypes,
+            levelOfDetail="BoundingBox", position="worldPosition",
+            rotation="rotationPP", scale="scalePP", objectIndex="indexPP",
+            visibility="visibilityPP")
+
+    def apply(self, update):
+        """Rewrite the per particle arrays touched by a preview.PreviewUpdate."""
+        arrays = {}
+        if len(update.added) or len(update.removed):
+            arrays["visibilityPP"] = self.preview.visible
+        if preview.ROTATIONS in update.columns:
+            arrays["rotationPP"] = self.preview.rotations
+        if preview.SCALES in update.columns:
+            arrays["scalePP"] = self.preview.scales
+        if arrays:
+            set_per_particle(self.particle_shape, arrays)
+
+    def delete(self):
+        if cmds.objExists(self.particle):
+            cmds.delete(self.particle)
+        if cmds.objExists(self.instancer):
+            cmds.delete(self.instancer)
 
 
 def maya_main_window():
     """Return Maya main window widget"""
+    import maya.OpenMayaUI as omui
     main_window = omui.MQtUtil.mainWindow()
     return wrapInstance(long(main_window), QtWidgets.QWidget)
 
@@ -30,32 +153,75 @@ class ScatterUI(QtWidgets.QDialog):
         self.create_ui()
         self.create_connections()
 
+    def closeEvent(self, event):
+        self.preview_checkbox.setChecked(False)
+        self.scatter.remove_callbacks()
+        super(ScatterUI, self).closeEvent(event)
+
     def create_ui(self):
         self.title_lbl = QtWidgets.QLabel("Scatter Tool")
         self.title_lbl.setStyleSheet("font: bold 20px")
         self.group_name_lay = self._create_group_name()
         self.source_list_lay = self._create_source_list()
         self.percentage_lay = self._create_percentage()
+        self.density_lay = self._create_density()
+        self.source_weights_lay = self._create_source_weights()
         self.seed_lay = self._create_seed()
+        self.sampling_lay = self._create_sampling()
         self.destination_lay = self._create_destination()
         self.input_ui = self._create_input_ui()
         self.button_lay = self._create_button_ui()
         self.normals_checkbox_lay = self._create_normals_checkbox()
+        self.spacing_lay = self._create_spacing()
+        self.output_mode_lay = self._create_output_mode()
+        self.tiling_lay = self._create_tiling()
+        self.progress_lay = self._create_progress_ui()
         self.main_lay = QtWidgets.QVBoxLayout()
         self.main_lay.addWidget(self.title_lbl)
         self.main_lay.addLayout(self.group_name_lay)
         self.main_lay.addLayout(self.source_list_lay)
         self.main_lay.addLayout(self.percentage_lay)
+        self.main_lay.addLayout(self.density_lay)
+        self.main_lay.addLayout(self.source_weights_lay)
         self.main_lay.addLayout(self.seed_lay)
+        self.main_lay.addLayout(self.sampling_lay)
         self.main_lay.addLayout(self.destination_lay)
         self.main_lay.addLayout(self.normals_checkbox_lay)
+        self.main_lay.addLayout(self.spacing_lay)
+        self.main_lay.addLayout(self.output_mode_lay)
+        self.main_lay.addLayout(self.tiling_lay)
         self.main_lay.addLayout(self.input_ui)
         self.main_lay.addLayout(self.button_lay)
+        self.main_lay.addLayout(self.progress_lay)
         self.setLayout(self.main_lay)
 
     @QtCore.Slot()
     def create_connections(self):
         self.scatter_btn.clicked.connect(self.scatter_objects)
+        self.bake_btn.clicked.connect(self.bake_instancer)
+        self.save_preset_btn.clicked.connect(self.save_preset)
+        self.update_lod_btn.clicked.connect(self.update_tile_lod)
+        self.cancel_btn.clicked.connect(self._cancel)
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DELAY_MS)
+        self.preview_timer.timeout.connect(self._update_preview)
+        self.preview_checkbox.toggled.connect(self._toggle_preview)
+        self.sampling_cbx.currentIndexChanged.connect(self._schedule_preview)
+        self.normals_checkbox.toggled.connect(self._schedule_preview)
+        self.density_cbx.currentIndexChanged.connect(self._schedule_preview)
+        self.density_invert_checkbox.toggled.connect(self._schedule_preview)
+        for line_edit in (self.seed_le, self.radius_le,
+                          self.density_name_le, self.falloff_radius_le,
+                          self.surface_count_le,
+                          self.xscale_min_le, self.yscale_min_le,
+                          self.zscale_min_le, self.xrotate_min_le,
+                          self.yrotate_min_le, self.zrotate_min_le,
+                          self.twist_min_le, self.xscale_max_le,
+                          self.yscale_max_le, self.zscale_max_le,
+                          self.xrotate_max_le, self.yrotate_max_le,
+                          self.zrotate_max_le, self.twist_max_le):
+            line_edit.editingFinished.connect(self._schedule_preview)
 
     def _create_normals_checkbox(self):
         self.normals_checkbox = QtWidgets.QCheckBox("Align with Normals")
@@ -64,6 +230,51 @@ class ScatterUI(QtWidgets.QDialog):
         layout.addWidget(self.normals_checkbox, 0, 0)
         return layout
 
+    def _create_spacing(self):
+        self.spacing_lbl = QtWidgets.QLabel("Min Spacing:")
+        self.spacing_lbl.setStyleSheet("font: bold")
+        self.spacing_le = QtWidgets.QLineEdit('0')
+        self.spacing_le.setMaximumWidth(50)
+        self.spacing_le.setAlignment(Qt.AlignHCenter)
+        self.overlap_checkbox = QtWidgets.QCheckBox("Avoid Overlap")
+        self.overlap_checkbox.setChecked(False)
+        layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.spacing_lbl)
+        layout.addWidget(self.spacing_le)
+        layout.addWidget(self.overlap_checkbox)
+        return layout
+
+    def _create_output_mode(self):
+        self.output_mode_lbl = QtWidgets.QLabel("Output:")
+        self.output_mode_lbl.setStyleSheet("font: bold")
+        self.output_mode_cbx = QtWidgets.QComboBox()
+        self.output_mode_cbx.addItems([TRANSFORMS_MODE, INSTANCER_MODE])
+        self.preview_checkbox = QtWidgets.QCheckBox("Live Preview")
+        self.preview_checkbox.setChecked(False)
+        layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.output_mode_lbl)
+        layout.addWidget(self.output_mode_cbx)
+        layout.addWidget(self.preview_checkbox)
+        return layout
+
+    def _create_tiling(self):
+        self.tile_size_lbl = QtWidgets.QLabel("Tile Size:")
+        self.tile_size_lbl.setStyleSheet("font: bold")
+        self.tile_size_le = QtWidgets.QLineEdit('0')
+        self.tile_size_le.setMaximumWidth(50)
+        self.tile_size_le.setAlignment(Qt.AlignHCenter)
+        self.tile_size_le.setToolTip("0 puts every instance in one group")
+        self.lod_distances_le = QtWidgets.QLineEdit('')
+        self.lod_distances_le.setPlaceholderText(
+            "low detail, box, hide distances")
+        self.update_lod_btn = QtWidgets.QPushButton("Update Tile LOD")
+        layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.tile_size_lbl)
+        layout.addWidget(self.tile_size_le)
+        layout.addWidget(self.lod_distances_le)
+        layout.addWidget(self.update_lod_btn)
+        return layout
+
     def _create_group_name(self):
         self.group_name_lbl = QtWidgets.QLabel("Group Name:")
         self.group_name_lbl.setStyleSheet("font: bold")
@@ -75,8 +286,31 @@ class ScatterUI(QtWidgets.QDialog):
 
     def _create_button_ui(self):
         self.scatter_btn = QtWidgets.QPushButton("Scatter")
+        self.bake_btn = QtWidgets.QPushButton("Bake Instancer")
+        self.save_preset_btn = QtWidgets.QPushButton("Save Preset")
         layout = QtWidgets.QHBoxLayout()
         layout.addWidget(self.scatter_btn)
+        layout.addWidget(self.bake_btn)
+        layout.addWidget(self.save_preset_btn)
+        return layout
+
+    def _create_progress_ui(self):
+        self.suspend_checkbox = QtWidgets.QCheckBox("Suspend Viewport")
+        self.suspend_checkbox.setChecked(True)
+        self.disk_cache_checkbox = QtWidgets.QCheckBox("Disk Cache")
+        self.disk_cache_checkbox.setChecked(False)
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setValue(0)
+        self.cancel_btn = QtWidgets.QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.timing_lbl = QtWidgets.QLabel("")
+        self.timing_lbl.setWordWrap(True)
+        layout = QtWidgets.QGridLayout()
+        layout.addWidget(self.suspend_checkbox, 0, 0)
+        layout.addWidget(self.disk_cache_checkbox, 0, 1)
+        layout.addWidget(self.progress_bar, 1, 0)
+        layout.addWidget(self.cancel_btn, 1, 1)
+        layout.addWidget(self.timing_lbl, 2, 0, 1, 2)
         return layout
 
     def _create_source_list(self):
@@ -109,9 +343,65 @@ class ScatterUI(QtWidgets.QDialog):
         layout.addWidget(self.percentage_value_lbl)
         return layout
 
+    def _create_density(self):
+        self.density_lbl = QtWidgets.QLabel("Density:")
+        self.density_lbl.setStyleSheet("font: bold")
+        self.density_cbx = QtWidgets.QComboBox()
+        self.density_cbx.addItems(density.KINDS)
+        self.density_name_le = QtWidgets.QLineEdit('')
+        self.density_name_le.setPlaceholderText(
+            "color set, weight map or falloff center")
+        self.falloff_radius_lbl = QtWidgets.QLabel("Falloff Radius:")
+        self.falloff_radius_le = QtWidgets.QLineEdit('10')
+        self.falloff_radius_le.setMaximumWidth(50)
+        self.falloff_radius_le.setAlignment(Qt.AlignHCenter)
+        self.density_invert_checkbox = QtWidgets.QCheckBox("Invert")
+        layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.density_lbl)
+        layout.addWidget(self.density_cbx)
+        layout.addWidget(self.density_name_le)
+        layout.addWidget(self.falloff_radius_lbl)
+        layout.addWidget(self.falloff_radius_le)
+        layout.addWidget(self.density_invert_checkbox)
+        return layout
+
+    def _create_source_weights(self):
+        self.source_weights_lbl = QtWidgets.QLabel("Source Weights:")
+        self.source_weights_lbl.setStyleSheet("font: bold")
+        self.source_weights_le = QtWidgets.QLineEdit('')
+        self.source_weights_le.setPlaceholderText(
+            "e.g. 1, 1, 0.2 in source order, empty for even")
+        layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.source_weights_lbl)
+        layout.addWidget(self.source_weights_le)
+        return layout
+
     def _slider_changed(self):
         # print(self.percentage_slider.value()) <-- debug
         self.percentage_value_lbl.setText(str(self.percentage_slider.value()))
+        self._schedule_preview()
+
+    @QtCore.Slot()
+    def _schedule_preview(self):
+        """Update the preview once the UI has been still for a moment."""
+        if self.preview_checkbox.isChecked():
+            self.preview_timer.start()
+
+    @QtCore.Slot()
+    def _update_preview(self):
+        self.scatter.update_preview()
+
+    @QtCore.Slot(bool)
+    def _toggle_preview(self, checked):
+        if checked:
+            self.scatter.start_preview(self._selected_sources(),
+                                       cmds.ls(sl=True))
+        else:
+            self.preview_timer.stop()
+            self.scatter.stop_preview()
+
+    def _selected_sources(self):
+        return [item.text() for item in self.source_list.selectedItems()]
 
     def _create_seed(self):
         self.seed_lbl = QtWidgets.QLabel("Set Seed:")
@@ -125,6 +415,34 @@ class ScatterUI(QtWidgets.QDialog):
         layout.addWidget(self.seed_le)
         return layout
 
+    def _create_sampling(self):
+        self.sampling_lbl = QtWidgets.QLabel("Sampling:")
+        self.sampling_lbl.setStyleSheet("font: bold")
+        self.sampling_cbx = QtWidgets.QComboBox()
+        self.sampling_cbx.addItems(sampling.MODES)
+        self.radius_lbl = QtWidgets.QLabel("Poisson Radius:")
+        self.radius_le = QtWidgets.QLineEdit('1')
+        self.radius_le.setMaximumWidth(50)
+        self.radius_le.setAlignment(Qt.AlignHCenter)
+        self.surface_count_lbl = QtWidgets.QLabel("Surface Points:")
+        self.surface_count_le = QtWidgets.QLineEdit('10000')
+        self.surface_count_le.setMaximumWidth(70)
+        self.surface_count_le.setAlignment(Qt.AlignHCenter)
+        self.workers_lbl = QtWidgets.QLabel("Workers:")
+        self.workers_sbx = QtWidgets.QSpinBox()
+        self.workers_sbx.setRange(1, multiprocessing.cpu_count())
+        self.workers_sbx.setValue(1)
+        layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.sampling_lbl)
+        layout.addWidget(self.sampling_cbx)
+        layout.addWidget(self.radius_lbl)
+        layout.addWidget(self.radius_le)
+        layout.addWidget(self.surface_count_lbl)
+        layout.addWidget(self.surface_count_le)
+        layout.addWidget(self.workers_lbl)
+        layout.addWidget(self.workers_sbx)
+        return layout
+
     def _create_destination(self):
         """select destination vertices"""
         self.destination_lbl = QtWidgets.QLabel("Please select the objects and vertices you would like to scatter to.")
@@ -152,12 +470,15 @@ class ScatterUI(QtWidgets.QDialog):
         self.yrotate_min_le.setMinimumWidth(100)
         self.zrotate_min_le = QtWidgets.QLineEdit('0')
         self.zrotate_min_le.setMinimumWidth(100)
+        self.twist_min_le = QtWidgets.QLineEdit('0')
+        self.twist_min_le.setMinimumWidth(100)
         layout.addWidget(self.xscale_min_le, 1, 1)
         layout.addWidget(self.yscale_min_le, 2, 1)
         layout.addWidget(self.zscale_min_le, 3, 1)
         layout.addWidget(self.xrotate_min_le, 4, 1)
         layout.addWidget(self.yrotate_min_le, 5, 1)
         layout.addWidget(self.zrotate_min_le, 6, 1)
+        layout.addWidget(self.twist_min_le, 7, 1)
         return layout
 
     def _max_input_ui(self, layout):  # edit transform maximum UI
@@ -173,12 +494,15 @@ class ScatterUI(QtWidgets.QDialog):
         self.yrotate_max_le.setMinimumWidth(100)
         self.zrotate_max_le = QtWidgets.QLineEdit('0')
         self.zrotate_max_le.setMinimumWidth(100)
+        self.twist_max_le = QtWidgets.QLineEdit('0')
+        self.twist_max_le.setMinimumWidth(100)
         layout.addWidget(self.xscale_max_le, 1, 2)
         layout.addWidget(self.yscale_max_le, 2, 2)
         layout.addWidget(self.zscale_max_le, 3, 2)
         layout.addWidget(self.xrotate_max_le, 4, 2)
         layout.addWidget(self.yrotate_max_le, 5, 2)
         layout.addWidget(self.zrotate_max_le, 6, 2)
+        layout.addWidget(self.twist_max_le, 7, 2)
         return layout
 
     def _create_input_headers(self):  # Labels for Min/Max transform inputs
@@ -192,6 +516,7 @@ class ScatterUI(QtWidgets.QDialog):
         self.xrotate_lbl = QtWidgets.QLabel("x Rotate")
         self.yrotate_lbl = QtWidgets.QLabel("y Rotate")
         self.zrotate_lbl = QtWidgets.QLabel("z Rotate")
+        self.twist_lbl = QtWidgets.QLabel("Normal Twist")
         layout = QtWidgets.QGridLayout()
         layout.addWidget(self.xscale_lbl, 1, 0)
         layout.addWidget(self.yscale_lbl, 2, 0)
@@ -199,90 +524,720 @@ class ScatterUI(QtWidgets.QDialog):
         layout.addWidget(self.xrotate_lbl, 4, 0)
         layout.addWidget(self.yrotate_lbl, 5, 0)
         layout.addWidget(self.zrotate_lbl, 6, 0)
+        layout.addWidget(self.twist_lbl, 7, 0)
         layout.addWidget(self.min_lbl, 0, 1)
         layout.addWidget(self.max_lbl, 0, 2)
         return layout
 
     @QtCore.Slot()
     def scatter_objects(self):
-        source_objects = []
-        for source_obj in self.source_list.selectedItems():
-            source_objects.append(source_obj.text())
+        source_objects = self._selected_sources()
+        self.preview_checkbox.setChecked(False)
+        self._cancel_requested = False
+        self.progress_bar.setValue(0)
+        enabled = self._lock_while_applying()
+        try:
+            timer = self.scatter.scatter_objects(
+                source_objects, cmds.ls(sl=True),
+                progress=self._update_progress)
+        finally:
+            for widget, state in enabled:
+                widget.setEnabled(state)
+        self.timing_lbl.setText(timer.report())
+
+    def _lock_while_applying(self):
+        """Disable every control but Cancel.
+
+        Events are processed during the apply, and any scene edit made
+        from the window meanwhile, such as a preview, would land in the
+        undo chunk of the scatter and be undone by Cancel with it.
+
+        Returns:
+            list: (widget, enabled) to restore afterwards.
+        """
+        enabled = []
+        for widget in self.findChildren(QtWidgets.QWidget):
+            if widget in (self.progress_bar, self.timing_lbl):
+                continue
+            enabled.append((widget, widget.isEnabled()))
+            widget.setEnabled(widget is self.cancel_btn)
+        return enabled
+
+    def _update_progress(self, done, total):
+        """Show the apply progress, return False once Cancel is pressed."""
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+        QtWidgets.QApplication.processEvents()
+        return not self._cancel_requested
 
-        self.scatter.scatter_objects(source_objects,
-                                     cmds.ls(sl=True))
+    @QtCore.Slot()
+    def _cancel(self):
+        self._cancel_requested = True
+
+    @QtCore.Slot()
+    def bake_instancer(self):
+        """Bake the selected scatter particles to transform nodes"""
+        self.scatter.bake_to_transforms(cmds.ls(sl=True))
+
+    @QtCore.Slot()
+    def update_tile_lod(self):
+        """Show the tiles of the selected scatter groups by camera distance"""
+        groups = cmds.ls(sl=True) or [self.group_name_le.displayText()]
+        self.scatter.update_tile_lod(groups)
+
+    @QtCore.Slot()
+    def save_preset(self):
+        """Save the settings, sources and selection as a batch preset"""
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Save Scatter Preset", "", "Scatter Presets (*.json)")
+        if not path:
+            return
+        batchscatter.save_preset(
+            batchscatter.preset_from_ui(self, self._selected_sources(),
+                                        cmds.ls(sl=True)), path)
+        log.info("Saved scatter preset %s", path)
 
 
 class RandomScatter(object):
     """random scatter logic."""
 
     def __init__(self, ui_instance):
+        import maya.api.OpenMaya as om
+        self._om = om
         self.ui_scatter = ui_instance
-        pass
-
-    def scatter_objects(self, source_selection, destination_selection):
-        vtx_selection = cmds.polyListComponentConversion(
-            destination_selection, toVertex=True)
-        vtx_selection = cmds.filterExpand(vtx_selection, selectionMask=31)
-        scatter_vertex_selection = self.select_percentage(vtx_selection, len(vtx_selection))
-
-        scattered_instances = self.get_scattered(source_selection, scatter_vertex_selection)
-        scatter_index = 0
-        for vtx in scatter_vertex_selection:
-            scatter_instance = scattered_instances[scatter_index]
-            # scale random or align to normals
-            pos = cmds.xform([vtx], query=True, translation=True)
-            cmds.xform(scatter_instance, translation=pos)
-            if self.ui_scatter.normals_checkbox.checkState == 2:
-                self.align_to_normals(vtx, scatter_instance)
-            scatter_index += 1
-        # Create group for scattered objects, change name
-        cmds.group(scattered_instances, name=self.ui_scatter.group_name_le.displayText())
-
-    def get_scattered(self, source_selection, verts):
-        scattered_instances = []
-        i = 0
-        for vtx in verts:
-            scatter_instance = cmds.instance(source_selection[i])
-            self.random_scale(scatter_instance)  # perform random scale
-            scattered_instances.append(scatter_instance[0])
-            if i == (len(source_selection) - 1):
-                i = 0
+        self.cache = scattercache.ScatterCache()
+        self._sample_callbacks = {}
+        self._stale_samples = []
+        self.preview = None
+        self.preview_display = None
+        self._density = None
+        self._surface = None
+        self._preview_selection = None
+
+    def scatter_objects(self, source_selection, destination_selection,
+                        progress=None):
+        """Scatter the sources over the destination selection.
+
+        The scene edits are made in chunks inside a single undo chunk.
+        progress is called as progress(done, total) after every chunk and
+        cancels the scatter, undoing it, when it returns False.
+
+        Returns:
+            instrument.Recorder: time spent sampling, computing, creating
+                and grouping, and the Maya commands called.
+        """
+        with instrument.recording(
+                "scatter.scatter_objects", sources=len(source_selection),
+                destinations=len(destination_selection)) as timer:
+            keep = self._scatter_objects(timer, source_selection,
+                                         destination_selection, progress)
+            timer.fields["instances"] = len(keep)
+        log.info("Scatter of %d instances: %s", len(keep), timer.report())
+        return timer
+
+    def _scatter_objects(self, timer, source_selection,
+                         destination_selection, progress):
+        settings = self.settings_from_ui()
+        with timer.phase("sample"):
+            sample = self.read_candidates(destination_selection, settings,
+                                          settings.align_to_normals)
+        with timer.phase("compute"):
+            keep, transforms, prototype_indices = self.compute_scatter(
+                sample, settings, source_selection)
+        group_name = self.ui_scatter.group_name_le.displayText()
+        tile_size = float(self.ui_scatter.tile_size_le.displayText())
+
+        completed = False
+        undo_enabled = cmds.undoInfo(query=True, state=True)
+        if not undo_enabled:
+            # a cancel deletes the new top level nodes instead of undoing
+            existing = set(cmds.ls(assemblies=True, long=True))
+        cmds.undoInfo(openChunk=True, chunkName="scatter")
+        try:
+            with suspended_viewport(
+                    self.ui_scatter.suspend_checkbox.isChecked()):
+                if tile_size > 0:
+                    with timer.phase("tiles"):
+                        tiles = tiling.partition(
+                            transforms.translations, tile_size,
+                            self.instance_radii(source_selection,
+                                                transforms,
+                                                prototype_indices))
+                    completed = self.create_tiles(
+                        tiles, source_selection, transforms,
+                        prototype_indices, group_name, progress)
+                elif self.ui_scatter.output_mode_cbx.currentText() == \
+                        INSTANCER_MODE:
+                    with timer.phase("create"):
+                        payload = instancer.build_payload(
+                            transforms,
+                            self.source_transforms(source_selection),
+                            prototype_indices=prototype_indices)
+                        self.create_instancer(payload, group_name)
+                    if progress:
+                        progress(len(keep), len(keep))
+                    completed = True
+                else:
+                    with timer.phase("create"):
+                        scattered_instances = self.create_chunked(
+                            source_selection, transforms, prototype_indices,
+                            progress)
+                    if scattered_instances is not None:
+                        # Create group for scattered objects, change name
+                        with timer.phase("group"):
+                            cmds.group(scattered_instances, name=group_name)
+                        completed = True
+        finally:
+            cmds.undoInfo(closeChunk=True)
+        if not completed:
+            if undo_enabled:
+                cmds.undo()
             else:
-                i += 1
-        random.shuffle(scattered_instances)
+                created = [node for node in
+                           cmds.ls(assemblies=True, long=True)
+                           if node not in existing]
+                if created:
+                    cmds.delete(created)
+            log.warning("Scatter cancelled, the scene was left unchanged.")
+        return keep
+
+    def create_chunked(self, source_selection, transforms, prototype_indices,
+                       progress=None):
+        """Instance and place the sources APPLY_CHUNK_SIZE at a time.
+
+        Returns:
+            list: the instances, or None if progress asked to cancel.
+        """
+        scattered_instances = []
+        total = len(prototype_indices)
+        for start in range(0, total, APPLY_CHUNK_SIZE):
+            chunk = np.arange(start, min(start + APPLY_CHUNK_SIZE, total))
+            chunk_instances = self.get_scattered(source_selection,
+                                                 prototype_indices[chunk])
+            self.apply_transforms(chunk_instances,
+                                  scatterengine.take(transforms, chunk))
+            scattered_instances.extend(chunk_instances)
+            if progress and not progress(len(scattered_instances), total):
+                return None
         return scattered_instances
 
-    def random_scale(self, randomized_object):
-        if self.ui_scatter.normals_checkbox.checkState() == 0:
-            xRot = random.uniform(float(self.ui_scatter.xrotate_min_le.displayText()), float(self.ui_scatter.xrotate_max_le.displayText()))
-            yRot = random.uniform(float(self.ui_scatter.yrotate_min_le.displayText()), float(self.ui_scatter.yrotate_max_le.displayText()))
-            zRot = random.uniform(float(self.ui_scatter.zrotate_min_le.displayText()), float(self.ui_scatter.zrotate_max_le.displayText()))
-            cmds.rotate(xRot, yRot, zRot, randomized_object)
+    def create_tiles(self, tiles, source_selection, transforms,
+                     prototype_indices, group_name, progress=None):
+        """Create one group, or instancer, per tile under group_name.
+
+        Every tile group records the bounds of its instances for
+        update_tile_lod. Instancer tiles also instance the low detail
+        version of every source, see low_detail_prototypes.
+
+        Returns:
+            bool: False if progress asked to cancel.
+        """
+        members = tiling.tile_members(tiles)
+        tile_nodes = []
+        if self.ui_scatter.output_mode_cbx.currentText() == INSTANCER_MODE:
+            prototypes = self.source_transforms(source_selection)
+            prototypes += self.low_detail_prototypes(prototypes)
+            done = 0
+            with instrument.phase("create"):
+                for cell, tile in zip(tiles.cells, members):
+                    name = tiling.tile_name(group_name, cell)
+                    particle_shape = self.create_instancer(
+                        instancer.build_payload(
+                            scatterengine.take(transforms, tile),
+                            prototypes,
+                            prototype_indices=prototype_indices[tile]),
+                        name + "_particles")
+                    tile_nodes.append(cmds.group(
+                        cmds.listRelatives(particle_shape, parent=True) +
+                        cmds.listConnections(particle_shape,
+                                             type="instancer"),
+                        name=name))
+                    done += len(tile)
+                    if progress and not progress(done, len(tiles.order)):
+                        return False
+            prototype_count = len(source_selection)
+        else:
+            with instrument.phase("create"):
+                scattered_instances = self.create_chunked(
+                    source_selection,
+                    scatterengine.take(transforms, tiles.order),
+                    prototype_indices[tiles.order], progress)
+            if scattered_instances is None:
+                return False
+            with instrument.phase("group"):
+                for cell, start, count in zip(tiles.cells, tiles.starts,
+                                              tiles.counts):
+                    tile_nodes.append(cmds.group(
+                        scattered_instances[start:start + count],
+                        name=tiling.tile_name(group_name, cell)))
+            prototype_count = 0
+        with instrument.phase("group"):
+            for node, low, high in zip(tile_nodes, tiles.bounds_min,
+                                       tiles.bounds_max):
+                self.tag_tile(node, low, high, prototype_count)
+            cmds.group(tile_nodes, name=group_name)
+        return True
+
+    def instance_radii(self, source_selection, transforms,
+                       prototype_indices):
+        """Return the bounding radius of every instance, as placed."""
+        bound_radii = np.array([self.bound_radius(source)
+                                for source in source_selection])
+        return (bound_radii[prototype_indices] *
+                np.abs(transforms.scales).max(axis=1))
+
+    def low_detail_prototypes(self, prototypes):
+        """Return the low detail version of every prototype.
+
+        The low detail version of rock is the node rock_lod, see
+        LOW_DETAIL_SUFFIX, a prototype without one is used as it is.
+        """
+        return [prototype + LOW_DETAIL_SUFFIX
+                if cmds.objExists(prototype + LOW_DETAIL_SUFFIX)
+                else prototype for prototype in prototypes]
+
+    def tag_tile(self, node, bounds_min, bounds_max, prototype_count=0):
+        """Record the bounds of a tile, and the number of its full detail
+        prototypes for instancer tiles."""
+        for attr, value in (("tileBoundsMin", bounds_min),
+                            ("tileBoundsMax", bounds_max)):
+            cmds.addAttr(node, longName=attr, dataType="double3")
+            cmds.setAttr(node + "." + attr, *value.tolist(), type="double3")
+        cmds.addAttr(node, longName="tilePrototypeCount",
+                     attributeType="long", defaultValue=prototype_count)
+        cmds.addAttr(node, longName="tileState", dataType="string")
+        cmds.setAttr(node + ".tileState", tiling.FULL, type="string")
+
+    def update_tile_lod(self, groups, camera_position=None):
+        """Show the tiles of scatter groups by their distance to the camera.
+
+        The low detail, bounding box and hide distances come from the UI,
+        see tiling.tile_states. Only the tiles changing state are edited.
+        """
+        tiles = [node for node in cmds.listRelatives(
+                     groups, children=True, fullPath=True,
+                     type="transform") or []
+                 if cmds.attributeQuery("tileBoundsMin", node=node,
+                                        exists=True)]
+        if not tiles:
+            log.warning("Select scatter groups made with a tile size.")
+            return
+        if camera_position is None:
+            camera_position = self.camera_position()
+        bounds_min = np.array([cmds.getAttr(node + ".tileBoundsMin")
+                               for node in tiles]).reshape(-1, 3)
+        bounds_max = np.array([cmds.getAttr(node + ".tileBoundsMax")
+                               for node in tiles]).reshape(-1, 3)
+        states = tiling.tile_states(
+            tiling.box_distances(bounds_min, bounds_max, camera_position),
+            *self.lod_distances_from_ui())
+        for node, state in zip(tiles, states.tolist()):
+            self.set_tile_state(node, tiling.STATES[state])
+
+    def set_tile_state(self, node, state):
+        """Show a tile as one of tiling.STATES.
+
+        Tiles of transforms have no low detail prototypes and are drawn in
+        full detail in the LOW_DETAIL state.
+        """
+        previous = cmds.getAttr(node + ".tileState")
+        if state == previous:
+            return
+        box = state == tiling.BOUNDING_BOX
+        cmds.setAttr(node + ".visibility", state != tiling.HIDDEN)
+        cmds.setAttr(node + ".overrideEnabled", True)
+        cmds.setAttr(node + ".overrideLevelOfDetail", int(box))
+        prototype_count = cmds.getAttr(node + ".tilePrototypeCount")
+        for particle_shape in cmds.listRelatives(
+                node, allDescendents=True, fullPath=True,
+                type="particle") or []:
+            for instancer_node in cmds.listConnections(
+                    particle_shape, type="instancer") or []:
+                cmds.setAttr(instancer_node + ".levelOfDetail", int(box))
+            if (state == tiling.LOW_DETAIL) != (previous == tiling.LOW_DETAIL):
+                # the low detail prototypes follow the full detail ones
+                indices = np.array(cmds.getAttr(particle_shape + ".indexPP"),
+                                   dtype=np.int64) % prototype_count
+                if state == tiling.LOW_DETAIL:
+                    indices += prototype_count
+                set_per_particle(particle_shape, {"indexPP": indices})
+        cmds.setAttr(node + ".tileState", state, type="string")
 
-        xScale = random.uniform(float(self.ui_scatter.xscale_min_le.displayText()), float(self.ui_scatter.xscale_max_le.displayText()))
-        yScale = random.uniform(float(self.ui_scatter.yscale_min_le.displayText()), float(self.ui_scatter.yscale_max_le.displayText()))
-        zScale = random.uniform(float(self.ui_scatter.zscale_min_le.displayText()), float(self.ui_scatter.zscale_max_le.displayText()))
+    def camera_position(self):
+        """Return the world position of the camera of the active viewport."""
+        panel = cmds.getPanel(withFocus=True)
+        if cmds.getPanel(typeOf=panel) != "modelPanel":
+            panel = [visible for visible in cmds.getPanel(visiblePanels=True)
+                     if cmds.getPanel(typeOf=visible) == "modelPanel"][0]
+        camera = cmds.modelPanel(panel, query=True, camera=True)
+        return cmds.xform(camera, query=True, worldSpace=True,
+                          translation=True)
 
-        cmds.scale(xScale, yScale, zScale, randomized_object)
+    def lod_distances_from_ui(self):
+        """Return the (low detail, bounding box, hide) distances, None
+        for the empty ones."""
+        values = [value.strip() for value in
+                  self.ui_scatter.lod_distances_le.displayText().split(",")]
+        if len(values) > 3:
+            raise ValueError("Give at most three LOD distances")
+        values += [""] * (3 - len(values))
+        return [float(value) if value else None for value in values]
 
-    def select_percentage(self, vtx_selection, num_vtx):
-        random_percentage = self.ui_scatter.percentage_slider.value()
-        if random_percentage == 100:
-            return vtx_selection  # no work to do
-        # change seed: will need to grab value from user input text box
-        seed = int(self.ui_scatter.seed_le.displayText())
-        percentage_selection = []
-        for idx in range(0, num_vtx - 1):
-            random.seed(idx + seed)
-            rand_value = random.random()
-            if rand_value <= float(random_percentage)/100:
-                percentage_selection.append(vtx_selection[idx])
+    def start_preview(self, source_selection, destination_selection):
+        """Show the candidate placement of the UI settings."""
+        self.stop_preview()
+        if not source_selection or not destination_selection:
+            log.warning("Select source objects and a destination to "
+                        "preview.")
+            return
+        settings = self.settings_from_ui()
+        # normals are read anyway so toggling the alignment stays instant
+        sample = self.read_candidates(destination_selection, settings, True)
+        self._preview_selection = (source_selection, destination_selection)
+        self.preview = preview.ScatterPreview(
+            sample, settings, self.ui_scatter.percentage_slider.value(),
+            self.ui_scatter.sampling_cbx.currentText(),
+            float(self.ui_scatter.radius_le.displayText()),
+            weights=self.read_density(sample))
+        self.preview_display = PreviewDisplay(
+            self.preview, self.source_transforms(source_selection))
 
-        return percentage_selection
+    def update_preview(self):
+        """Bring the preview in line with the UI, updating only what changed."""
+        if self.preview is None:
+            return
+        settings = self.settings_from_ui()
+        sample = self.read_candidates(self._preview_selection[1], settings,
+                                      True)
+        if sample is not self.preview.sample:
+            # other surface points, or an edited mesh
+            self.start_preview(*self._preview_selection)
+            return
+        update = self.preview.set_settings(
+            settings,
+            mode=self.ui_scatter.sampling_cbx.currentText(),
+            radius=float(self.ui_scatter.radius_le.displayText()))
+        self.preview_display.apply(update)
+        weights = self.read_density(self.preview.sample)
+        if weights is not self.preview.weights:
+            self.preview_display.apply(self.preview.set_weights(weights))
+        percentage = self.ui_scatter.percentage_slider.value()
+        if percentage != self.preview.percentage:
+            self.preview_display.apply(
+                self.preview.set_percentage(percentage))
 
-    def align_to_normals(self, vtx, scatter_instance):
-        constraint = cmds.normalConstraint(vtx, scatter_instance)
-        cmds.delete(constraint)
+    def stop_preview(self):
+        if self.preview_display is not None:
+            self.preview_display.delete()
+        self.preview = None
+        self.preview_display = None
 
+    def read_sample(self, destination_selection, with_normals):
+        """Read the destination points, reusing the last unchanged readback."""
+        self._remove_stale_callbacks()
+        key = (tuple(destination_selection), with_normals)
+        sample = self.cache.samples.get(key)
+        if sample is None:
+            sample = meshsample.read_selection(
+                destination_selection, meshsample.MayaMeshAdapter(),
+                with_normals=with_normals)
+            self.cache.samples.put(key, sample)
+            self._watch_sample(key, sample.meshes)
+        return sample
 
+    def read_surface(self, destination_selection):
+        """Read the area table of the destination meshes, reusing it while
+        they are unchanged."""
+        self._remove_stale_callbacks()
+        key = (tuple(destination_selection), sampling.SURFACE_AREA)
+        table = self.cache.samples.get(key)
+        if table is None:
+            table = surfacesample.build_table(destination_selection,
+                                              meshsample.MayaMeshAdapter())
+            self.cache.samples.put(key, table)
+            self._watch_sample(key, table.meshes)
+        return table
+
+    def read_candidates(self, destination_selection, settings, with_normals):
+        """Return the candidate points of the sampling mode of the UI: the
+        selected vertices, or points drawn over the surface by area."""
+        if self.ui_scatter.sampling_cbx.currentText() != sampling.SURFACE_AREA:
+            return self.read_sample(destination_selection, with_normals)
+        table = self.read_surface(destination_selection)
+        count = int(self.ui_scatter.surface_count_le.displayText())
+        if (self._surface is None or self._surface[0] is not table or
+                self._surface[1:3] != (count, settings.seed)):
+            self._surface = (table, count, settings.seed,
+                             surfacesample.sample_surface(table, count,
+                                                          settings.seed))
+        return self._surface[3]
+
+    def density_from_ui(self):
+        """Build the density map from the UI fields."""
+        ui = self.ui_scatter
+        kind = ui.density_cbx.currentText()
+        name = ui.density_name_le.displayText().strip()
+        center = (0.0, 0.0, 0.0)
+        if kind == density.FALLOFF and name:
+            center = cmds.xform(name, query=True, worldSpace=True,
+                                translation=True)
+        return density.DensityMap(
+            kind, "" if kind == density.FALLOFF else name, center=center,
+            radius=float(ui.falloff_radius_le.displayText()),
+            invert=ui.density_invert_checkbox.isChecked())
+
+    def read_density(self, sample):
+        """Return the density weights of the points of sample, None for a
+        uniform density, reusing the last read of the same map."""
+        density_map = self.density_from_ui()
+        params = vars(density_map)
+        if (self._density is None or self._density[0] is not sample or
+                self._density[1] != params):
+            # a repainted map dirties its mesh, which replaces the sample
+            weights = density.read_weights(density_map, sample,
+                                           meshsample.MayaMeshAdapter())
+            self._density = (sample, params, weights)
+        return self._density[2]
+
+    def source_weights(self, source_selection):
+        """Return the weight of every source, even when none are given."""
+        text = self.ui_scatter.source_weights_le.displayText().strip()
+        if not text:
+            return [1.0] * len(source_selection)
+        weights = [float(value) for value in text.replace(",", " ").split()]
+        if len(weights) != len(source_selection):
+            raise ValueError("Give one source weight per selected source, "
+                             "{} for {} sources".format(
+                                 len(weights), len(source_selection)))
+        return weights
+
+    def _watch_sample(self, key, meshes):
+        """Evict a cached sample as soon as one of its meshes is dirtied."""
+        om = self._om
+        om.MMessage.removeCallbacks(self._sample_callbacks.pop(key, []))
+        callback_ids = []
+        for mesh in meshes:
+            selection = om.MSelectionList()
+            selection.add(mesh)
+            dag_path = selection.getDagPath(0)
+            if not dag_path.hasFn(om.MFn.kMesh):
+                dag_path.extendToShape()
+            for node in (dag_path.node(), dag_path.transform()):
+                callback_ids.append(om.MNodeMessage.addNodeDirtyCallback(
+                    node, self._sample_dirty, key))
+        self._sample_callbacks[key] = callback_ids
+
+    def _sample_dirty(self, node, key):
+        self.cache.samples.invalidate(key)
+        # callbacks cannot remove themselves while they run
+        self._stale_samples.append(key)
+
+    def _remove_stale_callbacks(self):
+        om = self._om
+        while self._stale_samples:
+            key = self._stale_samples.pop()
+            om.MMessage.removeCallbacks(self._sample_callbacks.pop(key, []))
+
+    def remove_callbacks(self):
+        """Stop watching the cached samples, e.g. when the UI closes."""
+        om = self._om
+        for callback_ids in self._sample_callbacks.values():
+            om.MMessage.removeCallbacks(callback_ids)
+        self._sample_callbacks = {}
+        self._stale_samples = []
+        self.cache.samples.clear()
+
+    def compute_params(self, settings, source_selection):
+        """Every UI value the computed scatter depends on."""
+        avoid_overlap = self.ui_scatter.overlap_checkbox.isChecked()
+        return {
+            "settings": vars(settings),
+            "percentage": self.ui_scatter.percentage_slider.value(),
+            "mode": self.ui_scatter.sampling_cbx.currentText(),
+            "radius": float(self.ui_scatter.radius_le.displayText()),
+            "spacing": float(self.ui_scatter.spacing_le.displayText()),
+            "source_weights": self.source_weights(source_selection),
+            "bound_radii": ([self.bound_radius(source)
+                             for source in source_selection]
+                            if avoid_overlap else None)}
+
+    def compute_scatter(self, sample, settings, source_selection):
+        """Select points and compute their transforms, using the cache.
+
+        Returns:
+            scattercache.ScatterResult: kept sample positions, transforms
+                and the prototype of every instance.
+        """
+        if self.ui_scatter.disk_cache_checkbox.isChecked():
+            self.cache.folder = os.path.join(
+                cmds.workspace(query=True, rootDirectory=True),
+                "cache", "scatter")
+        else:
+            self.cache.folder = None
+        params = self.compute_params(settings, source_selection)
+        with instrument.phase("density"):
+            weights = self.read_density(sample)
+        params["density"] = scattercache.hash_arrays(weights)
+        key = self.cache.result_key(sample, source_selection, params)
+        result = self.cache.get_result(key)
+        if result is not None:
+            return result
+
+        keep, transforms = parallelscatter.generate(
+            sample, settings, params["percentage"], mode=params["mode"],
+            radius=params["radius"],
+            workers=self.ui_scatter.workers_sbx.value(), weights=weights)
+        prototype_indices = instancer.pick_prototypes(
+            sample.indices[keep], sample.mesh_ids[keep],
+            params["source_weights"], settings.seed)
+        with instrument.phase("spacing"):
+            spaced = self.select_spaced(transforms, prototype_indices,
+                                        settings.seed, params["spacing"],
+                                        params["bound_radii"])
+        if spaced is not None:
+            keep = keep[spaced]
+            transforms = scatterengine.take(transforms, spaced)
+            prototype_indices = prototype_indices[spaced]
+        result = scattercache.ScatterResult(keep, transforms,
+                                            prototype_indices)
+        self.cache.put_result(key, result)
+        return result
+
+    def select_spaced(self, transforms, prototype_indices, seed, spacing,
+                      bound_radii=None):
+        """Drop instances closer than spacing or overlapping others.
+
+        Args:
+            bound_radii (list): bounding radius of every source, None to
+                allow overlaps.
+
+        Returns:
+            numpy.ndarray: positions of the instances to keep, or None when
+                neither spacing nor overlap avoidance is requested.
+        """
+        if spacing <= 0 and bound_radii is None:
+            return None
+        radii = 0.0
+        if bound_radii is not None:
+            radii = (np.asarray(bound_radii)[prototype_indices] *
+                     np.abs(transforms.scales).max(axis=1))
+        order = np.argsort(sampling.hash_keys(
+            np.arange(len(prototype_indices)), seed,
+            channel=sampling.SPACING_CHANNEL), kind="stable")
+        return spatialindex.place_without_overlap(
+            transforms.translations, radii, spacing, order=order)
+
+    def bound_radius(self, source):
+        """Return the radius of the object space bounding sphere of a mesh."""
+        (xmin, xmax), (ymin, ymax), (zmin, zmax) = cmds.polyEvaluate(
+            source, boundingBox=True)
+        return float(0.5 * np.linalg.norm([xmax - xmin, ymax - ymin,
+                                           zmax - zmin]))
+
+    def source_transforms(self, source_selection):
+        """Return the transforms of the source meshes for the instancer."""
+        transforms = []
+        for source in source_selection:
+            parents = cmds.listRelatives(source, parent=True, fullPath=True)
+            transforms.append(parents[0] if parents else source)
+        return transforms
+
+    def create_instancer(self, payload, name):
+        """Write a payload to one particle shape driving an instancer.
+
+        Returns:
+            str: the particle shape holding the point cloud.
+        """
+        particle, particle_shape = cmds.particle(
+            position=instancer.vector_values(payload.positions), name=name)
+        set_per_particle(particle_shape, {
+            "rotationPP": payload.rotations,
+            "scalePP": payload.scales,
+            "indexPP": payload.prototype_indices})
+        cmds.particleInstancer(particle_shape, addObject=True,
+                               object=payload.prototypes,
+                               position="worldPosition",
+                               rotation="rotationPP",
+                               scale="scalePP",
+                               objectIndex="indexPP")
+        return particle_shape
+
+    def payload_from_particles(self, particle_shape):
+        """Read back the payload of a particle shape made by create_instancer."""
+        instancer_node = cmds.listConnections(particle_shape,
+                                              type="instancer")[0]
+        prototypes = cmds.listConnections(instancer_node + ".inputHierarchy",
+                                          source=True, destination=False)
+        return instancer.InstancerPayload(
+            prototypes,
+            np.array(cmds.getAttr(particle_shape + ".position"),
+                     dtype=np.float64).reshape(-1, 3),
+            np.array(cmds.getAttr(particle_shape + ".rotationPP"),
+                     dtype=np.float64).reshape(-1, 3),
+            np.array(cmds.getAttr(particle_shape + ".scalePP"),
+                     dtype=np.float64).reshape(-1, 3),
+            np.array(cmds.getAttr(particle_shape + ".indexPP"),
+                     dtype=np.int64))
+
+    def bake_to_transforms(self, selection):
+        """Replace scatter particles with one instance node per point."""
+        if not selection:
+            log.warning("Select the scatter particles to bake.")
+            return
+        particle_shapes = cmds.ls(selection, type="particle") or []
+        particle_shapes += cmds.listRelatives(
+            selection, shapes=True, type="particle") or []
+        for particle_shape in particle_shapes:
+            payload = self.payload_from_particles(particle_shape)
+            baked = []
+            for prototype, translation, rotation, scale in \
+                    instancer.iter_instances(payload):
+                scatter_instance = cmds.instance(prototype)[0]
+                cmds.xform(scatter_instance, translation=translation,
+                           rotation=rotation, scale=scale)
+                baked.append(scatter_instance)
+            particle = cmds.listRelatives(particle_shape, parent=True)[0]
+            instancer_nodes = cmds.listConnections(particle_shape,
+                                                   type="instancer")
+            cmds.delete([particle] + instancer_nodes)
+            cmds.group(baked, name=particle)
+
+    def settings_from_ui(self):
+        """Build the scatter settings from the UI fields."""
+        ui = self.ui_scatter
+        return scatterengine.ScatterSettings(
+            scale_min=[float(ui.xscale_min_le.displayText()),
+                       float(ui.yscale_min_le.displayText()),
+                       float(ui.zscale_min_le.displayText())],
+            scale_max=[float(ui.xscale_max_le.displayText()),
+                       float(ui.yscale_max_le.displayText()),
+                       float(ui.zscale_max_le.displayText())],
+            rotate_min=[float(ui.xrotate_min_le.displayText()),
+                        float(ui.yrotate_min_le.displayText()),
+                        float(ui.zrotate_min_le.displayText())],
+            rotate_max=[float(ui.xrotate_max_le.displayText()),
+                        float(ui.yrotate_max_le.displayText()),
+                        float(ui.zrotate_max_le.displayText())],
+            seed=int(ui.seed_le.displayText()),
+            align_to_normals=ui.normals_checkbox.isChecked(),
+            twist_min=float(ui.twist_min_le.displayText()),
+            twist_max=float(ui.twist_max_le.displayText()))
+
+    def apply_transforms(self, scattered_instances, transforms):
+        """Set the precomputed transforms, one xform call per instance."""
+        with instrument.phase("apply_transforms"):
+            for idx, scatter_instance in enumerate(scattered_instances):
+                cmds.xform(scatter_instance,
+                           translation=transforms.translations[idx].tolist(),
+                           rotation=transforms.rotations[idx].tolist(),
+                           scale=transforms.scales[idx].tolist())
+
+    def get_scattered(self, source_selection, prototype_indices):
+        """Instance the source picked for every point."""
+        scattered_instances = []
+        with instrument.phase("get_scattered"):
+            for prototype_idx in prototype_indices.tolist():
+                scatter_instance = cmds.instance(
+                    source_selection[prototype_idx])
+                scattered_instances.append(scatter_instance[0])
+        return scattered_instances
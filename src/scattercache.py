@@ -0,0 +1,223 @@
+"""Caches that let the scatter tool skip work when re-scattering.
+
+Two levels are kept in memory with LRU eviction:
+
+* samples: the destination points read back from the scene, keyed by the
+  selection. The Maya layer evicts an entry as soon as one of its meshes
+  changes, so tweaking the seed or a range skips mesh readback.
+* results: the computed scatter, keyed by a digest of the sample points
+  and topology, the sources and every parameter, so pressing Scatter again
+  with identical settings skips computation entirely. Results can also be
+  written to a folder as compact .npz files and survive the session. The
+  folder is pruned of its least recently used files past a size limit.
+"""
+import collections
+import errno
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+import reservation
+import scatterengine
+
+log = logging.getLogger(__name__)
+
+
+# size of the .npz files a cache folder may hold
+MAX_FOLDER_BYTES = 1 << 30
+
+
+ScatterResult = collections.namedtuple(
+    "ScatterResult", ["keep", "transforms", "prototype_indices"])
+
+
+def hash_arrays(*arrays):
+    """Return a hex digest of the dtype, shape and bytes of arrays."""
+    digest = hashlib.sha1()
+    for array in arrays:
+        if array is None:
+            digest.update(b"none")
+            continue
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.dtype.str, array.shape)).encode("utf-8"))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def hash_params(params):
+    """Return a hex digest of a JSON serializable parameter dictionary."""
+    text = json.dumps(params, sort_keys=True, default=_json_default)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return vars(value)
+
+
+def hash_sample(sample):
+    """Digest of the topology and points of a meshsample.MeshSample."""
+    return hash_arrays(sample.mesh_ids, sample.indices, sample.points,
+                       sample.normals)
+
+
+class LRUCache(object):
+    """Mapping that forgets the least recently used entry when full."""
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class ScatterCache(object):
+    """Sample and result caches of the scatter tool.
+
+    Args:
+        max_samples (int): sample readbacks kept in memory.
+        max_results (int): computed scatters kept in memory.
+        folder (str): where to keep results as .npz files, None to keep
+            them in memory only.
+        max_folder_bytes (int): size above which the least recently used
+            files of the folder are removed.
+    """
+
+    def __init__(self, max_samples=4, max_results=16, folder=None,
+                 max_folder_bytes=MAX_FOLDER_BYTES):
+        self.samples = LRUCache(max_samples)
+        self.results = LRUCache(max_results)
+        self.folder = folder
+        self.max_folder_bytes = max_folder_bytes
+
+    @staticmethod
+    def result_key(sample, sources, params):
+        """Return the key of a scatter of sources over sample with params."""
+        return hash_params({"sample": hash_sample(sample),
+                            "sources": list(sources),
+                            "params": params})
+
+    def _result_path(self, key):
+        return os.path.join(self.folder, "scatter_{}.npz".format(key))
+
+    def get_result(self, key):
+        """Return the cached ScatterResult of key, or None."""
+        result = self.results.get(key)
+        if result is not None or not self.folder:
+            return result
+        path = self._result_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                result = ScatterResult(
+                    data["keep"],
+                    scatterengine.ScatterTransforms(
+                        data["translations"], data["rotations"],
+                        data["scales"]),
+                    data["prototype_indices"])
+        except (IOError, OSError, KeyError, ValueError) as err:
+            log.warning("Ignoring unreadable scatter cache %s: %s", path, err)
+            return None
+        try:
+            # the modification time orders the files for pruning
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.results.put(key, result)
+        return result
+
+    def put_result(self, key, result):
+        """Keep a ScatterResult in memory, and on disk with a folder."""
+        self.results.put(key, result)
+        if not self.folder:
+            return
+        if not os.path.isdir(self.folder):
+            try:
+                os.makedirs(self.folder)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+        path = self._result_path(key)
+        # a name of this process only, sessions sharing the folder may
+        # write the same result at the same time
+        temp_path = reservation.temp_path_for(path)
+        try:
+            np.savez(temp_path, keep=result.keep,
+                     translations=result.transforms.translations,
+                     rotations=result.transforms.rotations,
+                     scales=result.transforms.scales,
+                     prototype_indices=result.prototype_indices)
+            # readers never see a half written file
+            reservation.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.prune()
+
+    def prune(self):
+        """Remove the least recently used result files past
+        max_folder_bytes.
+
+        Returns:
+            int: the number of files removed.
+        """
+        if not self.folder or not os.path.isdir(self.folder):
+            return 0
+        files = []
+        for name in os.listdir(self.folder):
+            if not (name.startswith("scatter_") and name.endswith(".npz")):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_folder_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # another session removed it first
+                pass
+            total -= size
+            removed += 1
+        return removed
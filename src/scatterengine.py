@@ -0,0 +1,184 @@
+"""Maya independent scatter math.
+
+Everything in here works on whole NumPy arrays so a scatter can be computed
+in one batch. The Maya layer in scatter.py only reads the mesh points once
+and applies the results once.
+"""
+import collections
+
+import numpy as np
+
+import instrument
+import sampling
+
+
+ScatterTransforms = collections.namedtuple(
+    "ScatterTransforms", ["translations", "rotations", "scales"])
+
+
+class ScatterSettings(object):
+    """Min/max ranges and seed used to randomize a scatter."""
+
+    def __init__(self, scale_min=(1.0, 1.0, 1.0), scale_max=(1.0, 1.0, 1.0),
+                 rotate_min=(0.0, 0.0, 0.0), rotate_max=(0.0, 0.0, 0.0),
+                 seed=0, align_to_normals=False, twist_min=0.0,
+                 twist_max=0.0, up_vector=(0.0, 1.0, 0.0)):
+        self.scale_min = _as_vector(scale_min)
+        self.scale_max = _as_vector(scale_max)
+        self.rotate_min = _as_vector(rotate_min)
+        self.rotate_max = _as_vector(rotate_max)
+        self.seed = int(seed)
+        self.align_to_normals = align_to_normals
+        self.twist_min = float(twist_min)
+        self.twist_max = float(twist_max)
+        self.up_vector = _as_vector(up_vector)
+
+
+def _as_vector(values):
+    vector = np.asarray(values, dtype=np.float64)
+    if vector.shape != (3,):
+        raise ValueError("Expected an x, y, z triple, got {}".format(values))
+    return vector
+
+
+def as_points(points):
+    """Return points as a contiguous (n, 3) float64 array.
+
+    Accepts an (n, 3) array or the flat [x, y, z, x, y, z, ...] list that
+    ``cmds.xform`` returns when queried on several components.
+    """
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    if points.ndim == 1:
+        if points.size % 3:
+            raise ValueError("Flat point list length must be a multiple "
+                             "of 3, got {}".format(points.size))
+        points = points.reshape(-1, 3)
+    if points.ndim != 2 or points.shape[1] != 3:
+        raise ValueError("Expected (n, 3) points, got shape "
+                         "{}".format(points.shape))
+    return points
+
+
+def random_ranges(values, low, high):
+    """Map (n, 3) values in [0, 1) between low and high."""
+    return low + values * (high - low)
+
+
+def _axis_values(indices, streams, seed, channel):
+    return sampling.random_values(indices[:, None], seed, streams[:, None],
+                                  channel + np.arange(3))
+
+
+def _normalize(vectors):
+    lengths = np.linalg.norm(vectors, axis=1)
+    return vectors / np.where(lengths > 1e-12, lengths, 1.0)[:, None], lengths
+
+
+def matrix_to_euler(matrices):
+    """Convert (n, 3, 3) row vector rotation matrices to xyz euler angles.
+
+    Matches Maya's default xyz rotate order, where a matrix is
+    Rx * Ry * Rz with the axes of the object as its rows.
+
+    Returns:
+        numpy.ndarray: (n, 3) angles in degrees.
+    """
+    sin_y = np.clip(-matrices[:, 0, 2], -1.0, 1.0)
+    rotate_y = np.arcsin(sin_y)
+    gimbal = np.abs(sin_y) > 1.0 - 1e-9
+    rotate_x = np.where(gimbal,
+                        np.arctan2(-matrices[:, 2, 1], matrices[:, 1, 1]),
+                        np.arctan2(matrices[:, 1, 2], matrices[:, 2, 2]))
+    rotate_z = np.where(gimbal, 0.0,
+                        np.arctan2(matrices[:, 0, 1], matrices[:, 0, 0]))
+    return np.degrees(np.stack([rotate_x, rotate_y, rotate_z], axis=1))
+
+
+def normal_matrices(normals, up_vector=(0.0, 1.0, 0.0), twist=None):
+    """Build rotation matrices that aim the x axis along the normals.
+
+    Same convention as a default normalConstraint: x follows the normal
+    and y leans towards the world up vector. Where a normal is parallel to
+    the up vector, world z is used as up instead.
+
+    Args:
+        normals (array): (n, 3) surface normals, need not be normalized.
+        up_vector (array): world up vector.
+        twist (array): (n,) extra rotation around the normal, in degrees.
+
+    Returns:
+        numpy.ndarray: (n, 3, 3) matrices with the x, y, z axes as rows.
+    """
+    aim, lengths = _normalize(np.asarray(normals, dtype=np.float64))
+    aim[lengths <= 1e-12] = (1.0, 0.0, 0.0)
+    up = np.broadcast_to(np.asarray(up_vector, dtype=np.float64), aim.shape)
+    side, side_lengths = _normalize(np.cross(aim, up))
+    parallel = side_lengths <= 1e-6
+    if parallel.any():
+        side[parallel] = _normalize(
+            np.cross(aim[parallel], (0.0, 0.0, 1.0)))[0]
+    y_axis = np.cross(side, aim)
+    if twist is not None:
+        angles = np.radians(np.asarray(twist, dtype=np.float64))[:, None]
+        cos, sin = np.cos(angles), np.sin(angles)
+        y_axis, side = cos * y_axis + sin * side, cos * side - sin * y_axis
+    return np.stack([aim, y_axis, side], axis=1)
+
+
+def compute_rotations(settings, indices, streams, normals=None):
+    """Return the (n, 3) rotations in degrees, see compute_transforms."""
+    if settings.align_to_normals:
+        if normals is None:
+            raise ValueError("Aligning to normals needs the point normals")
+        with instrument.phase("align_to_normals"):
+            twist = settings.twist_min + sampling.random_values(
+                indices, settings.seed, streams, sampling.TWIST_CHANNEL) * (
+                    settings.twist_max - settings.twist_min)
+            return matrix_to_euler(
+                normal_matrices(normals, settings.up_vector, twist))
+    return random_ranges(
+        _axis_values(indices, streams, settings.seed,
+                     sampling.ROTATE_CHANNEL),
+        settings.rotate_min, settings.rotate_max)
+
+
+def compute_scales(settings, indices, streams):
+    """Return the (n, 3) scales, see compute_transforms."""
+    return random_ranges(
+        _axis_values(indices, streams, settings.seed, sampling.SCALE_CHANNEL),
+        settings.scale_min, settings.scale_max)
+
+
+def compute_transforms(points, settings, indices=None, streams=0,
+                       normals=None):
+    """Compute the transforms of every scattered instance in one batch.
+
+    Random values are keyed by (seed, stream, index) rather than drawn in
+    sequence, so a point gets the same transform however the points are
+    split into batches.
+
+    Args:
+        points: (n, 3) array or flat list of the destination positions.
+        settings (ScatterSettings): ranges and seed of the scatter.
+        indices (array): vertex index of every point, defaults to 0..n-1.
+        streams (int or array): mesh id of every point.
+        normals (array): (n, 3) normals, required to align to normals.
+
+    Returns:
+        ScatterTransforms: (n, 3) translations, rotations in degrees and
+            scales.
+    """
+    translations = as_points(points).copy()
+    count = len(translations)
+    if indices is None:
+        indices = np.arange(count)
+    indices = np.asarray(indices)
+    streams = np.broadcast_to(streams, (count,))
+    return ScatterTransforms(
+        translations, compute_rotations(settings, indices, streams, normals),
+        compute_scales(settings, indices, streams))
+
+
+def take(transforms, positions):
+    """Return the transforms of the points at the given positions."""
+    return ScatterTransforms(*[array[positions] for array in transforms])
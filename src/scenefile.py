@@ -1,87 +1,280 @@
 import logging
+import os
+import tempfile
 
-import pymel.core as pmc
-from pymel.core.system import Path
+import instrument
+import mayascene
+import naming
+import reservation
+import versionindex
+
+# versionstore (numpy) and compression are imported when a scene is stored
+# that way, saving a plain scene only needs the modules above
 
 log = logging.getLogger(__name__)
 
+STORE_FOLDER = ".chunks"
+
 
 class SceneFile(object):
-    """An abstract representation of a scene file."""
-    def __init__(self, path=None):
-        self.folder_path = Path()
+    """An abstract representation of a scene file.
+
+    Args:
+        path (str): a scene file, defaults to the open scene.
+        schema (naming.NamingSchema): naming of the scene files, defaults
+            to naming.DEFAULT_SCHEMA.
+    """
+    def __init__(self, path=None, schema=None):
+        self.schema = schema or naming.DEFAULT_SCHEMA
+        self.folder_path = ""
         self.descriptor = 'main'
-        self.task = None
+        self.task = 'model'
         self.ver = 1
         self.ext = '.ma'
-        scene = pmc.system.sceneName()
-        if not path and scene:
-            path = scene
-        if not path and not scene:
-            log.warning("Unable to initialize SceneFile object from "
-                        "a new scene, please specify a path")
+        self.deduplicate = False
+        self.compress = False
+        if not path:
+            path = mayascene.scene_name()
+        if not path:
+            self.folder_path = os.path.join(mayascene.workspace_root(),
+                                            "scenes")
+            log.info("Initialize with default properties.")
             return
         self._init_from_path(path)
 
+    @property
+    def folder_path(self):
+        return self._folder_path
+
+    @folder_path.setter
+    def folder_path(self, val):
+        self._folder_path = str(val)
+
     @property
     def filename(self):
-        pattern = "{descriptor}_{task}_v{ver:03d}{ext}"
-        return pattern.format(descriptor=self.descriptor,
-                              task=self.task,
-                              ver=self.ver,
-                              ext=self.ext)
+        return self.schema.format(self.descriptor, self.task, self.ver,
+                                  self.ext)
 
     @property
     def path(self):
-        return self.folder_path / self.filename
+        return os.path.join(self.folder_path, self.filename)
+
+    @property
+    def store(self):
+        """The version store shared by the scenes of the folder."""
+        import versionstore
+        return versionstore.ChunkStore(os.path.join(self.folder_path,
+                                                    STORE_FOLDER))
+
+    @property
+    def storage_suffix(self):
+        """Suffix the saved file adds to the scene file name."""
+        if self.deduplicate:
+            return versionindex.MANIFEST_SUFFIX
+        if self.compress:
+            import compression
+            return compression.default_suffix()
+        return ""
+
+    def _index(self):
+        return versionindex.index_for(self.folder_path, self.schema)
 
     def _init_from_path(self, path):
-        path = Path(path)
-        self.folder_path = path.parent
-        self.ext = path.ext
-        self.descriptor, self.task, ver = path.name.stripext().split("_")
-        self.ver = int(ver.split("v")[-1])
+        self._folder_path, name = os.path.split(path)
+        name, suffix = versionindex.split_storage_suffix(name)
+        self.deduplicate = suffix == versionindex.MANIFEST_SUFFIX
+        self.compress = suffix in versionindex.COMPRESSED_SUFFIXES
+        parts = self.schema.parse(name)
+        if parts is None:
+            raise ValueError("{} does not follow the naming {}".format(
+                name, self.schema.template))
+        self.descriptor, self.task, self.ver, self.ext = parts
+
+    def _write(self, path):
+        """Save the scene to a temporary file next to path and rename it
+        into place, so nobody ever opens a half written scene."""
+        temp_path = reservation.temp_path_for(path)
+        try:
+            with instrument.phase("maya_save"):
+                mayascene.save_as(temp_path)
+                mayascene.rename(path)
+            reservation.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return path
+
+    def _write_stored(self, path):
+        """Save the scene to the version store with a manifest at path."""
+        import versionstore
+        handle, scratch_path = tempfile.mkstemp(suffix=self.ext)
+        os.close(handle)
+        try:
+            with instrument.phase("maya_save"):
+                mayascene.save_as(scratch_path)
+                mayascene.rename(path)
+            with instrument.phase("store"):
+                manifest, written = self.store.store_file(scratch_path)
+        finally:
+            os.remove(scratch_path)
+        manifest_path = path + versionstore.MANIFEST_EXT
+        with instrument.phase("store"):
+            versionstore.write_manifest(manifest_path, manifest)
+        log.info("Stored %s, %d of %d bytes were new",
+                 os.path.basename(manifest_path), written, manifest.size)
+        return manifest_path
+
+    def _write_compressed(self, path):
+        """Save the scene to scratch disk and compress it to its folder."""
+        import compression
+        handle, scratch_path = tempfile.mkstemp(suffix=self.ext)
+        os.close(handle)
+        compressed_path = path + compression.default_suffix()
+        try:
+            with instrument.phase("maya_save"):
+                mayascene.save_as(scratch_path)
+                mayascene.rename(path)
+            with instrument.phase("compress"):
+                size = compression.compress_file(scratch_path,
+                                                 compressed_path)
+            log.info("Saved %s, %d bytes compressed to %d",
+                     os.path.basename(compressed_path),
+                     os.path.getsize(scratch_path), size)
+        finally:
+            os.remove(scratch_path)
+        return compressed_path
+
+    def _write_as(self, path):
+        if self.deduplicate:
+            return self._write_stored(path)
+        if self.compress:
+            return self._write_compressed(path)
+        return self._write(path)
+
+    def open(self):
+        """Open the scene file, decompressing it or restoring it from the
+        version store when it is not on disk as a plain scene."""
+        if os.path.exists(self.path):
+            return mayascene.open_file(self.path)
+        base_path = self.path
+        handle, scratch_path = tempfile.mkstemp(suffix=self.ext)
+        os.close(handle)
+        try:
+            manifest_path = base_path + versionindex.MANIFEST_SUFFIX
+            if os.path.exists(manifest_path):
+                import versionstore
+                self.store.restore_file(
+                    versionstore.read_manifest(manifest_path), scratch_path)
+            else:
+                for suffix in versionindex.COMPRESSED_SUFFIXES:
+                    if os.path.exists(base_path + suffix):
+                        import compression
+                        compression.decompress_file(base_path + suffix,
+                                                    scratch_path)
+                        break
+                else:
+                    raise IOError("No scene file at {}".format(base_path))
+            mayascene.open_file(scratch_path)
+            mayascene.rename(self.path)
+        finally:
+            os.remove(scratch_path)
+        return self.path
 
     def save(self):
         """saves the scene file
 
         Returns:
-            Path: The path to the scene file if successful
+            str: The path to the scene file if successful
         """
-        try:
-            return pmc.system.saveAs(self.path)
-        except RuntimeError as err:
-            log.warning("Missing directories in path. "
-                        "Creating directories...")
-            self.folder_path.makedirs_p()
-            return pmc.system.saveAs(self.path)
+        with instrument.recording("scenefile.save", path=self.path):
+            if not os.path.isdir(self.folder_path):
+                log.warning("Missing directories in path. "
+                            "Creating directories...")
+                os.makedirs(self.folder_path)
+            path = self._write_as(self.path)
+            with instrument.phase("index"):
+                self._index().note_saved(
+                    self.descriptor, self.task, self.ver, self.ext)
+        return path
+
+    def _write_async(self, path, copier, claim=None):
+        """Save the scene to scratch disk and queue its copy to path."""
+        scratch_path = copier.scratch_path_for(path)
+        with instrument.phase("maya_save"):
+            mayascene.save_as(scratch_path)
+            mayascene.rename(path)
+        return copier.submit(scratch_path, path, claim)
+
+    def save_async(self, copier):
+        """Save the scene file, copying it to its folder in the background.
+
+        Returns:
+            backgroundsave.CopyJob: the queued copy.
+        """
+        with instrument.recording("scenefile.save_async", path=self.path):
+            if not os.path.isdir(self.folder_path):
+                os.makedirs(self.folder_path)
+            job = self._write_async(self.path, copier)
+            self._index().note_saved(
+                self.descriptor, self.task, self.ver, self.ext)
+        return job
 
+    def save_increment_async(self, copier):
+        """Reserve the next version and save it in the background.
+
+        Returns:
+            backgroundsave.CopyJob: the queued copy.
+        """
+        with instrument.recording("scenefile.save_increment_async",
+                                  folder=self.folder_path):
+            ver = self.next_avail_ver()
+            with instrument.phase("reserve"):
+                claim = reservation.reserve_version(
+                    self.folder_path, self.descriptor, self.task, self.ext,
+                    ver, schema=self.schema)
+            self.ver = claim.ver
+            try:
+                # the copy holds the reservation until it lands
+                return self._write_async(claim.path, copier, claim)
+            except Exception:
+                claim.release()
+                raise
 
     def next_avail_ver(self):
-        """return the next available version number in the folder."""
-        pattern = "{descriptor}_{task}_v*{ext}".format(
-            descriptor=self.descriptor, task=self.task, ext=self.ext)
-        matching_scenefiles = []
-        for file_ in self.folder_path.files():
-            if file_.name.fnmatch(pattern):
-                matching_scenefiles.append(file_)
-        if not matching_scenefiles:
-            return 1
-        matching_scenefiles.sort(reverse=True)
-        latest_scenefile = matching_scenefiles[0]
-        latest_scenefile = latest_scenefile.name.stripext()
-        latest_ver_num = int(latest_scenefile.split("_v")[-1])
-        return latest_ver_num + 1
-
-
-    def increment_save(self):
+        """return the next available version number in the folder.
+
+        Versions are compared as numbers, so v1000 comes after v999.
+        """
+        with instrument.recording("scenefile.next_avail_ver",
+                                  folder=self.folder_path):
+            return self._index().next_version(self.descriptor, self.task,
+                                              self.ext)
+
+    def save_increment(self):
         """Increments the version and saves the file
         if the existing version of a file already exist, it should
         increment from the largest version number available in the folder.
 
+        The version is reserved on disk first, so two artists saving at
+        the same time never end up with the same version.
+
         Returns:
-            Path: The path to the scene file if successful
+            str: The path to the scene file if successful
 
         """
-        self.ver = self.next_avail_ver()
-        self.save()
\ No newline at end of file
+        with instrument.recording("scenefile.save_increment",
+                                  folder=self.folder_path):
+            ver = self.next_avail_ver()
+            with instrument.phase("reserve"):
+                claim = reservation.reserve_version(
+                    self.folder_path, self.descriptor, self.task, self.ext,
+                    ver, suffix=self.storage_suffix, schema=self.schema)
+            self.ver = claim.ver
+            try:
+                return self._write_as(self.path)
+            except Exception:
+                claim.release()
+                raise
+
+    # the name scenefile used before the two SceneFile copies were merged
+    increment_save = save_increment
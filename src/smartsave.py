@@ -1,16 +1,26 @@
 import logging
+import os
 from PySide2 import QtWidgets, QtCore
 from shiboken2 import wrapInstance
-import maya.OpenMayaUI as omui
-import maya.cmds as cmds
-import pymel.core as pmc
-from pymel.core.system import Path
+
+import backgroundsave
+import compression
+import mayascene
+import scenefile
+import versionindex
 
 log = logging.getLogger(__name__)
 
+STATUS_INTERVAL_MS = 250
+# changes other machines make on network storage are not reported by the
+# file system watcher, the folder is also polled with a single stat
+POLL_INTERVAL_MS = 2000
+WATCH_DELAY_MS = 100
+
 
 def maya_main_window():
     """Return Maya main window widget"""
+    import maya.OpenMayaUI as omui
     main_window = omui.MQtUtil.mainWindow()
     return wrapInstance(long(main_window), QtWidgets.QWidget)
 
@@ -22,10 +32,12 @@ class SmartSaveUI(QtWidgets.QDialog):
         super(SmartSaveUI, self).__init__(parent=maya_main_window())
         self.setWindowTitle("Smart Save")
         self.setMinimumWidth(500)
-        self.setMaximumHeight(200)
+        self.setMaximumHeight(260)
         self.setWindowFlags(self.windowFlags() ^
                            QtCore.Qt.WindowContextHelpButtonHint)
-        self.scenefile = SceneFile()
+        self.scenefile = scenefile.SceneFile()
+        self.copier = backgroundsave.default_copier()
+        self.jobs = []
         self.create_ui()
         self.create_connections()
 
@@ -41,6 +53,7 @@ class SmartSaveUI(QtWidgets.QDialog):
         self.main_lay.addLayout(self.filename_lay)
         self.main_lay.addStretch()
         self.main_lay.addLayout(self.button_lay)
+        self.main_lay.addWidget(self.status_lbl)
         self.setLayout(self.main_lay)
 
     def create_connections(self):
@@ -48,19 +61,152 @@ class SmartSaveUI(QtWidgets.QDialog):
         self.folder_browse_btn.clicked.connect(self._browse_folder)
         self.save_btn.clicked.connect(self._save)
         self.save_increment_btn.clicked.connect(self._save_increment)
+        self.open_btn.clicked.connect(self._open)
+        self.dedup_checkbox.toggled.connect(self._update_background_option)
+        self.compress_checkbox.toggled.connect(
+            self._update_background_option)
+        self.status_timer = QtCore.QTimer(self)
+        self.status_timer.setInterval(STATUS_INTERVAL_MS)
+        self.status_timer.timeout.connect(self._update_status)
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watch_timer = QtCore.QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.setInterval(WATCH_DELAY_MS)
+        self.watch_timer.timeout.connect(self._refresh_versions)
+        self.watcher.directoryChanged.connect(self.watch_timer.start)
+        self.poll_timer = QtCore.QTimer(self)
+        self.poll_timer.setInterval(POLL_INTERVAL_MS)
+        self.poll_timer.timeout.connect(self._refresh_versions)
+        self.poll_timer.start()
+        self.folder_le.textChanged.connect(self._watch_folder)
+        self.descriptor_le.textChanged.connect(self._update_latest)
+        self.task_le.textChanged.connect(self._update_latest)
+        self._watch_folder()
 
     @QtCore.Slot()
     def _save_increment(self):
         """Save an increment of the scene"""
         self._set_scenefile_properties_from_ui()
-        self.scenefile.save_increment()
-        self.ver_sbx.setValue(self.scenefile.ver)
+        if self._in_background():
+            self._track(self.scenefile.save_increment_async(self.copier))
+        else:
+            self.scenefile.save_increment()
+        self._update_latest()
 
     @QtCore.Slot()
     def _save(self):
         """Save the scene"""
         self._set_scenefile_properties_from_ui()
-        self.scenefile.save()
+        if self._in_background():
+            self._track(self.scenefile.save_async(self.copier))
+        else:
+            self.scenefile.save()
+
+    @QtCore.Slot()
+    def _open(self):
+        """Open the scene of the version in the UI"""
+        self._set_scenefile_properties_from_ui()
+        self.scenefile.open()
+
+    @QtCore.Slot()
+    def _watch_folder(self):
+        """Watch the folder in the UI for new versions"""
+        watched = self.watcher.directories()
+        if watched:
+            self.watcher.removePaths(watched)
+        folder = self.folder_le.text()
+        if os.path.isdir(folder) and not self.watcher.addPath(folder):
+            log.info("Unable to watch %s, polling it instead", folder)
+        self._update_latest()
+
+    @QtCore.Slot()
+    def _refresh_versions(self):
+        """Pick up the versions saved since the folder was last listed"""
+        folder = self.folder_le.text()
+        if folder and versionindex.index_for(
+                folder, self.scenefile.schema).refresh():
+            self._update_latest()
+
+    @QtCore.Slot()
+    def _update_latest(self):
+        """Show the latest version on disk of the scene in the UI"""
+        folder = self.folder_le.text()
+        latest = 0
+        ver = self.ver_sbx.value()
+        if folder:
+            index = versionindex.index_for(folder, self.scenefile.schema)
+            key = (self.descriptor_le.text(), self.task_le.text(),
+                   self.ext_lbl.text())
+            latest = index.latest(*key)
+            # a version someone saved meanwhile is never proposed again
+            ver = index.free_version(*(key + (ver,)))
+        # any version on disk can be saved over, or the next one
+        self.ver_sbx.setMaximum(max(latest + 1, self.scenefile.ver, ver))
+        self.ver_sbx.setValue(ver)
+        if latest:
+            self.latest_lbl.setText("Latest on disk: v{:03d}".format(latest))
+        else:
+            self.latest_lbl.setText("No version on disk")
+
+    @QtCore.Slot()
+    def _update_background_option(self):
+        """Deduplicated and compressed saves are written in the foreground"""
+        self.background_checkbox.setDisabled(
+            self.dedup_checkbox.isChecked() or
+            self.compress_checkbox.isChecked())
+
+    def _in_background(self):
+        return (self.background_checkbox.isEnabled() and
+                self.background_checkbox.isChecked())
+
+    def _track(self, job):
+        """Show the status of a background copy until it finishes."""
+        self.jobs.append(job)
+        self._update_status()
+        self.status_timer.start()
+
+    @QtCore.Slot()
+    def _update_status(self):
+        """Show where the background copies are, and report failures."""
+        for job in [job for job in self.jobs if job.finished]:
+            self.jobs.remove(job)
+            if job.status == backgroundsave.FAILED:
+                self._report_failure(job)
+        pending = self.copier.pending()
+        if pending:
+            job = pending[0]
+            text = "{}: {}".format(os.path.basename(job.destination),
+                                   job.status)
+            if job.attempts > 1:
+                text += " (attempt {})".format(job.attempts)
+            if len(pending) > 1:
+                text += ", {} more queued".format(len(pending) - 1)
+        elif self.copier.jobs:
+            job = self.copier.jobs[-1]
+            text = "{}: {}".format(os.path.basename(job.destination),
+                                   job.status)
+        else:
+            text = ""
+        self.status_lbl.setText(text)
+        if not self.jobs:
+            self.status_timer.stop()
+
+    def _report_failure(self, job):
+        answer = QtWidgets.QMessageBox.warning(
+            self, "Smart Save",
+            "Could not copy {} to {}:\n{}\n\nThe save is kept in {}.".format(
+                os.path.basename(job.destination),
+                os.path.dirname(job.destination), job.error, job.source),
+            QtWidgets.QMessageBox.Retry | QtWidgets.QMessageBox.Cancel)
+        if answer != QtWidgets.QMessageBox.Retry:
+            return
+        if self.copier.retry(job):
+            self._track(job)
+        else:
+            QtWidgets.QMessageBox.warning(
+                self, "Smart Save",
+                "{} was saved again since, the save is kept in {}.".format(
+                    os.path.basename(job.destination), job.source))
 
     def _set_scenefile_properties_from_ui(self):
         self.scenefile.folder_path = self.folder_le.text()
@@ -68,6 +214,8 @@ class SmartSaveUI(QtWidgets.QDialog):
         self.scenefile.task = self.task_le.text()
         self.scenefile.ver = self.ver_sbx.value()
         self.scenefile.ext = self.ext_lbl.text()
+        self.scenefile.deduplicate = self.dedup_checkbox.isChecked()
+        self.scenefile.compress = self.compress_checkbox.isChecked()
 
     @QtCore.Slot()
     def _browse_folder(self):
@@ -81,7 +229,25 @@ class SmartSaveUI(QtWidgets.QDialog):
     def _create_button_ui(self):
         self.save_btn = QtWidgets.QPushButton("Save")
         self.save_increment_btn = QtWidgets.QPushButton("Save Increment")
+        self.background_checkbox = QtWidgets.QCheckBox("Save in background")
+        self.background_checkbox.setToolTip(
+            "Save to local scratch disk and copy to the folder in the "
+            "background")
+        self.dedup_checkbox = QtWidgets.QCheckBox("Deduplicate versions")
+        self.dedup_checkbox.setToolTip(
+            "Store only the parts of the scene that changed since earlier "
+            "versions and save a small manifest instead of a full copy")
+        self.compress_checkbox = QtWidgets.QCheckBox("Compress")
+        self.compress_checkbox.setToolTip(
+            "Save the scene compressed as {}{}".format(
+                self.scenefile.ext, compression.default_suffix()))
+        self.open_btn = QtWidgets.QPushButton("Open")
+        self.status_lbl = QtWidgets.QLabel()
         layout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self.background_checkbox)
+        layout.addWidget(self.dedup_checkbox)
+        layout.addWidget(self.compress_checkbox)
+        layout.addWidget(self.open_btn)
         layout.addWidget(self.save_btn)
         layout.addWidget(self.save_increment_btn)
         return layout
@@ -95,14 +261,17 @@ class SmartSaveUI(QtWidgets.QDialog):
         self.ver_sbx = QtWidgets.QSpinBox()
         self.ver_sbx.setButtonSymbols(QtWidgets.QAbstractSpinBox.PlusMinus)
         self.ver_sbx.setFixedWidth(50)
+        self.ver_sbx.setMaximum(max(self.scenefile.ver, 999))
         self.ver_sbx.setValue(self.scenefile.ver)
         self.ext_lbl = QtWidgets.QLabel(".ma")
+        self.latest_lbl = QtWidgets.QLabel()
         layout.addWidget(self.descriptor_le, 1, 0)
         layout.addWidget(QtWidgets.QLabel("_"), 1, 1)
         layout.addWidget(self.task_le, 1, 2)
         layout.addWidget(QtWidgets.QLabel("_v"), 1, 3)
         layout.addWidget(self.ver_sbx, 1, 4)
         layout.addWidget(self.ext_lbl, 1, 5)
+        layout.addWidget(self.latest_lbl, 2, 0, 1, 6)
         return layout
 
     def _create_filename_headers(self):
@@ -119,99 +288,10 @@ class SmartSaveUI(QtWidgets.QDialog):
         return layout
 
     def _create_folder_ui(self):
-        default_folder = Path(cmds.workspace(rootDirectory=True, query=True))
-        default_folder = default_folder / "scenes"
+        default_folder = os.path.join(mayascene.workspace_root(), "scenes")
         self.folder_le = QtWidgets.QLineEdit(default_folder)
         self.folder_browse_btn = QtWidgets.QPushButton("...")
         layout = QtWidgets.QHBoxLayout()
         layout.addWidget(self.folder_le)
         layout.addWidget(self.folder_browse_btn)
         return layout
-
-
-class SceneFile(object):
-    """An abstract representation of a scene file."""
-    def __init__(self, path=None):
-        self.folder_path = Path(cmds.workspace(query=True,
-                                               rootDirectory=True)) / "scenes"
-        self.descriptor = 'main'
-        self.task = 'model'
-        self.ver = 1
-        self.ext = '.ma'
-        scene = pmc.system.sceneName()
-        if not path and scene:
-            path = scene
-        if not path and not scene:
-            log.info("Initialize with default properties.")
-            return
-        self._init_from_path(path)
-
-    @property
-    def folder_path(self):
-        return self._folder_path
-
-    @folder_path.setter
-    def folder_path(self, val):
-        self._folder_path = Path(val)
-
-    @property
-    def filename(self):
-        pattern = "{descriptor}_{task}_v{ver:03d}{ext}"
-        return pattern.format(descriptor=self.descriptor,
-                              task=self.task,
-                              ver=self.ver,
-                              ext=self.ext)
-
-    @property
-    def path(self):
-        return self.folder_path / self.filename
-
-    def _init_from_path(self, path):
-        path = Path(path)
-        self._folder_path = path.parent
-        self.ext = path.ext
-        self.descriptor, self.task, ver = path.name.stripext().split("_")
-        self.ver = int(ver.split("v")[-1])
-
-
-    def save(self):
-        """saves the scene file
-
-        Returns:
-            Path: The path to the scene file if successful
-        """
-        try:
-            return pmc.system.saveAs(self.path)
-        except RuntimeError as err:
-            log.warning("Missing directories in path. "
-                        "Creating directories...")
-            self.folder_path.makedirs_p()
-            return pmc.system.saveAs(self.path)
-
-    def next_avail_ver(self):
-        """return the next available version number in the folder."""
-        pattern = "{descriptor}_{task}_v*{ext}".format(
-            descriptor=self.descriptor, task=self.task, ext=self.ext)
-        matching_scenefiles = []
-        for file_ in self.folder_path.files():
-            if file_.name.fnmatch(pattern):
-                matching_scenefiles.append(file_)
-        if not matching_scenefiles:
-            return 1
-        matching_scenefiles.sort(reverse=True)
-        latest_scenefile = matching_scenefiles[0]
-        latest_scenefile = latest_scenefile.name.stripext()
-        latest_ver_num = int(latest_scenefile.split("_v")[-1])
-        return latest_ver_num + 1
-
-    def save_increment(self):
-        """Increments the version and saves the file
-        if the existing version of a file already exist, it should
-        increment from the largest version number available in the folder.
-
-        Returns:
-            Path: The path to the scene file if successful
-
-        """
-        self.ver = self.next_avail_ver()
-        self.save()
@@ -0,0 +1,122 @@
+"""Uniform grid spatial index for spacing aware scatter placement.
+
+Instances are treated as bounding spheres. Candidates are hashed into
+cubic cells at least as large as the biggest sphere plus the spacing, so
+an overlap query only looks at the 27 cells around a point and placement
+stays linear in the number of candidates instead of pairwise.
+"""
+import math
+
+import numpy as np
+
+
+_NEIGHBOURS = [(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1)
+               for z in (-1, 0, 1)]
+
+
+class SpatialGrid(object):
+    """Hash grid of spheres supporting insert and overlap queries.
+
+    Args:
+        cell_size (float): edge of a cell, must be at least the largest
+            query reach (two radii plus spacing) for queries to be exact.
+    """
+
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise ValueError("Cell size must be positive, got "
+                             "{}".format(cell_size))
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def cell(self, center):
+        return (int(math.floor(center[0] / self.cell_size)),
+                int(math.floor(center[1] / self.cell_size)),
+                int(math.floor(center[2] / self.cell_size)))
+
+    def insert(self, key, center, radius=0.0):
+        """Add a sphere identified by key."""
+        x, y, z = center
+        cell = self.cell(center)
+        self._cells.setdefault(cell, []).append((x, y, z, radius, key))
+        self._count += 1
+
+    def overlaps(self, center, radius=0.0, spacing=0.0):
+        """Return True if a sphere here would come within spacing of another."""
+        x, y, z = center
+        cx, cy, cz = self.cell(center)
+        cells = self._cells
+        for dx, dy, dz in _NEIGHBOURS:
+            for ox, oy, oz, other_radius, _ in cells.get(
+                    (cx + dx, cy + dy, cz + dz), ()):
+                reach = radius + other_radius + spacing
+                if ((ox - x) ** 2 + (oy - y) ** 2 + (oz - z) ** 2 <
+                        reach * reach):
+                    return True
+        return False
+
+    def query(self, center, reach):
+        """Return the keys of spheres whose center is within reach."""
+        x, y, z = center
+        cx, cy, cz = self.cell(center)
+        found = []
+        for dx, dy, dz in _NEIGHBOURS:
+            for ox, oy, oz, _, key in self._cells.get(
+                    (cx + dx, cy + dy, cz + dz), ()):
+                if (ox - x) ** 2 + (oy - y) ** 2 + (oz - z) ** 2 < reach ** 2:
+                    found.append(key)
+        return found
+
+
+def place_without_overlap(centers, radii=0.0, spacing=0.0, order=None,
+                          obstacles=None):
+    """Greedily keep spheres that do not overlap already kept ones.
+
+    Args:
+        centers (array): (n, 3) candidate positions.
+        radii (float or array): bounding radius of every candidate.
+        spacing (float): extra gap required between two spheres.
+        order (array): order in which candidates are tried, defaults to
+            their index order. Pass a seeded permutation for random picks.
+        obstacles (tuple): (centers, radii) of spheres that are already
+            placed and must be avoided.
+
+    Returns:
+        numpy.ndarray: sorted positions into ``centers`` of kept candidates.
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64),
+                            (len(centers),))
+    obstacle_centers = np.empty((0, 3))
+    obstacle_radii = np.empty(0)
+    if obstacles is not None:
+        obstacle_centers = np.asarray(obstacles[0],
+                                      dtype=np.float64).reshape(-1, 3)
+        obstacle_radii = np.broadcast_to(
+            np.asarray(obstacles[1], dtype=np.float64),
+            (len(obstacle_centers),))
+    max_radius = max(radii.max() if len(radii) else 0.0,
+                     obstacle_radii.max() if len(obstacle_radii) else 0.0)
+    reach = 2.0 * max_radius + spacing
+    if not len(centers) or reach <= 0:
+        return np.arange(len(centers))
+
+    grid = SpatialGrid(reach)
+    for center, radius in zip(obstacle_centers.tolist(),
+                              obstacle_radii.tolist()):
+        grid.insert(None, center, radius)
+    if order is None:
+        order = np.arange(len(centers))
+    center_list = centers.tolist()
+    radius_list = radii.tolist()
+    kept = []
+    for idx in np.asarray(order).tolist():
+        center, radius = center_list[idx], radius_list[idx]
+        if not grid.overlaps(center, radius, spacing):
+            grid.insert(idx, center, radius)
+            kept.append(idx)
+    return np.sort(np.asarray(kept, dtype=np.int64))
@@ -0,0 +1,140 @@
+"""Spatial tiles of the scatter output.
+
+One group holding every instance makes Maya evaluate and draw the whole
+scatter at once. The tool can instead split its output over a uniform grid
+of tiles, one group or instancer per tile, each carrying the bounds of its
+instances, so the tiles far from the camera can be drawn as bounding
+boxes, switched to low detail prototypes or hidden.
+
+The partition is one vectorized pass over the instance positions: the
+cells of all the positions are flattened to one integer key and a stable
+sort by key lines up the instances of every tile. Nothing here needs Maya.
+"""
+import collections
+
+import numpy as np
+
+
+FULL = "full"
+LOW_DETAIL = "low detail"
+BOUNDING_BOX = "bounding box"
+HIDDEN = "hidden"
+# from the closest tiles out, see tile_states
+STATES = (FULL, LOW_DETAIL, BOUNDING_BOX, HIDDEN)
+
+Tiling = collections.namedtuple(
+    "Tiling", ["tile_size", "cells", "order", "starts", "counts",
+               "bounds_min", "bounds_max"])
+
+
+def auto_tile_size(translations, instances_per_tile=1000):
+    """Return a tile edge giving about instances_per_tile per tile.
+
+    Scatters mostly cover a ground, so the tiles are sized from the two
+    largest extents of the positions.
+    """
+    translations = np.asarray(translations, dtype=np.float64)
+    if len(translations) <= instances_per_tile:
+        return 0.0
+    extents = np.sort(np.ptp(translations, axis=0))[::-1]
+    area = max(extents[0], 1e-9) * max(extents[1], 1e-9)
+    return float(np.sqrt(area * instances_per_tile / len(translations)))
+
+
+def partition(translations, tile_size, radii=0.0):
+    """Split instances over a uniform grid of cubic tiles.
+
+    Args:
+        translations (array): (n, 3) instance positions.
+        tile_size (float): edge of a tile, 0 or less puts every instance
+            in one tile.
+        radii (float or array): bounding radius of every instance, added
+            to the tile bounds.
+
+    Returns:
+        Tiling: the (t, 3) integer grid cell of every tile, the instance
+            positions ordered tile by tile, where the run of every tile
+            starts in that order and its length, and the (t, 3) corners of
+            the box holding the instances of every tile.
+    """
+    translations = np.asarray(translations, dtype=np.float64)
+    count = len(translations)
+    if count == 0:
+        empty = np.empty((0, 3))
+        return Tiling(tile_size, np.empty((0, 3), dtype=np.int64),
+                      np.empty(0, dtype=np.int64),
+                      np.empty(0, dtype=np.int64),
+                      np.empty(0, dtype=np.int64), empty, empty.copy())
+    if tile_size > 0:
+        cells = np.floor(translations / tile_size).astype(np.int64)
+        origin = cells.min(axis=0)
+        shape = cells.max(axis=0) - origin + 1
+        if np.prod(shape, dtype=np.float64) < np.iinfo(np.int64).max:
+            keys = np.ravel_multi_index((cells - origin).T, shape)
+            key_count = shape.prod()
+        else:
+            # tiny tiles over a large scene overflow the grid index, number
+            # the occupied cells instead, in the same order
+            _, keys = np.unique(cells, axis=0, return_inverse=True)
+            keys = keys.reshape(-1)
+            key_count = keys.max() + 1
+        if key_count <= 1 << 16:
+            # numpy radix sorts 16 bit keys, several times faster
+            keys = keys.astype(np.uint16)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.concatenate(
+            [[True], sorted_keys[1:] != sorted_keys[:-1]]))
+        tile_cells = cells[order[starts]]
+    else:
+        order = np.arange(count, dtype=np.int64)
+        starts = np.zeros(1, dtype=np.int64)
+        tile_cells = np.zeros((1, 3), dtype=np.int64)
+    counts = np.diff(np.append(starts, count))
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (count,))
+    ordered = translations[order]
+    ordered_radii = radii[order][:, None]
+    return Tiling(tile_size, tile_cells, order, starts, counts,
+                  np.minimum.reduceat(ordered - ordered_radii, starts),
+                  np.maximum.reduceat(ordered + ordered_radii, starts))
+
+
+def tile_members(tiling):
+    """Return the instance positions of every tile, as a list of arrays."""
+    return np.split(tiling.order, tiling.starts[1:])
+
+
+def tile_name(group_name, cell):
+    """Return the node name of the tile of a grid cell, e.g.
+    ScatterGroup_tile_3_m1_0 for the cell (3, -1, 0)."""
+    return "{}_tile_{}".format(group_name, "_".join(
+        "m{}".format(-value) if value < 0 else str(value)
+        for value in cell))
+
+
+def box_distances(bounds_min, bounds_max, point):
+    """Return the distance from point to every (t, 3) box, 0 inside."""
+    point = np.asarray(point, dtype=np.float64)
+    outside = np.maximum(np.maximum(bounds_min - point, point - bounds_max),
+                         0.0)
+    return np.sqrt(np.einsum("ij,ij->i", outside, outside))
+
+
+def tile_states(distances, low_detail=None, bounding_box=None, hidden=None):
+    """Return the STATES index of every tile at distances from the camera.
+
+    Args:
+        distances (array): (t,) distances, see box_distances.
+        low_detail (float): distance from which tiles use low detail
+            prototypes, None never.
+        bounding_box (float): distance from which tiles are drawn as boxes.
+        hidden (float): distance from which tiles are hidden.
+
+    Returns:
+        numpy.ndarray: (t,) int indices into STATES.
+    """
+    thresholds = np.array([np.inf if value is None else value
+                           for value in (low_detail, bounding_box, hidden)])
+    # a farther state always wins, even given a closer threshold
+    thresholds = np.minimum.accumulate(thresholds[::-1])[::-1]
+    return np.searchsorted(thresholds, distances, side="right")
@@ -0,0 +1,32 @@
+"""Wall time of the phases of a tool run."""
+import collections
+import contextlib
+import timeit
+
+
+class PhaseTimer(object):
+    """Accumulate the wall time spent in named phases, in first use order."""
+
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the body of a with block as the phase name."""
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            elapsed = timeit.default_timer() - start
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    @property
+    def total(self):
+        return sum(self.phases.values())
+
+    def report(self):
+        """Return a one line summary such as 'sample 0.010s, total 0.010s'."""
+        parts = ["{} {:.3f}s".format(name, elapsed)
+                 for name, elapsed in self.phases.items()]
+        parts.append("total {:.3f}s".format(self.total))
+        return ", ".join(parts)
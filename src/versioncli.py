@@ -0,0 +1,164 @@
+"""Command line versioning of descriptor_task_vNNN scene files.
+
+Works on paths only and never imports Maya, so pipeline and farm scripts
+can resolve thousands of paths in one call::
+
+    python versioncli.py latest /show/scenes/forest_floor_model_v003.ma
+    python versioncli.py next /show/scenes/forest_floor_model_v003.ma
+    python versioncli.py up /show/scenes/forest_floor_model_v003.ma
+    python versioncli.py list /show/scenes
+    find /show -name "*_v*.ma" | python versioncli.py latest -
+
+Every path is answered on its own line in the order given, an empty line
+when it could not be resolved, with the reason on stderr. Folders are
+listed once per call however many paths point into them.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+
+import reservation
+import versionindex
+
+
+def split_path(path):
+    """Split a scene file path into its folder and name parts.
+
+    Returns:
+        tuple: (folder, descriptor, task, ver, ext, storage suffix).
+
+    Raises:
+        ValueError: when the name does not follow the scene file naming.
+    """
+    folder, name = os.path.split(os.path.abspath(path))
+    parts = versionindex.parse_name(name)
+    if parts is None:
+        raise ValueError("not a descriptor_task_vNNN scene file name")
+    suffix = versionindex.split_storage_suffix(name)[1]
+    return (folder,) + parts + (suffix,)
+
+
+def _existing_path(folder, descriptor, task, ver, ext):
+    base_path = os.path.join(
+        folder, versionindex.format_name(descriptor, task, ver, ext))
+    for suffix in ("",) + versionindex.STORAGE_SUFFIXES:
+        if os.path.exists(base_path + suffix):
+            return base_path + suffix
+    return None
+
+
+def latest_path(path):
+    """Return the path of the latest version of the scene of path."""
+    folder, descriptor, task, _, ext, _ = split_path(path)
+    ver = versionindex.index_for(folder).latest(descriptor, task, ext)
+    latest = ver and _existing_path(folder, descriptor, task, ver, ext)
+    if not latest:
+        raise ValueError("no version on disk")
+    return latest
+
+
+def next_path(path):
+    """Return the path the next increment of the scene of path would use."""
+    folder, descriptor, task, _, ext, suffix = split_path(path)
+    ver = versionindex.index_for(folder).next_version(descriptor, task, ext)
+    return os.path.join(folder, versionindex.format_name(
+        descriptor, task, ver, ext) + suffix)
+
+
+def version_up(path):
+    """Copy the scene file at path to a newly reserved next version.
+
+    Returns:
+        str: the path of the new version.
+    """
+    folder, descriptor, task, _, ext, suffix = split_path(path)
+    claim = reservation.reserve_version(
+        folder, descriptor, task, ext,
+        versionindex.index_for(folder).next_version(descriptor, task, ext),
+        suffix=suffix)
+    try:
+        shutil.copyfile(path, claim.temp_path)
+        claim.commit()
+    except Exception:
+        claim.release()
+        raise
+    return claim.path
+
+
+def list_folder(folder):
+    """Return the path of the latest version of every scene of a folder."""
+    folder = os.path.abspath(folder)
+    paths = []
+    for (descriptor, task, ext), ver in sorted(
+            versionindex.index_for(folder).versions().items()):
+        path = _existing_path(folder, descriptor, task, ver, ext)
+        if path:
+            paths.append(path)
+    return paths
+
+
+COMMANDS = {
+    "latest": latest_path,
+    "next": next_path,
+    "up": version_up,
+}
+
+
+def _read_paths(args, stdin):
+    for arg in args:
+        if arg == "-":
+            for line in stdin:
+                if line.strip():
+                    yield line.strip()
+        else:
+            yield arg
+
+
+def main(argv=None, stdin=None, stdout=None, stderr=None):
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=sorted(COMMANDS) + ["list"],
+                        help="latest: latest version on disk, next: path "
+                             "of the next version, up: copy to the next "
+                             "version, list: latest versions of folders")
+    parser.add_argument("paths", nargs="+",
+                        help="scene files, or folders for list, - reads "
+                             "them from stdin")
+    parser.add_argument("--json", action="store_true",
+                        help="print one JSON list of {path, result, error}")
+    args = parser.parse_args(argv)
+
+    results = []
+    failed = False
+    for path in _read_paths(args.paths, stdin):
+        try:
+            if args.command == "list":
+                result = list_folder(path)
+            else:
+                result = COMMANDS[args.command](path)
+            error = None
+        except (ValueError, IOError, OSError) as err:
+            result, error = None, str(err)
+            failed = True
+        if args.json:
+            results.append({"path": path, "result": result, "error": error})
+            continue
+        if error:
+            stderr.write("{}: {}\n".format(path, error))
+            stdout.write("\n")
+        elif args.command == "list":
+            stdout.writelines(line + "\n" for line in result)
+        else:
+            stdout.write(result + "\n")
+    if args.json:
+        json.dump(results, stdout, indent=1)
+        stdout.write("\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
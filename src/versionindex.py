@@ -0,0 +1,188 @@
+"""Per folder index of the latest version of every scene file.
+
+A folder is listed once with ``os.scandir`` and every name following a
+naming.NamingSchema, ``descriptor_task_vNNN.ext`` by default, is parsed
+into a (descriptor, task, ver, ext) tuple. Only the highest version of each
+(descriptor, task, ext) is kept. The index is rebuilt when the modification
+time of the folder changes, so repeated lookups in a session cost a single
+``os.stat``. Files this session writes itself are recorded with
+``note_saved`` so the version is known at once, the folder is still listed
+again on the next lookup to pick up what others wrote meanwhile.
+"""
+import os
+import threading
+import time
+
+try:
+    from os import scandir
+except ImportError:  # Python 2 without the scandir backport
+    scandir = None
+
+import naming
+
+
+# a file with one of these suffixes stands for the scene of the same name
+# stored another way, as a manifest of the version store or compressed
+MANIFEST_SUFFIX = ".manifest"
+COMPRESSED_SUFFIXES = (".zst", ".gz")
+STORAGE_SUFFIXES = (MANIFEST_SUFFIX,) + COMPRESSED_SUFFIXES
+
+# on file systems with whole second timestamps a folder modified this
+# recently may change again within the same tick, so it is listed again
+_SETTLE_SECONDS = 2.0
+
+
+def split_storage_suffix(name):
+    """Return (scene file name, storage suffix or "") of a file name."""
+    if not name.endswith(STORAGE_SUFFIXES):
+        return name, ""
+    for suffix in STORAGE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)], suffix
+    return name, ""
+
+
+def parse_name(name, schema=None):
+    """Split a scene file name into its parts.
+
+    Args:
+        name (str): e.g. ``"forest_floor_model_v012.ma"``, or the same
+            name followed by one of STORAGE_SUFFIXES.
+        schema (naming.NamingSchema): defaults to naming.DEFAULT_SCHEMA.
+
+    Returns:
+        tuple: (descriptor, task, ver, ext) with an int ver, or None when
+            the name does not follow the scene file naming.
+    """
+    schema = schema or naming.DEFAULT_SCHEMA
+    return schema.parse(split_storage_suffix(name)[0])
+
+
+def format_name(descriptor, task, ver, ext, schema=None):
+    """Build a scene file name, the reverse of parse_name."""
+    return (schema or naming.DEFAULT_SCHEMA).format(descriptor, task, ver,
+                                                     ext)
+
+
+def _list_names(folder):
+    if scandir is not None:
+        return [entry.name for entry in scandir(folder) if entry.is_file()]
+    return [name for name in os.listdir(folder)
+            if os.path.isfile(os.path.join(folder, name))]
+
+
+class VersionIndex(object):
+    """Highest version on disk of every (descriptor, task, ext) of a folder."""
+
+    def __init__(self, folder, schema=None):
+        self.folder = folder
+        self.schema = schema or naming.DEFAULT_SCHEMA
+        self.scans = 0
+        self._mtime = None
+        self._settled = False
+        self._latest = {}
+        # parsed names of the last listing, a listing after a change only
+        # parses the names that are new
+        self._parsed = {}
+        self._lock = threading.Lock()
+
+    def _folder_mtime(self):
+        try:
+            stat = os.stat(self.folder)
+        except OSError:
+            return None
+        return getattr(stat, "st_mtime_ns", None) or int(stat.st_mtime * 1e9)
+
+    @staticmethod
+    def _is_settled(mtime):
+        if mtime is None or mtime % 1000000000:
+            # sub second timestamps tell every change apart
+            return True
+        return time.time() - mtime / 1e9 > _SETTLE_SECONDS
+
+    def refresh(self, force=False):
+        """List the folder again if it changed since the last listing.
+
+        Returns:
+            bool: True if the folder was listed again.
+        """
+        with self._lock:
+            mtime = self._folder_mtime()
+            if not force and self._settled and mtime == self._mtime:
+                return False
+            self._scan(mtime)
+            return True
+
+    def _scan(self, mtime):
+        latest = {}
+        parsed = {}
+        if mtime is not None:
+            known = self._parsed
+            names = _list_names(self.folder)
+            found = self.schema.parse_many(
+                [split_storage_suffix(name)[0] for name in names
+                 if name not in known])
+            for name in names:
+                if name in known:
+                    parts = known[name]
+                else:
+                    parts = found.get(split_storage_suffix(name)[0])
+                parsed[name] = parts
+                if parts is None:
+                    continue
+                descriptor, task, ver, ext = parts
+                key = (descriptor, task, ext)
+                if ver > latest.get(key, 0):
+                    latest[key] = ver
+        self._latest = latest
+        self._parsed = parsed
+        self._mtime = mtime
+        self._settled = self._is_settled(mtime)
+        self.scans += 1
+
+    def latest(self, descriptor, task, ext):
+        """Return the highest version on disk, 0 when there is none."""
+        self.refresh()
+        return self._latest.get((descriptor, task, ext), 0)
+
+    def next_version(self, descriptor, task, ext):
+        """Return the version a new increment should use."""
+        return self.latest(descriptor, task, ext) + 1
+
+    def free_version(self, descriptor, task, ext, ver):
+        """Return ver if it is above the highest version on disk, else the
+        version after it."""
+        latest = self.latest(descriptor, task, ext)
+        return ver if ver > latest else latest + 1
+
+    def versions(self):
+        """Return {(descriptor, task, ext): highest version}."""
+        self.refresh()
+        return dict(self._latest)
+
+    def note_saved(self, descriptor, task, ver, ext):
+        """Record a file this session just wrote.
+
+        The cached folder time is left alone: other files may have been
+        written since the last listing, so the next lookup lists the folder
+        again, parsing only the new names.
+        """
+        with self._lock:
+            key = (descriptor, task, ext)
+            if ver > self._latest.get(key, 0):
+                self._latest[key] = ver
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_for(folder, schema=None):
+    """Return the shared VersionIndex of a folder and naming schema."""
+    folder = os.path.normcase(os.path.abspath(folder))
+    schema = schema or naming.DEFAULT_SCHEMA
+    with _indexes_lock:
+        index = _indexes.get((folder, schema))
+        if index is None:
+            index = _indexes[(folder, schema)] = VersionIndex(folder, schema)
+        return index
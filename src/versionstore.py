@@ -0,0 +1,247 @@
+"""Content addressed, deduplicated storage of scene versions.
+
+A saved file is split into content defined chunks: a cut is made after
+every byte where a rolling hash of the previous bytes has its top bits at
+zero, so an edit only changes the chunks around it and the chunks of the
+rest of the file are the same as in the previous version. Every chunk is
+stored once in a store folder under its SHA-1 and a version becomes a
+small JSON manifest listing its chunks, which is turned back into the file
+when it is opened.
+
+The rolling hash is a polynomial hash of a byte table over a 48 byte window
+computed with numpy for a whole block at a time. Files are read and written
+block by block, so memory stays constant whatever their size.
+
+Nothing here needs Maya.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+import reservation
+
+log = logging.getLogger(__name__)
+
+
+MANIFEST_EXT = ".manifest"
+
+WINDOW = 48
+AVERAGE_BITS = 16  # a cut every 64 KiB on average
+MIN_CHUNK = 16 * 1024
+MAX_CHUNK = 256 * 1024
+BLOCK_SIZE = 1024 * 1024
+
+_MULTIPLIER = 0x100000001B3
+_TABLE = np.random.RandomState(0x5CE4E).randint(0, 2 ** 64, size=256,
+                                                 dtype=np.uint64)
+_powers = (np.ones(0, dtype=np.uint64), np.ones(0, dtype=np.uint64))
+
+
+Manifest = collections.namedtuple("Manifest", ["size", "digest", "chunks"])
+
+
+def _inverse(value):
+    """Return the inverse of an odd value modulo 2 ** 64."""
+    inverse = value
+    for _ in range(6):
+        inverse = inverse * (2 - value * inverse) % 2 ** 64
+    return inverse
+
+
+def _get_powers(count):
+    """Return (multiplier ** t, inverse ** t) for t < count, modulo 2 ** 64."""
+    global _powers
+    if len(_powers[0]) < count:
+        size = max(count, BLOCK_SIZE + MAX_CHUNK)
+        powers = []
+        for base in (_MULTIPLIER, _inverse(_MULTIPLIER)):
+            steps = np.full(size, base, dtype=np.uint64)
+            steps[0] = 1
+            powers.append(np.cumprod(steps, dtype=np.uint64))
+        _powers = tuple(powers)
+    return _powers[0][:count], _powers[1][:count]
+
+
+def cut_candidates(data, average_bits=AVERAGE_BITS):
+    """Return the sorted offsets after which data may be cut.
+
+    The hash of the window ending at byte t is sum(T[b_j] * M ** (t - j)).
+    It is computed for every t at once as M ** t times a difference of
+    prefix sums of T[b_j] * M ** -j, all modulo 2 ** 64.
+    """
+    size = len(data)
+    if size < WINDOW:
+        return np.arange(0)
+    forward, backward = _get_powers(size)
+    values = _TABLE[np.frombuffer(data, dtype=np.uint8)] * backward
+    sums = np.concatenate((np.zeros(1, dtype=np.uint64),
+                           np.cumsum(values, dtype=np.uint64)))
+    hashes = (sums[WINDOW:] - sums[:-WINDOW]) * forward[WINDOW - 1:]
+    hits = (hashes >> np.uint64(64 - average_bits)) == 0
+    return np.flatnonzero(hits) + WINDOW
+
+
+def _cut_points(data, final, average_bits, min_size, max_size):
+    candidates = cut_candidates(data, average_bits)
+    size = len(data)
+    ends = []
+    start = 0
+    while True:
+        index = np.searchsorted(candidates, start + min_size)
+        if (index < len(candidates) and
+                candidates[index] <= start + max_size):
+            end = int(candidates[index])
+        elif start + max_size <= size:
+            end = start + max_size
+        else:
+            break
+        ends.append(end)
+        start = end
+    if final and start < size:
+        ends.append(size)
+    return ends
+
+
+def iter_chunks(stream, average_bits=AVERAGE_BITS, min_size=MIN_CHUNK,
+                max_size=MAX_CHUNK, block_size=BLOCK_SIZE):
+    """Yield the content defined chunks of a binary stream.
+
+    Args:
+        stream (file): object with a read method returning bytes.
+        average_bits (int): a cut is found every 2 ** average_bits bytes
+            on average past min_size.
+        min_size (int): smallest chunk, except for the last one.
+        max_size (int): largest chunk.
+        block_size (int): bytes read at a time.
+    """
+    pending = b""
+    while True:
+        data = stream.read(block_size)
+        final = not data
+        # every buffer starts at a chunk boundary
+        buffer = pending + data if pending else data
+        start = 0
+        for end in _cut_points(buffer, final, average_bits, min_size,
+                               max_size):
+            yield buffer[start:end]
+            start = end
+        pending = buffer[start:]
+        if final:
+            return
+
+
+def write_manifest(path, manifest):
+    """Write a manifest to path in one rename."""
+    temp_path = reservation.temp_path_for(path)
+    with open(temp_path, "w") as handle:
+        json.dump({"size": manifest.size, "digest": manifest.digest,
+                   "chunks": manifest.chunks}, handle,
+                  separators=(",", ":"))
+    reservation.replace(temp_path, path)
+
+
+def read_manifest(path):
+    """Return the Manifest stored at path."""
+    with open(path) as handle:
+        data = json.load(handle)
+    return Manifest(data["size"], data["digest"],
+                    [tuple(chunk) for chunk in data["chunks"]])
+
+
+class ChunkStore(object):
+    """Folder of chunks named after their SHA-1.
+
+    Args:
+        folder (str): the store folder, created on first write.
+    """
+
+    def __init__(self, folder, average_bits=AVERAGE_BITS,
+                 min_size=MIN_CHUNK, max_size=MAX_CHUNK):
+        self.folder = folder
+        self.average_bits = average_bits
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def chunk_path(self, digest):
+        return os.path.join(self.folder, digest[:2], digest[2:])
+
+    def has(self, digest):
+        return os.path.exists(self.chunk_path(digest))
+
+    def put(self, digest, data):
+        """Store a chunk unless it is stored already.
+
+        Returns:
+            bool: True if the chunk was new.
+        """
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            return False
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                if not os.path.isdir(folder):
+                    raise
+        # a chunk written by someone else at the same time is identical
+        temp_path = reservation.temp_path_for(path)
+        with open(temp_path, "wb") as handle:
+            handle.write(data)
+        reservation.replace(temp_path, path)
+        return True
+
+    def get(self, digest):
+        with open(self.chunk_path(digest), "rb") as handle:
+            return handle.read()
+
+    def store_stream(self, stream):
+        """Store the chunks of a stream.
+
+        Returns:
+            tuple: (Manifest, bytes of new chunks written).
+        """
+        whole = hashlib.sha1()
+        chunks = []
+        size = written = 0
+        for data in iter_chunks(stream, self.average_bits, self.min_size,
+                                self.max_size):
+            digest = hashlib.sha1(data).hexdigest()
+            if self.put(digest, data):
+                written += len(data)
+            whole.update(data)
+            size += len(data)
+            chunks.append((digest, len(data)))
+        return Manifest(size, whole.hexdigest(), chunks), written
+
+    def store_file(self, path):
+        """Store the chunks of the file at path, see store_stream."""
+        with open(path, "rb") as handle:
+            return self.store_stream(handle)
+
+    def restore_stream(self, manifest, stream):
+        """Write the file of a manifest to a binary stream."""
+        whole = hashlib.sha1()
+        for digest, size in manifest.chunks:
+            data = self.get(digest)
+            if len(data) != size:
+                raise IOError("Chunk {} is damaged".format(digest))
+            whole.update(data)
+            stream.write(data)
+        if whole.hexdigest() != manifest.digest:
+            raise IOError("Restored file does not match its manifest")
+
+    def restore_file(self, manifest, path):
+        """Write the file of a manifest to path in one rename."""
+        temp_path = reservation.temp_path_for(path)
+        try:
+            with open(temp_path, "wb") as handle:
+                self.restore_stream(manifest, handle)
+            reservation.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
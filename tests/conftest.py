@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the tools are flat modules in src, imported by name like inside Maya
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "src"))
@@ -0,0 +1,134 @@
+import os
+import shutil
+
+import pytest
+
+import backgroundsave
+import reservation
+
+
+@pytest.fixture
+def copier(tmp_path):
+    return backgroundsave.BackgroundCopier(str(tmp_path / "scratch"),
+                                           retries=2, retry_delay=0.01)
+
+
+def scratch_save(copier, destination, text="scene"):
+    source = copier.scratch_path_for(destination)
+    with open(source, "w") as handle:
+        handle.write(text)
+    return source
+
+
+def read(path):
+    with open(path) as handle:
+        return handle.read()
+
+
+def failing_copy(failures, error=IOError):
+    """Return a copyfile failing its first failures calls."""
+    calls = []
+    copy = shutil.copyfile
+
+    def copyfile(source, destination):
+        calls.append(source)
+        if len(calls) <= failures:
+            raise error("network down")
+        return copy(source, destination)
+    return copyfile
+
+
+def test_copy_lands_and_removes_scratch(copier, tmp_path):
+    destination = str(tmp_path / "rock_model_v001.ma")
+    source = scratch_save(copier, destination)
+    job = copier.submit(source, destination)
+    assert copier.wait(10)
+    assert (job.status, job.attempts, job.error) == \
+        (backgroundsave.DONE, 1, None)
+    assert read(destination) == "scene"
+    assert not os.path.exists(source)
+
+
+def test_retries_with_growing_delay(copier, tmp_path, monkeypatch):
+    monkeypatch.setattr(backgroundsave.shutil, "copyfile", failing_copy(2))
+    waits = []
+    monkeypatch.setattr(backgroundsave.time, "sleep",
+                        lambda seconds: waits.append((seconds, job.status)))
+    destination = str(tmp_path / "rock_model_v001.ma")
+    job = copier.submit(scratch_save(copier, destination), destination)
+    assert copier.wait(10)
+    assert (job.status, job.attempts) == (backgroundsave.DONE, 3)
+    assert waits == [(0.01, backgroundsave.RETRYING),
+                     (0.02, backgroundsave.RETRYING)]
+    assert read(destination) == "scene"
+
+
+def test_failed_copy_releases_reservation(copier, tmp_path, monkeypatch):
+    monkeypatch.setattr(backgroundsave.shutil, "copyfile", failing_copy(3))
+    folder = str(tmp_path / "scenes")
+    claim = reservation.reserve_version(folder, "rock", "model", ".ma")
+    source = scratch_save(copier, claim.path)
+    job = copier.submit(source, claim.path, claim)
+    assert copier.wait(10)
+    assert (job.status, job.attempts) == (backgroundsave.FAILED, 3)
+    assert isinstance(job.error, IOError)
+    # the placeholder is given back, the save is kept for a retry
+    assert not os.path.exists(claim.path)
+    assert os.path.exists(source)
+
+    assert copier.retry(job)
+    assert copier.wait(10)
+    assert job.status == backgroundsave.DONE
+    assert read(claim.path) == "scene"
+    assert not os.path.exists(source)
+
+
+def test_unexpected_error_fails_the_job(copier, tmp_path, monkeypatch):
+    monkeypatch.setattr(backgroundsave.shutil, "copyfile",
+                        failing_copy(1, error=ValueError))
+    folder = str(tmp_path / "scenes")
+    claim = reservation.reserve_version(folder, "rock", "model", ".ma")
+    job = copier.submit(scratch_save(copier, claim.path), claim.path, claim)
+    assert copier.wait(10)
+    assert (job.status, job.attempts) == (backgroundsave.FAILED, 1)
+    assert isinstance(job.error, ValueError)
+    assert not os.path.exists(claim.path)
+    # the copier thread survived and copies the next job
+    destination = str(tmp_path / "tree_model_v001.ma")
+    other = copier.submit(scratch_save(copier, destination), destination)
+    assert copier.wait(10)
+    assert other.status == backgroundsave.DONE
+
+
+def test_lost_reservation_is_not_overwritten(copier, tmp_path):
+    folder = str(tmp_path / "scenes")
+    claim = reservation.reserve_version(folder, "rock", "model", ".ma")
+    # another save took the version over the placeholder
+    with open(claim.path, "w") as handle:
+        handle.write("theirs")
+    source = scratch_save(copier, claim.path)
+    job = copier.submit(source, claim.path, claim)
+    assert copier.wait(10)
+    assert (job.status, job.attempts) == (backgroundsave.FAILED, 1)
+    assert isinstance(job.error, reservation.ReservationLost)
+    assert read(claim.path) == "theirs"
+    assert os.path.exists(source)
+    assert not copier.retry(job)
+
+
+def test_scratch_left_behind_is_still_done(copier, tmp_path, monkeypatch):
+    folder = str(tmp_path / "scenes")
+    claim = reservation.reserve_version(folder, "rock", "model", ".ma")
+    source = scratch_save(copier, claim.path)
+    remove = os.remove
+
+    def locked_remove(path):
+        if path == source:
+            raise OSError("file in use")
+        remove(path)
+    monkeypatch.setattr(backgroundsave.os, "remove", locked_remove)
+    job = copier.submit(source, claim.path, claim)
+    assert copier.wait(10)
+    assert (job.status, job.attempts, job.error) == \
+        (backgroundsave.DONE, 1, None)
+    assert read(claim.path) == "scene"
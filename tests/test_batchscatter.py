@@ -0,0 +1,123 @@
+import io
+import json
+import os
+import shlex
+import sys
+
+import backgroundsave
+import batchscatter
+
+# stands in for mayapy: "flaky" scenes fail their first attempt, "slow"
+# ones outlive the timeout, "broken" ones always fail and "unsaved" ones
+# report no saved scene
+STUB = """
+import json, os, sys, time
+action, preset, scene = sys.argv[1:4]
+name = os.path.basename(scene)
+if "flaky" in name and not os.path.exists(scene + ".tried"):
+    open(scene + ".tried", "w").close()
+    sys.exit("first attempt fails")
+if "slow" in name:
+    time.sleep(30)
+if "broken" in name:
+    sys.exit("cannot open " + name)
+print("log line of the scene")
+saved = None if "unsaved" in name else scene + ".next"
+print(%r + json.dumps({"saved": saved, "instances": 42,
+                   "phases_s": {"open": 0.1}}))
+""" % batchscatter.RESULT_PREFIX
+
+
+def run_batch(tmp_path, names, *options):
+    stub = tmp_path / "stub.py"
+    stub.write_text(STUB)
+    preset = tmp_path / "preset.json"
+    preset.write_text(json.dumps({"sources": ["rock"],
+                                  "destination": ["ground"]}))
+    scenes = []
+    for name in names:
+        scene = tmp_path / name
+        scene.write_text("")
+        scenes.append(str(scene))
+    report = tmp_path / "report.json"
+    stdout = io.StringIO()
+    code = batchscatter.main(
+        ["run", str(preset)] + scenes +
+        ["--command", " ".join(shlex.quote(arg)
+                               for arg in (sys.executable, str(stub))),
+         "--retry-delay", "0", "--report", str(report)] + list(options),
+        stdout=stdout)
+    with open(str(report)) as handle:
+        data = json.load(handle)
+    results = {os.path.basename(result["scene"]): result
+               for result in data["results"]}
+    return code, stdout.getvalue(), data, results
+
+
+def test_done_and_retried(tmp_path):
+    code, text, data, results = run_batch(
+        tmp_path, ["rock_model_v001.ma", "flaky_model_v001.ma"])
+    assert code == 0
+    assert (data["scenes"], data["done"], data["failed"]) == (2, 2, 0)
+    assert data["wall_s"] > 0
+    rock, flaky = results["rock_model_v001.ma"], results["flaky_model_v001.ma"]
+    assert rock["status"] == flaky["status"] == backgroundsave.DONE
+    assert (rock["attempts"], flaky["attempts"]) == (1, 2)
+    assert rock["saved"] == rock["scene"] + ".next"
+    assert rock["instances"] == 42
+    assert rock["phases"] == {"open": 0.1}
+    assert rock["error"] is None
+    assert "2 scenes, 2 done, 0 failed" in text
+
+
+def test_failed_and_timed_out(tmp_path):
+    code, text, data, results = run_batch(
+        tmp_path, ["broken_model_v001.ma", "slow_model_v001.ma",
+                   "rock_model_v001.ma"],
+        "--retries", "1", "--timeout", "1")
+    assert code == 1
+    assert (data["scenes"], data["done"], data["failed"]) == (3, 1, 2)
+    broken = results["broken_model_v001.ma"]
+    assert broken["status"] == backgroundsave.FAILED
+    assert broken["attempts"] == 2
+    assert "cannot open broken_model_v001.ma" in broken["error"]
+    assert broken["saved"] is None
+    slow = results["slow_model_v001.ma"]
+    assert slow["status"] == backgroundsave.FAILED
+    assert slow["error"] == "timed out after 1.0s"
+    # killed at the timeout, not left to sleep out its 30 seconds
+    assert slow["seconds"] < 10
+    assert results["rock_model_v001.ma"]["status"] == backgroundsave.DONE
+    assert "error: timed out after 1.0s" in text
+    assert "3 scenes, 1 done, 2 failed" in text
+
+
+def test_latest_versions_only(tmp_path):
+    names = ["rock_model_v001.ma", "rock_model_v002.ma",
+             "tree_model_v010.ma"]
+    for name in names:
+        (tmp_path / name).write_text("")
+    pattern = str(tmp_path / "*_model_v*.ma")
+    assert [os.path.basename(path) for path in
+            batchscatter.expand_scenes([pattern])] == \
+        ["rock_model_v002.ma", "tree_model_v010.ma"]
+    assert len(batchscatter.expand_scenes([pattern],
+                                          latest_only=False)) == 3
+
+
+def test_result_without_saved_scene_fails(tmp_path):
+    code, text, data, results = run_batch(
+        tmp_path, ["unsaved_model_v001.ma"], "--retries", "0")
+    assert code == 1
+    unsaved = results["unsaved_model_v001.ma"]
+    assert unsaved["status"] == backgroundsave.FAILED
+    assert unsaved["error"] == "worker saved no scene"
+    assert "error: worker saved no scene" in text
+
+
+def test_format_report_of_a_result_without_saved_scene():
+    result = batchscatter.SceneResult("rock_model_v001.ma",
+                                      backgroundsave.DONE, 1, 0.5, None, 3,
+                                      {}, None)
+    text = batchscatter.format_report([result])
+    assert "1 scenes, 1 done, 0 failed" in text
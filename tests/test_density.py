@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import density
+import meshsample
+import sampling
+
+
+def two_meshes():
+    meshes = {
+        "ground": (np.array([[0.0, 0, 0], [1, 0, 0], [2, 0, 0]]),
+                   np.tile([0.0, 1, 0], (3, 1))),
+        "hill": (np.array([[10.0, 0, 0], [11, 0, 0]]),
+                 np.tile([0.0, 1, 0], (2, 1))),
+    }
+    maps = {
+        "ground": {"colorSet1": [[1, 1, 1, 1], [1, 0, 0, 0.5], [0, 0, 0, 1]],
+                   "grass": [0.0, 0.5, 2.0]},
+        "hill": {"colorSet1": [[0, 1, 0, 0], [0, 0, 1, 1]],
+                 "grass": [1.0, -1.0]},
+    }
+    adapter = meshsample.FakeMeshAdapter(meshes, maps)
+    return meshsample.read_selection(["ground", "hill"], adapter), adapter
+
+
+def test_color_weights():
+    colors = [[1, 1, 1, 1], [1, 0, 0, 0.5], [0, 0, 0, 1], [2, -1, 0, 1]]
+    np.testing.assert_allclose(density.color_weights(colors),
+                               [1.0, 0.2126, 0.0, 0.2126])
+    np.testing.assert_allclose(density.color_weights(colors, "alpha"),
+                               [1.0, 0.5, 1.0, 1.0])
+    with pytest.raises(ValueError):
+        density.color_weights(colors, "purple")
+
+
+def test_falloff_weights():
+    points = [[0, 0, 0], [5, 0, 0], [0, 10, 0], [0, 0, 20]]
+    np.testing.assert_allclose(
+        density.falloff_weights(points, (0, 0, 0), 10.0), [1, 0.5, 0, 0])
+    np.testing.assert_allclose(
+        density.falloff_weights(points, (0, 0, 0), 10.0, 2.0),
+        [1, 0.25, 0, 0])
+    with pytest.raises(ValueError):
+        density.falloff_weights(points, (0, 0, 0), 0.0)
+
+
+@pytest.mark.parametrize("density_map, expected", [
+    (density.DensityMap(density.VERTEX_COLOR),
+     [1.0, 0.2126, 0.0, 0.7152, 0.0722]),
+    (density.DensityMap(density.VERTEX_COLOR, channel="alpha"),
+     [1.0, 0.5, 1.0, 0.0, 1.0]),
+    (density.DensityMap(density.WEIGHT_MAP, "grass"),
+     [0.0, 0.5, 1.0, 1.0, 0.0]),
+    (density.DensityMap(density.WEIGHT_MAP, "grass", invert=True),
+     [1.0, 0.5, 0.0, 0.0, 1.0]),
+    (density.DensityMap(density.FALLOFF, center=(0, 0, 0), radius=4.0),
+     [1.0, 0.75, 0.5, 0.0, 0.0]),
+])
+def test_read_weights(density_map, expected):
+    sample, adapter = two_meshes()
+    np.testing.assert_allclose(
+        density.read_weights(density_map, sample, adapter), expected)
+
+
+def test_no_density_map():
+    sample, adapter = two_meshes()
+    assert density.read_weights(density.DensityMap(), sample, adapter) is None
+    assert density.read_weights(None, sample, adapter) is None
+
+
+def test_painted_out_points_are_never_scattered():
+    sample, adapter = two_meshes()
+    weights = density.read_weights(
+        density.DensityMap(density.WEIGHT_MAP, "grass"), sample, adapter)
+    for mode in (sampling.UNIFORM, sampling.EXACT, sampling.BLUE_NOISE):
+        for seed in range(10):
+            keep = sampling.select_points(mode, sample.points,
+                                          sample.indices, 100, seed,
+                                          sample.mesh_ids, weights=weights)
+            assert not set(keep) & {0, 4}
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import instancer
+import scatterengine
+
+
+def transforms(count, seed=0):
+    settings = scatterengine.ScatterSettings(
+        scale_min=(0.5, 0.5, 0.5), scale_max=(2, 2, 2),
+        rotate_max=(360, 360, 360), seed=seed)
+    points = np.random.RandomState(seed).random_sample((count, 3))
+    return scatterengine.compute_transforms(points, settings)
+
+
+def test_payload_layout():
+    scatter = transforms(100)
+    payload = instancer.build_payload(scatter, ("rock", "tree"), seed=3)
+    assert payload.prototypes == ["rock", "tree"]
+    for array, expected in ((payload.positions, scatter.translations),
+                            (payload.rotations, scatter.rotations),
+                            (payload.scales, scatter.scales)):
+        assert array.shape == (100, 3)
+        assert array.dtype == np.float64
+        assert array.flags["C_CONTIGUOUS"]
+        np.testing.assert_array_equal(array, expected)
+    assert payload.prototype_indices.shape == (100,)
+    assert payload.prototype_indices.dtype == np.int64
+
+
+def test_payload_takes_picked_prototypes():
+    scatter = transforms(1000)
+    picked = instancer.pick_prototypes(np.arange(1000),
+                                       np.zeros(1000, dtype=np.int64),
+                                       [1.0, 0.0, 3.0], seed=5)
+    payload = instancer.build_payload(scatter, ("rock", "bush", "tree"),
+                                      prototype_indices=picked)
+    np.testing.assert_array_equal(payload.prototype_indices, picked)
+    counts = np.bincount(payload.prototype_indices, minlength=3)
+    assert counts[1] == 0
+    assert 150 < counts[0] < 350
+    instances = list(instancer.iter_instances(payload))
+    assert len(instances) == 1000
+    prototype, position, rotation, scale = instances[7]
+    assert prototype == ("rock", "bush", "tree")[picked[7]]
+    assert position == scatter.translations[7].tolist()
+    assert rotation == scatter.rotations[7].tolist()
+    assert scale == scatter.scales[7].tolist()
+
+
+def test_payload_rejects_bad_prototype_indices():
+    scatter = transforms(4)
+    with pytest.raises(ValueError):
+        instancer.build_payload(scatter, ("rock",),
+                                prototype_indices=[0, 0, 0])
+    with pytest.raises(ValueError):
+        instancer.build_payload(scatter, ("rock", "tree"),
+                                prototype_indices=[0, 1, 2, 0])
+    with pytest.raises(ValueError):
+        instancer.build_payload(scatter, ())
+
+
+def test_assign_prototypes_uses_every_source_evenly():
+    assigned = instancer.assign_prototypes(1000, 3, seed=2)
+    assert sorted(np.bincount(assigned)) == [333, 333, 334]
+    np.testing.assert_array_equal(assigned,
+                                  instancer.assign_prototypes(1000, 3, 2))
+
+
+def test_vector_values():
+    assert instancer.vector_values(np.array([[1.0, 2.0, 3.0]])) == \
+        [(1.0, 2.0, 3.0)]
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import meshsample
+
+
+def grid_mesh(count, offset=0.0):
+    points = np.arange(count * 3, dtype=np.float64).reshape(-1, 3) + offset
+    normals = np.tile([0.0, 1.0, 0.0], (count, 1))
+    return points, normals
+
+
+class ConvertingAdapter(meshsample.FakeMeshAdapter):
+    """Converts other components with a fixed table, like
+    polyListComponentConversion would."""
+
+    def __init__(self, meshes, conversions):
+        super(ConvertingAdapter, self).__init__(meshes)
+        self.conversions = conversions
+        self.converted = []
+
+    def to_vertices(self, items):
+        self.converted.extend(items)
+        return [vertex for item in items for vertex in self.conversions[item]]
+
+
+@pytest.mark.parametrize("item, expected", [
+    ("pSphere1", ("pSphere1", None, None, None)),
+    ("pSphere1.vtx[5]", ("pSphere1", "vtx", 5, 5)),
+    ("pSphere1.vtx[0:999]", ("pSphere1", "vtx", 0, 999)),
+    ("pSphere1.vtx[*]", ("pSphere1", "vtx", None, None)),
+    ("pCube1.f[2:3]", ("pCube1", "f", 2, 3)),
+    ("|grp|pCube1.vtx[1]", ("|grp|pCube1", "vtx", 1, 1)),
+    ("env:rocks:pCube1.e[4]", ("env:rocks:pCube1", "e", 4, 4)),
+])
+def test_parse_component(item, expected):
+    assert meshsample.parse_component(item) == expected
+
+
+def test_parse_component_rejects_unknown_items():
+    with pytest.raises(ValueError):
+        meshsample.parse_component("pCube1.vtxFace[0][1]")
+
+
+def test_ranges_and_single_vertices():
+    adapter = meshsample.FakeMeshAdapter({"pPlane1": grid_mesh(10)})
+    sample = meshsample.read_selection(
+        ["pPlane1.vtx[2:4]", "pPlane1.vtx[7]"], adapter)
+    assert sample.meshes == ["pPlane1"]
+    assert sample.indices.tolist() == [2, 3, 4, 7]
+    np.testing.assert_array_equal(sample.points,
+                                  adapter.points("pPlane1")[[2, 3, 4, 7]])
+    assert sample.normals.shape == (4, 3)
+
+
+def test_overlapping_ranges_are_read_once():
+    adapter = meshsample.FakeMeshAdapter({"pPlane1": grid_mesh(10)})
+    sample = meshsample.read_selection(
+        ["pPlane1.vtx[5:8]", "pPlane1.vtx[0:6]", "pPlane1.vtx[6]"], adapter)
+    assert sample.indices.tolist() == list(range(9))
+    # one bulk read of points and normals per mesh
+    assert adapter.reads == 2
+
+
+def test_whole_objects_and_star_select_every_vertex():
+    adapter = meshsample.FakeMeshAdapter({"pPlane1": grid_mesh(4),
+                                          "pSphere1": grid_mesh(3, 100.0)})
+    sample = meshsample.read_selection(["pPlane1", "pSphere1.vtx[*]"],
+                                       adapter, with_normals=False)
+    assert sample.meshes == ["pPlane1", "pSphere1"]
+    assert sample.mesh_ids.tolist() == [0, 0, 0, 0, 1, 1, 1]
+    assert sample.indices.tolist() == [0, 1, 2, 3, 0, 1, 2]
+    assert sample.normals is None
+    np.testing.assert_array_equal(sample.points[4:],
+                                  adapter.points("pSphere1"))
+
+
+def test_dag_paths_and_namespaces_are_kept_apart():
+    adapter = meshsample.FakeMeshAdapter({
+        "|a|pCube1": grid_mesh(3), "|b|pCube1": grid_mesh(3, 50.0),
+        "env:pCube1": grid_mesh(3, 90.0)})
+    sample = meshsample.read_selection(
+        ["|a|pCube1.vtx[0]", "|b|pCube1.vtx[1:2]", "env:pCube1.vtx[2]"],
+        adapter)
+    assert sample.meshes == ["|a|pCube1", "|b|pCube1", "env:pCube1"]
+    assert sample.indices.tolist() == [0, 1, 2, 2]
+    assert sample.points[-1].tolist() == [96.0, 97.0, 98.0]
+
+
+def test_other_components_go_through_to_vertices():
+    adapter = ConvertingAdapter(
+        {"pCube1": grid_mesh(8)},
+        {"pCube1.f[1]": ["pCube1.vtx[2:3]", "pCube1.vtx[6]"],
+         "pCube1.vtxFace[0][1]": ["pCube1.vtx[0]"]})
+    sample = meshsample.read_selection(
+        ["pCube1.vtx[3]", "pCube1.f[1]", "pCube1.vtxFace[0][1]"], adapter)
+    assert adapter.converted == ["pCube1.f[1]", "pCube1.vtxFace[0][1]"]
+    assert sample.indices.tolist() == [0, 2, 3, 6]
+
+
+def test_empty_selection():
+    sample = meshsample.read_selection([], meshsample.FakeMeshAdapter({}))
+    assert sample.meshes == []
+    assert sample.points.shape == (0, 3)
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+import naming
+
+
+def expression_schema():
+    """A default schema parsing every name with its regular expression."""
+    schema = naming.NamingSchema()
+    schema._default = False
+    return schema
+
+
+def random_names(count, seed=0):
+    rng = random.Random(seed)
+    pieces = ["a", "_", "_v", "1", "12", ".", "ma", "\n", "v", "_v0",
+              u"٣"]
+    return ["".join(rng.choice(pieces) for _ in range(rng.randint(2, 9)))
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("name, parts", [
+    ("forest_floor_model_v012.ma", ("forest_floor", "model", 12, ".ma")),
+    ("rock_model_v1000.mb", ("rock", "model", 1000, ".mb")),
+    ("a_b_v1_v2.ma", ("a_b", "v1", 2, ".ma")),
+    ("a_b_v1.x_v2", ("a", "b", 1, ".x_v2")),
+    ("rock_v001.ma", None),
+    ("rock_model_v.ma", None),
+    ("rock_model_v001.ma.zst", None),
+])
+def test_parse(name, parts):
+    assert naming.DEFAULT_SCHEMA.parse(name) == parts
+
+
+def test_split_matches_expression():
+    names = random_names(50000)
+    schema, reference = naming.NamingSchema(), expression_schema()
+    assert [schema.parse(name) for name in names] == \
+        [reference.parse(name) for name in names]
+    assert schema.parse_many(names) == reference.parse_many(names)
+    assert len(reference.parse_many(names)) > 100
+
+
+def test_format_round_trip():
+    schema = naming.NamingSchema(padding=4)
+    name = schema.format("forest_floor", "layout", 7, ".ma")
+    assert name == "forest_floor_layout_v0007.ma"
+    assert schema.parse(name) == ("forest_floor", "layout", 7, ".ma")
+
+
+def test_custom_template():
+    schema = naming.NamingSchema("{task}/{descriptor}.{ver}{ext}")
+    assert not schema._default
+    assert schema.parse("model/rock.012.ma") == ("rock", "model", 12, ".ma")
+    assert schema.parse_many(["model/rock.012.ma", "rock.ma"]) == {
+        "model/rock.012.ma": ("rock", "model", 12, ".ma")}
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import meshsample
+import parallelscatter
+import sampling
+import scatterengine
+
+
+def synthetic_sample(meshes=3, points_per_mesh=1500, seed=0):
+    rng = np.random.RandomState(seed)
+    mesh_data = {}
+    for mesh_id in range(meshes):
+        points = rng.random_sample((points_per_mesh, 3)) * 20.0
+        normals = rng.normal(size=(points_per_mesh, 3))
+        normals /= np.linalg.norm(normals, axis=1)[:, None]
+        mesh_data["mesh{}".format(mesh_id)] = (points, normals)
+    return meshsample.read_selection(sorted(mesh_data),
+                                     meshsample.FakeMeshAdapter(mesh_data))
+
+
+SETTINGS = scatterengine.ScatterSettings(
+    scale_min=(0.5, 0.5, 0.5), scale_max=(2, 2, 2),
+    rotate_max=(360, 360, 360), seed=453, align_to_normals=True,
+    twist_max=90)
+
+
+def assert_identical(result, reference):
+    keep, transforms = result
+    assert np.array_equal(keep, reference[0])
+    for field, expected in zip(transforms, reference[1]):
+        # bit identical, not only close
+        assert field.dtype == expected.dtype
+        assert field.tobytes() == expected.tobytes()
+
+
+@pytest.mark.parametrize("mode", sampling.MODES)
+def test_workers_and_blocks_give_identical_results(mode):
+    sample = synthetic_sample()
+    weights = np.random.RandomState(1).random_sample(len(sample.points))
+    if mode == sampling.POISSON_DISK:
+        weights = None
+
+    def generate(workers, block_size):
+        return parallelscatter.generate(
+            sample, SETTINGS, 40, mode=mode, radius=0.8, workers=workers,
+            block_size=block_size, weights=weights)
+
+    reference = generate(1, 65536)
+    assert len(reference[0])
+    assert_identical(generate(1, 700), reference)
+    # spawned worker processes, for both block sizes
+    assert_identical(generate(3, 65536), reference)
+    assert_identical(generate(3, 700), reference)
+
+
+def test_jobs_cover_the_sample_in_order():
+    sample = synthetic_sample()
+    jobs = parallelscatter.split_jobs(sample, sampling.UNIFORM, 700)
+    positions = np.concatenate([job.positions for job in jobs])
+    assert np.array_equal(positions, np.arange(len(sample.points)))
+    # blocks never span two meshes
+    assert all(len(set(sample.mesh_ids[job.positions])) == 1
+               for job in jobs)
+    assert len(parallelscatter.split_jobs(sample, sampling.EXACT, 700)) == 3
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+import meshsample
+import parallelscatter
+import preview
+import sampling
+import scatterengine
+
+
+def synthetic_sample(meshes=2, points_per_mesh=2000, seed=0):
+    rng = np.random.RandomState(seed)
+    mesh_data = {}
+    for mesh_id in range(meshes):
+        points = rng.random_sample((points_per_mesh, 3)) * 20.0
+        normals = rng.normal(size=(points_per_mesh, 3))
+        normals /= np.linalg.norm(normals, axis=1)[:, None]
+        mesh_data["mesh{}".format(mesh_id)] = (points, normals)
+    return meshsample.read_selection(sorted(mesh_data),
+                                     meshsample.FakeMeshAdapter(mesh_data))
+
+
+def settings(**overrides):
+    values = dict(scale_min=(0.5, 0.5, 0.5), scale_max=(2, 2, 2),
+                  rotate_max=(360, 360, 360), seed=453,
+                  align_to_normals=True)
+    values.update(overrides)
+    return scatterengine.ScatterSettings(**values)
+
+
+def assert_matches_generate(scatter_preview):
+    """The preview shows what a full scatter with its state would."""
+    keep, transforms = parallelscatter.generate(
+        scatter_preview.sample, scatter_preview.settings,
+        scatter_preview.percentage, scatter_preview.mode,
+        scatter_preview.radius, weights=scatter_preview.weights)
+    assert np.array_equal(scatter_preview.visible_indices, keep)
+    np.testing.assert_allclose(scatter_preview.rotations[keep],
+                               transforms.rotations, atol=1e-9)
+    np.testing.assert_allclose(scatter_preview.scales[keep],
+                               transforms.scales, atol=1e-12)
+
+
+def assert_diff(update, before, scatter_preview):
+    after = scatter_preview.visible.copy()
+    assert np.array_equal(update.added, np.flatnonzero(after & ~before))
+    assert np.array_equal(update.removed, np.flatnonzero(before & ~after))
+
+
+@pytest.mark.parametrize("mode", [sampling.UNIFORM, sampling.EXACT])
+@pytest.mark.parametrize("weighted", [False, True])
+def test_percentage_updates(mode, weighted):
+    sample = synthetic_sample()
+    weights = None
+    if weighted:
+        weights = np.random.RandomState(1).random_sample(len(sample.points))
+        weights[::7] = 0.0
+    scatter_preview = preview.ScatterPreview(sample, settings(), 30, mode,
+                                             weights=weights)
+    assert_matches_generate(scatter_preview)
+    for percentage in (55, 10, 10, 100, 0, 42):
+        before = scatter_preview.visible.copy()
+        update = scatter_preview.set_percentage(percentage)
+        assert update.columns == ()
+        assert_diff(update, before, scatter_preview)
+        assert_matches_generate(scatter_preview)
+
+
+def test_uniform_percentage_touches_only_the_crossed_points():
+    scatter_preview = preview.ScatterPreview(synthetic_sample(), settings(),
+                                             30)
+    update = scatter_preview.set_percentage(31)
+    assert len(update.removed) == 0
+    # about 1% of the 4000 points crossed the threshold
+    assert 10 < len(update.added) < 80
+
+
+@pytest.mark.parametrize("overrides, columns", [
+    ({"scale_max": (3, 3, 3)}, (preview.SCALES,)),
+    ({"rotate_min": (0, 90, 0)}, (preview.ROTATIONS,)),
+    ({"twist_max": 45.0}, (preview.ROTATIONS,)),
+    ({"align_to_normals": False}, (preview.ROTATIONS,)),
+    ({"seed": 7}, (preview.ROTATIONS, preview.SCALES)),
+])
+def test_settings_recompute_only_the_changed_columns(overrides, columns):
+    scatter_preview = preview.ScatterPreview(synthetic_sample(), settings(),
+                                             30)
+    before = scatter_preview.visible.copy()
+    rotations = scatter_preview.rotations.copy()
+    scales = scatter_preview.scales.copy()
+    update = scatter_preview.set_settings(settings(**overrides))
+    assert update.columns == columns
+    assert_diff(update, before, scatter_preview)
+    if "seed" not in overrides:
+        assert len(update.added) == len(update.removed) == 0
+    if preview.ROTATIONS not in columns:
+        assert np.array_equal(scatter_preview.rotations, rotations)
+    if preview.SCALES not in columns:
+        assert np.array_equal(scatter_preview.scales, scales)
+    assert_matches_generate(scatter_preview)
+
+
+def test_mode_and_radius_changes_reselect():
+    scatter_preview = preview.ScatterPreview(synthetic_sample(), settings(),
+                                             60)
+    for mode, radius in ((sampling.POISSON_DISK, 0.8),
+                         (sampling.POISSON_DISK, 1.5),
+                         (sampling.BLUE_NOISE, None),
+                         (sampling.UNIFORM, None)):
+        before = scatter_preview.visible.copy()
+        update = scatter_preview.set_settings(settings(), mode, radius)
+        assert update.columns == ()
+        assert_diff(update, before, scatter_preview)
+        assert_matches_generate(scatter_preview)
+
+
+def test_weight_updates():
+    sample = synthetic_sample()
+    scatter_preview = preview.ScatterPreview(sample, settings(), 50)
+    rng = np.random.RandomState(2)
+    for weights in (rng.random_sample(len(sample.points)),
+                    np.where(sample.points[:, 0] > 10, 1.0, 0.0), None):
+        before = scatter_preview.visible.copy()
+        update = scatter_preview.set_weights(weights)
+        assert update.columns == ()
+        assert_diff(update, before, scatter_preview)
+        assert_matches_generate(scatter_preview)
@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+
+import pytest
+
+import reservation
+import versionindex
+
+
+def increment_saves(args):
+    """Save count increments of one scene the way SceneFile does."""
+    folder, count = args
+    saved = []
+    for _ in range(count):
+        index = versionindex.VersionIndex(folder)
+        claim = reservation.reserve_version(
+            folder, "shot", "anim", ".ma",
+            index.next_version("shot", "anim", ".ma"))
+        with open(claim.temp_path, "w") as handle:
+            handle.write("{} {}\n".format(os.getpid(), claim.ver))
+        claim.commit()
+        saved.append(claim.ver)
+    return saved
+
+
+def reserve_once(folder):
+    return reservation.reserve_version(folder, "shot", "anim", ".ma").ver
+
+
+def run_pool(func, args, processes):
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(func, args)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def age(path, seconds):
+    mtime = os.path.getmtime(path) - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_concurrent_increments_get_unique_versions(tmp_path):
+    folder = str(tmp_path)
+    processes, saves = 8, 25
+    claimed = run_pool(increment_saves, [(folder, saves)] * processes,
+                       processes)
+    versions = sorted(ver for saved in claimed for ver in saved)
+    assert versions == list(range(1, processes * saves + 1))
+    names = sorted(os.listdir(folder))
+    # nothing but the committed scenes: no placeholders or temp files
+    assert names == sorted(versionindex.format_name("shot", "anim", ver,
+                                                    ".ma")
+                           for ver in versions)
+    for name in names:
+        with open(os.path.join(folder, name)) as handle:
+            pid, ver = handle.read().split()
+        assert int(ver) == versionindex.parse_name(name)[2]
+
+
+def test_stale_placeholder_is_reclaimed(tmp_path):
+    folder = str(tmp_path)
+    claim = reservation.reserve_version(folder, "shot", "anim", ".ma")
+    age(claim.path, reservation.STALE_SECONDS + 1)
+    reclaimed = reservation.reserve_version(folder, "shot", "anim", ".ma")
+    assert reclaimed.ver == claim.ver
+    assert not [name for name in os.listdir(folder) if "stale" in name]
+
+
+def test_fresh_placeholder_and_old_scene_are_kept(tmp_path):
+    folder = str(tmp_path)
+    claim = reservation.reserve_version(folder, "shot", "anim", ".ma")
+    assert reservation.reserve_version(folder, "shot", "anim",
+                                       ".ma").ver == claim.ver + 1
+    with open(claim.temp_path, "w") as handle:
+        handle.write("scene")
+    claim.commit()
+    age(claim.path, reservation.STALE_SECONDS + 1)
+    assert reservation.reserve_version(folder, "shot", "anim",
+                                       ".ma").ver == claim.ver + 2
+    with open(claim.path) as handle:
+        assert handle.read() == "scene"
+
+
+def test_one_of_many_reclaimers_wins(tmp_path):
+    folder = str(tmp_path)
+    claim = reservation.reserve_version(folder, "shot", "anim", ".ma")
+    age(claim.path, reservation.STALE_SECONDS + 1)
+    processes = 8
+    versions = run_pool(reserve_once, [folder] * processes, processes)
+    assert sorted(versions) == list(range(1, processes + 1))
+    assert len(os.listdir(folder)) == processes
+
+
+def test_release_gives_the_version_back(tmp_path):
+    folder = str(tmp_path)
+    claim = reservation.reserve_version(folder, "shot", "anim", ".ma")
+    claim.release()
+    assert os.listdir(folder) == []
+    assert reservation.reserve_version(folder, "shot", "anim",
+                                       ".ma").ver == claim.ver
+
+
+def test_release_keeps_a_file_that_replaced_the_placeholder(tmp_path):
+    folder = str(tmp_path)
+    claim = reservation.reserve_version(folder, "shot", "anim", ".ma")
+    os.remove(claim.path)
+    with open(claim.path, "w") as handle:
+        handle.write("someone else's scene")
+    assert not claim.held()
+    claim.release()
+    assert os.path.exists(claim.path)
+    assert not claim.renew()
+
+
+@pytest.mark.parametrize("suffix", ["", ".gz"])
+def test_versions_stored_another_way_share_numbers(tmp_path, suffix):
+    folder = str(tmp_path)
+    first = reservation.reserve_version(folder, "shot", "anim", ".ma",
+                                        suffix=".manifest")
+    second = reservation.reserve_version(
+        folder, "shot", "anim", ".ma",
+        versionindex.index_for(folder).next_version("shot", "anim", ".ma"),
+        suffix=suffix)
+    assert second.ver == first.ver + 1
+
+
+@pytest.mark.parametrize("third_saver", [False, True])
+def test_reclaim_puts_back_a_fresh_claim(tmp_path, monkeypatch, third_saver):
+    folder = str(tmp_path)
+    claim = reservation.reserve_version(folder, "shot", "anim", ".ma")
+    age(claim.path, reservation.STALE_SECONDS + 1)
+    rename = os.rename
+
+    def racing_rename(src, dst):
+        if ".stale-" in dst:
+            # another reclaimer replaced the stale placeholder just before
+            os.remove(src)
+            open(src, "w").close()
+            rename(src, dst)
+            if third_saver:
+                with open(src, "w") as handle:
+                    handle.write("third")
+        else:
+            rename(src, dst)
+    monkeypatch.setattr(reservation.os, "rename", racing_rename)
+    assert not reservation._reclaim_stale(claim.path,
+                                          reservation.STALE_SECONDS)
+    stale = [name for name in os.listdir(folder) if "stale" in name]
+    with open(claim.path) as handle:
+        if third_saver:
+            # never overwritten, the other claim is left aside
+            assert handle.read() == "third"
+            assert len(stale) == 1
+        else:
+            assert handle.read() == ""
+            assert stale == []
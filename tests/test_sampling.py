@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+
+import sampling
+
+
+def random_points(count, seed=0, size=20.0):
+    return np.random.RandomState(seed).random_sample((count, 3)) * size
+
+
+def closest_distance(points):
+    offsets = points[:, None, :] - points[None, :, :]
+    distances = np.linalg.norm(offsets, axis=2)
+    np.fill_diagonal(distances, np.inf)
+    return distances.min(axis=1)
+
+
+@pytest.mark.parametrize("mode", sampling.MODES)
+def test_selection_is_reproducible_from_the_seed(mode):
+    points = random_points(2000)
+    indices = np.arange(len(points))
+    first = sampling.select_points(mode, points, indices, 30, seed=7,
+                                   radius=0.5)
+    again = sampling.select_points(mode, points, indices, 30, seed=7,
+                                   radius=0.5)
+    other = sampling.select_points(mode, points, indices, 30, seed=8,
+                                   radius=0.5)
+    assert np.array_equal(first, again)
+    assert not np.array_equal(first, other)
+
+
+def test_selection_is_stable_when_vertices_are_added():
+    before = sampling.select_uniform(np.arange(1000), 40, seed=3)
+    after = sampling.select_uniform(np.arange(1500), 40, seed=3)
+    assert np.array_equal(after[after < 1000], before)
+    assert np.array_equal(sampling.hash_keys(np.arange(1000), 3),
+                          sampling.hash_keys(np.arange(1500), 3)[:1000])
+
+
+def test_streams_and_channels_are_independent():
+    indices = np.arange(1000)
+    keys = sampling.hash_keys(indices, 3)
+    assert not np.any(keys == sampling.hash_keys(indices, 3, stream=1))
+    assert not np.any(keys == sampling.hash_keys(indices, 3, channel=1))
+
+
+@pytest.mark.parametrize("count, percentage", [
+    (1000, 25), (999, 33), (10, 5), (7, 100), (50, 0)])
+def test_exact_keeps_exactly_the_percentage(count, percentage):
+    keep = sampling.select_exact(np.arange(count), percentage, seed=1)
+    assert len(keep) == int(round(count * percentage / 100.0))
+    assert len(np.unique(keep)) == len(keep)
+    assert np.array_equal(keep, np.sort(keep))
+
+
+def test_uniform_keeps_about_the_percentage():
+    keep = sampling.select_uniform(np.arange(100000), 25, seed=2)
+    assert abs(len(keep) - 25000) < 500
+
+
+@pytest.mark.parametrize("mode", [sampling.UNIFORM, sampling.EXACT])
+def test_last_vertex_is_kept(mode):
+    points = random_points(50)
+    indices = np.arange(len(points))
+    keep = sampling.select_points(mode, points, indices, 100)
+    assert np.array_equal(keep, indices)
+    picked = [sampling.select_points(mode, points, indices, 50, seed=seed)
+              for seed in range(20)]
+    assert any(len(points) - 1 in keep for keep in picked)
+
+
+@pytest.mark.parametrize("radius", [0.5, 2.0])
+def test_poisson_disk_respects_the_radius(radius):
+    points = random_points(3000)
+    keep = sampling.select_points(sampling.POISSON_DISK, points,
+                                  np.arange(len(points)), 100, seed=4,
+                                  radius=radius)
+    assert len(keep) > 10
+    assert closest_distance(points[keep]).min() >= radius
+
+
+def test_blue_noise_spreads_the_points():
+    points = random_points(3000)
+    indices = np.arange(len(points))
+    keep = sampling.select_points(sampling.BLUE_NOISE, points, indices, 10,
+                                  seed=5)
+    assert abs(len(keep) - 300) <= 30
+    # one point per cell: kept points are further apart than a random pick
+    # of the same size
+    random_keep = sampling.select_exact(indices, 100.0 * len(keep) /
+                                        len(points), seed=5)
+    assert closest_distance(points[keep]).min() > \
+        closest_distance(points[random_keep]).min()
+    assert closest_distance(points[keep]).mean() > \
+        closest_distance(points[random_keep]).mean()
+
+
+def test_weighted_keys_of_zero_weights_are_infinite():
+    weights = np.array([0.0, 0.5, 1.0, 0.0])
+    keys = sampling.weighted_keys(np.arange(4), weights, seed=1)
+    assert np.isinf(keys[[0, 3]]).all()
+    assert np.isfinite(keys[[1, 2]]).all()
+
+
+@pytest.mark.parametrize("mode", [sampling.UNIFORM, sampling.EXACT,
+                                  sampling.BLUE_NOISE])
+def test_zero_weights_are_never_selected(mode):
+    points = random_points(4000)
+    weights = np.where(points[:, 0] < 10.0, 0.0, 1.0)
+    for seed in range(5):
+        keep = sampling.select_points(mode, points, np.arange(len(points)),
+                                      100, seed=seed, weights=weights)
+        assert len(keep)
+        assert not np.any(weights[keep] == 0)
+
+
+@pytest.mark.parametrize("mode", [sampling.UNIFORM, sampling.EXACT])
+def test_selection_is_proportional_to_weight(mode):
+    indices = np.arange(40000)
+    weights = np.where(indices % 2, 0.8, 0.2)
+    keep = sampling.select_points(mode, np.zeros((len(indices), 3)), indices,
+                                  50, seed=3, weights=weights)
+    heavy = np.count_nonzero(keep % 2)
+    light = len(keep) - heavy
+    # a weight keeps points with a probability of percentage times weight
+    if mode == sampling.UNIFORM:
+        assert abs(heavy - 8000) < 250
+        assert abs(light - 2000) < 150
+    else:
+        assert len(keep) == sampling.weighted_count(len(indices), 50,
+                                                    weights)
+        assert heavy > 2 * light
+
+
+@pytest.mark.parametrize("weights", [
+    np.array([1.0, 2.0, 0.0, 7.0]),
+    np.tile([1.0, 2.0, 0.0, 7.0], (100000, 1)),
+])
+def test_choose_weighted_is_proportional(weights):
+    picked = sampling.choose_weighted(np.arange(100000), weights, seed=2)
+    shares = np.bincount(picked, minlength=4) / 100000.0
+    np.testing.assert_allclose(shares, [0.1, 0.2, 0.0, 0.7], atol=0.01)
+
+
+def test_choose_weighted_per_point_weights():
+    weights = np.zeros((1000, 3))
+    weights[np.arange(1000), np.arange(1000) % 3] = 5.0
+    picked = sampling.choose_weighted(np.arange(1000), weights, seed=2)
+    assert np.array_equal(picked, np.arange(1000) % 3)
+
+
+def test_choose_weighted_is_stable_under_a_seed():
+    weights = [1.0, 1.0, 2.0]
+    first = sampling.choose_weighted(np.arange(5000), weights, seed=9)
+    assert np.array_equal(
+        first, sampling.choose_weighted(np.arange(5000), weights, seed=9))
+    assert not np.array_equal(
+        first, sampling.choose_weighted(np.arange(5000), weights, seed=10))
+    # a vertex keeps its pick when vertices are added
+    more = sampling.choose_weighted(np.arange(8000), weights, seed=9)
+    assert np.array_equal(more[:5000], first)
+
+
+def test_choose_weighted_rejects_bad_weights():
+    with pytest.raises(ValueError):
+        sampling.choose_weighted(np.arange(3), [1.0, -1.0])
+    with pytest.raises(ValueError):
+        sampling.choose_weighted(np.arange(3), [0.0, 0.0])
@@ -0,0 +1,194 @@
+import numpy as np
+import pytest
+
+import scatterengine
+
+
+def random_normals(count, seed=0):
+    return np.random.RandomState(seed).normal(size=(count, 3))
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1)[:, None]
+
+
+def euler_to_matrix(angles):
+    """Rebuild Rx * Ry * Rz row vector matrices from xyz euler angles."""
+    x, y, z = np.radians(angles).T
+    ones, zeros = np.ones_like(x), np.zeros_like(x)
+
+    def stack(rows):
+        return np.stack([np.stack(row, axis=-1) for row in rows], axis=1)
+
+    rotate_x = stack([[ones, zeros, zeros],
+                      [zeros, np.cos(x), np.sin(x)],
+                      [zeros, -np.sin(x), np.cos(x)]])
+    rotate_y = stack([[np.cos(y), zeros, -np.sin(y)],
+                      [zeros, ones, zeros],
+                      [np.sin(y), zeros, np.cos(y)]])
+    rotate_z = stack([[np.cos(z), np.sin(z), zeros],
+                      [-np.sin(z), np.cos(z), zeros],
+                      [zeros, zeros, ones]])
+    return np.einsum("nij,njk,nkl->nil", rotate_x, rotate_y, rotate_z)
+
+
+def test_x_axis_follows_the_normal():
+    normals = random_normals(1000) * 5.0
+    matrices = scatterengine.normal_matrices(normals)
+    np.testing.assert_allclose(matrices[:, 0], unit(normals), atol=1e-12)
+
+
+def test_matrices_are_rotations():
+    matrices = scatterengine.normal_matrices(random_normals(1000),
+                                             twist=np.full(1000, 33.0))
+    identity = np.broadcast_to(np.eye(3), matrices.shape)
+    np.testing.assert_allclose(
+        np.einsum("nij,nkj->nik", matrices, matrices), identity, atol=1e-12)
+    np.testing.assert_allclose(np.linalg.det(matrices), 1.0, atol=1e-12)
+
+
+def test_y_axis_leans_towards_up():
+    normals = np.array([[1.0, 0.0, 0.0], [0.0, 0.0, 1.0], [1.0, 1.0, 0.0]])
+    matrices = scatterengine.normal_matrices(normals)
+    np.testing.assert_allclose(matrices[0, 1], [0.0, 1.0, 0.0], atol=1e-12)
+    np.testing.assert_allclose(matrices[1, 1], [0.0, 1.0, 0.0], atol=1e-12)
+    np.testing.assert_allclose(matrices[2, 1],
+                               unit(np.array([[-1.0, 1.0, 0.0]]))[0],
+                               atol=1e-12)
+
+
+@pytest.mark.parametrize("normal", [(0.0, 1.0, 0.0), (0.0, -3.0, 0.0)])
+def test_normals_parallel_to_up_fall_back_to_world_z(normal):
+    matrices = scatterengine.normal_matrices(np.array([normal]))
+    np.testing.assert_allclose(matrices[0, 0], unit(np.array([normal]))[0])
+    # y then leans towards world z instead of the up vector
+    np.testing.assert_allclose(matrices[0, 1], [0.0, 0.0, 1.0], atol=1e-12)
+    assert np.all(np.isfinite(matrices))
+
+
+def test_twist_rotates_about_the_normal():
+    normals = random_normals(500, seed=1)
+    twist = np.random.RandomState(2).uniform(-180.0, 180.0, 500)
+    plain = scatterengine.normal_matrices(normals)
+    twisted = scatterengine.normal_matrices(normals, twist=twist)
+    np.testing.assert_allclose(twisted[:, 0], plain[:, 0], atol=1e-12)
+    # the signed angle from the plain y axis to the twisted one, about x
+    cos = np.einsum("ij,ij->i", plain[:, 1], twisted[:, 1])
+    sin = np.einsum("ij,ij->i", plain[:, 2], twisted[:, 1])
+    np.testing.assert_allclose(np.degrees(np.arctan2(sin, cos)), twist,
+                               atol=1e-9)
+
+
+def test_euler_angles_rebuild_the_matrices():
+    matrices = scatterengine.normal_matrices(
+        random_normals(1000, seed=3),
+        twist=np.random.RandomState(4).uniform(0.0, 360.0, 1000))
+    angles = scatterengine.matrix_to_euler(matrices)
+    np.testing.assert_allclose(euler_to_matrix(angles), matrices,
+                               atol=1e-12)
+
+
+def test_euler_angles_in_gimbal_lock():
+    # normals along world z put y at +-90 degrees
+    normals = np.array([[0.0, 0.0, 1.0], [0.0, 0.0, -1.0]])
+    matrices = scatterengine.normal_matrices(normals, twist=[25.0, -60.0])
+    angles = scatterengine.matrix_to_euler(matrices)
+    np.testing.assert_allclose(np.abs(angles[:, 1]), 90.0)
+    np.testing.assert_allclose(euler_to_matrix(angles), matrices,
+                               atol=1e-9)
+
+
+def test_aligned_rotations_point_x_along_the_normals():
+    normals = random_normals(200, seed=5)
+    settings = scatterengine.ScatterSettings(align_to_normals=True)
+    rotations = scatterengine.compute_rotations(
+        settings, np.arange(200), np.zeros(200, dtype=np.int64), normals)
+    np.testing.assert_allclose(euler_to_matrix(rotations)[:, 0],
+                               unit(normals), atol=1e-12)
+
+
+def scatter_settings(**overrides):
+    values = dict(scale_min=(0.5, 1.0, 2.0), scale_max=(1.5, 1.0, 4.0),
+                  rotate_min=(-10.0, 0.0, 90.0),
+                  rotate_max=(10.0, 360.0, 90.0), seed=453)
+    values.update(overrides)
+    return scatterengine.ScatterSettings(**values)
+
+
+def test_transform_shapes_and_translations():
+    points = np.random.RandomState(6).random_sample((300, 3))
+    transforms = scatterengine.compute_transforms(points, scatter_settings())
+    for array in transforms:
+        assert array.shape == (300, 3)
+        assert array.dtype == np.float64
+    np.testing.assert_array_equal(transforms.translations, points)
+    assert not np.shares_memory(transforms.translations, points)
+    # the flat list cmds.xform returns gives the same transforms
+    flat = scatterengine.compute_transforms(points.ravel().tolist(),
+                                            scatter_settings())
+    for array, expected in zip(flat, transforms):
+        np.testing.assert_array_equal(array, expected)
+
+
+def test_empty_and_malformed_points():
+    transforms = scatterengine.compute_transforms([], scatter_settings())
+    assert [array.shape for array in transforms] == [(0, 3)] * 3
+    with pytest.raises(ValueError):
+        scatterengine.compute_transforms([1.0, 2.0], scatter_settings())
+    with pytest.raises(ValueError):
+        scatterengine.ScatterSettings(scale_min=(1.0, 1.0))
+
+
+def test_scales_and_rotations_stay_in_their_ranges():
+    settings = scatter_settings()
+    transforms = scatterengine.compute_transforms(np.zeros((20000, 3)),
+                                                  settings)
+    for array, low, high in ((transforms.scales, settings.scale_min,
+                              settings.scale_max),
+                             (transforms.rotations, settings.rotate_min,
+                              settings.rotate_max)):
+        assert np.all(array >= low) and np.all(array <= high)
+        # the ranges are covered, each axis drawn on its own
+        spread = high - low
+        np.testing.assert_allclose(array.min(axis=0), low,
+                                   atol=0.01 * spread.max())
+        np.testing.assert_allclose(array.max(axis=0), high,
+                                   atol=0.01 * spread.max())
+    assert abs(np.corrcoef(transforms.scales[:, 0],
+                           transforms.scales[:, 2])[0, 1]) < 0.05
+
+
+def test_transforms_are_keyed_by_point():
+    settings = scatter_settings()
+    points = np.random.RandomState(7).random_sample((1000, 3))
+    indices = np.arange(1000) * 3
+    streams = np.repeat([0, 1], 500)
+    whole = scatterengine.compute_transforms(points, settings, indices,
+                                             streams)
+    halves = [scatterengine.compute_transforms(
+        points[part], settings, indices[part], streams[part])
+        for part in (slice(0, 400), slice(400, 1000))]
+    for field, array in enumerate(whole):
+        np.testing.assert_array_equal(
+            array, np.concatenate([half[field] for half in halves]))
+    other_seed = scatterengine.compute_transforms(
+        points, scatter_settings(seed=454), indices, streams)
+    assert not np.array_equal(other_seed.scales, whole.scales)
+
+
+def test_transforms_align_to_normals_with_a_twist_range():
+    normals = random_normals(500, seed=8)
+    settings = scatter_settings(align_to_normals=True, twist_min=-45.0,
+                                twist_max=45.0)
+    transforms = scatterengine.compute_transforms(
+        np.zeros((500, 3)), settings, normals=normals)
+    matrices = euler_to_matrix(transforms.rotations)
+    np.testing.assert_allclose(matrices[:, 0], unit(normals), atol=1e-12)
+    plain = scatterengine.normal_matrices(normals)
+    twist = np.degrees(np.arctan2(
+        np.einsum("ij,ij->i", plain[:, 2], matrices[:, 1]),
+        np.einsum("ij,ij->i", plain[:, 1], matrices[:, 1])))
+    assert np.all(np.abs(twist) <= 45.0 + 1e-9)
+    assert twist.min() < -40.0 and twist.max() > 40.0
+    with pytest.raises(ValueError):
+        scatterengine.compute_transforms(np.zeros((5, 3)), settings)
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+import spatialindex
+
+
+def random_spheres(count, seed=0, size=20.0, max_radius=1.0):
+    rng = np.random.RandomState(seed)
+    return (rng.random_sample((count, 3)) * size,
+            rng.random_sample(count) * max_radius)
+
+
+def pairwise_oracle(centers, radii, spacing, order, obstacles=None):
+    """Greedy placement checking every kept sphere, the slow way."""
+    kept_centers, kept_radii = [], []
+    if obstacles is not None:
+        kept_centers.extend(obstacles[0])
+        kept_radii.extend(obstacles[1])
+    kept = []
+    for idx in order:
+        reach = np.asarray(kept_radii) + radii[idx] + spacing
+        distances = np.linalg.norm(
+            np.asarray(kept_centers).reshape(-1, 3) - centers[idx], axis=1)
+        if not np.any(distances < reach):
+            kept_centers.append(centers[idx])
+            kept_radii.append(radii[idx])
+            kept.append(idx)
+    return sorted(kept)
+
+
+def closest_gap(centers, radii):
+    """Return the smallest distance minus radii between two spheres."""
+    offsets = centers[:, None, :] - centers[None, :, :]
+    gaps = (np.linalg.norm(offsets, axis=2) -
+            radii[:, None] - radii[None, :])
+    np.fill_diagonal(gaps, np.inf)
+    return gaps.min()
+
+
+@pytest.mark.parametrize("spacing", [0.0, 0.5, 2.0])
+def test_no_kept_pair_is_closer_than_radii_and_spacing(spacing):
+    centers, radii = random_spheres(2000)
+    kept = spatialindex.place_without_overlap(centers, radii, spacing)
+    assert 0 < len(kept) < len(centers)
+    assert closest_gap(centers[kept], radii[kept]) >= spacing
+
+
+def test_constant_radius_and_spacing_only():
+    centers, _ = random_spheres(1000, seed=1)
+    kept = spatialindex.place_without_overlap(centers, 0.0, 1.5)
+    assert closest_gap(centers[kept], np.zeros(len(kept))) >= 1.5
+
+
+def test_obstacles_are_avoided():
+    centers, radii = random_spheres(1000, seed=2)
+    obstacle_centers = np.array([[5.0, 5.0, 5.0], [15.0, 15.0, 15.0]])
+    obstacle_radii = np.array([3.0, 2.0])
+    kept = spatialindex.place_without_overlap(
+        centers, radii, 0.25, obstacles=(obstacle_centers, obstacle_radii))
+    distances = np.linalg.norm(
+        centers[kept][:, None, :] - obstacle_centers[None, :, :], axis=2)
+    reach = radii[kept][:, None] + obstacle_radii[None, :] + 0.25
+    assert np.all(distances >= reach)
+    # the candidates away from the obstacles are still placed
+    assert len(kept) > 100
+
+
+def test_order_decides_the_winners_deterministically():
+    centers, radii = random_spheres(500, seed=3)
+    order = np.random.RandomState(7).permutation(len(centers))
+    first = spatialindex.place_without_overlap(centers, radii, 0.1,
+                                               order=order)
+    again = spatialindex.place_without_overlap(centers, radii, 0.1,
+                                               order=order.copy())
+    np.testing.assert_array_equal(first, again)
+    by_index = spatialindex.place_without_overlap(centers, radii, 0.1)
+    assert not np.array_equal(first, by_index)
+    # the first candidate tried is always kept
+    assert order[0] in first
+    assert 0 in by_index
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_agrees_with_pairwise_oracle(seed):
+    centers, radii = random_spheres(300, seed=seed, size=10.0)
+    order = np.random.RandomState(seed).permutation(len(centers))
+    obstacles = (np.array([[5.0, 5.0, 5.0]]), np.array([1.5]))
+    kept = spatialindex.place_without_overlap(
+        centers, radii, 0.3, order=order, obstacles=obstacles)
+    assert kept.tolist() == pairwise_oracle(centers, radii, 0.3, order,
+                                            obstacles)
+
+
+def test_nothing_to_avoid_keeps_everything():
+    centers, _ = random_spheres(50)
+    kept = spatialindex.place_without_overlap(centers)
+    assert kept.tolist() == list(range(50))
+    assert len(spatialindex.place_without_overlap(np.empty((0, 3)),
+                                                  1.0)) == 0
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import tiling
+
+
+def tiles_oracle(translations, tile_size, radii):
+    """Group the instances by cell in sorted cell order, the slow way."""
+    tiles = {}
+    for index, point in enumerate(translations):
+        cell = tuple(int(value) for value in np.floor(point / tile_size))
+        tiles.setdefault(cell, []).append(index)
+    cells = sorted(tiles)
+    bounds = [(np.min([translations[i] - radii[i] for i in tiles[cell]],
+                      axis=0),
+               np.max([translations[i] + radii[i] for i in tiles[cell]],
+                      axis=0)) for cell in cells]
+    return cells, [tiles[cell] for cell in cells], bounds
+
+
+def check_against_oracle(translations, tile_size, radii):
+    result = tiling.partition(translations, tile_size, radii)
+    cells, members, bounds = tiles_oracle(translations, tile_size, radii)
+    assert [tuple(cell) for cell in result.cells] == cells
+    assert [list(tile) for tile in tiling.tile_members(result)] == members
+    assert list(result.counts) == [len(tile) for tile in members]
+    assert list(result.starts) == list(np.cumsum(
+        [0] + [len(tile) for tile in members[:-1]]))
+    np.testing.assert_allclose(result.bounds_min, [low for low, _ in bounds])
+    np.testing.assert_allclose(result.bounds_max,
+                               [high for _, high in bounds])
+
+
+@pytest.mark.parametrize("tile_size", [0.5, 3.0, 25.0])
+def test_partition(tile_size):
+    rng = np.random.RandomState(0)
+    translations = rng.random_sample((500, 3)) * 20.0 - 10.0
+    radii = rng.random_sample(500) * 0.5
+    check_against_oracle(translations, tile_size, radii)
+
+
+def test_partition_beyond_the_grid_index():
+    # a grid of 1e10 cells per axis does not fit an int64 cell index
+    translations = np.array([[0.0, 0.0, 0.0], [1e7, 1e7, 1e7],
+                             [1e7, 0.0, 5.0], [0.0, 0.0, 0.0005]])
+    check_against_oracle(translations, 0.001, np.full(4, 0.1))
+
+
+def test_single_tile():
+    translations = np.array([[0.0, 1.0, 2.0], [4.0, -1.0, 0.5]])
+    result = tiling.partition(translations, 0.0, 1.0)
+    assert result.cells.tolist() == [[0, 0, 0]]
+    assert (result.starts.tolist(), result.counts.tolist()) == ([0], [2])
+    assert result.bounds_min.tolist() == [[-1.0, -2.0, -0.5]]
+    assert result.bounds_max.tolist() == [[5.0, 2.0, 3.0]]
+
+
+def test_empty():
+    result = tiling.partition(np.empty((0, 3)), 1.0)
+    assert result.cells.shape == (0, 3)
+    assert len(result.starts) == len(result.counts) == 0
@@ -0,0 +1,39 @@
+import os
+
+import versionindex
+
+
+def touch(folder, name):
+    open(os.path.join(folder, name), "w").close()
+
+
+def test_latest_and_next_versions(tmp_path):
+    folder = str(tmp_path)
+    for name in ("rock_model_v001.ma", "rock_model_v1000.ma.gz",
+                 "rock_model_v012.ma", "rock_layout_v020.ma",
+                 "rock_model_v030.mb", "notes.txt"):
+        touch(folder, name)
+    index = versionindex.VersionIndex(folder)
+    assert index.latest("rock", "model", ".ma") == 1000
+    assert index.next_version("rock", "model", ".ma") == 1001
+    assert index.latest("rock", "layout", ".ma") == 20
+    assert index.next_version("tree", "model", ".ma") == 1
+
+
+def test_versions_saved_meanwhile_are_not_proposed(tmp_path):
+    folder = str(tmp_path)
+    touch(folder, "rock_model_v001.ma")
+    touch(folder, "rock_model_v002.ma")
+    index = versionindex.VersionIndex(folder)
+    assert index.free_version("rock", "model", ".ma", 2) == 3
+    assert index.free_version("rock", "model", ".ma", 1) == 3
+    assert index.free_version("rock", "model", ".ma", 3) == 3
+    # another artist saves v003 and v004, which the folder watcher sees
+    touch(folder, "rock_model_v003.ma")
+    touch(folder, "rock_model_v004.ma")
+    index.refresh(force=True)
+    assert index.free_version("rock", "model", ".ma", 3) == 5
+    assert index.free_version("rock", "model", ".ma", 9) == 9
+    # this session's own save is known before the folder is listed again
+    index.note_saved("rock", "model", 5, ".ma")
+    assert index.free_version("rock", "model", ".ma", 5) == 6